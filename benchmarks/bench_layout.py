@@ -0,0 +1,79 @@
+"""
+Compares the memory footprint and the parse time of the 'rows' and the 'columns' layout of read_gef_file,
+and of the optional numpy engine if numpy is installed.
+
+The example file ./data/example_cptu_data_1.txt is scaled up by repeating its data rows.
+Usage:
+    python benchmarks/bench_layout.py [--repeat 50] [--runs 3]
+"""
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from gef_reader import read_gef_file
+
+EXAMPLE_FILE = Path(__file__).resolve().parent.parent / 'data' / 'example_cptu_data_1.txt'
+
+
+def create_scaled_file(repeat: int) -> Path:
+    """ Writes a copy of the example file with its data rows repeated `repeat` times."""
+    lines = EXAMPLE_FILE.read_bytes().splitlines(keepends=True)
+    units_index = next(i for i, line in enumerate(lines) if b'[' in line)
+    data_start = units_index + 2
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.gef.txt')
+    temp_file.write(b''.join(lines[:data_start]))
+    for _ in range(repeat):
+        temp_file.write(b''.join(lines[data_start:]))
+    temp_file.close()
+    return Path(temp_file.name)
+
+
+def measure(file_path: Path, layout: str, runs: int, engine: str = 'python') -> dict:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        read_gef_file(file_path, layout=layout, engine=engine)
+        timings.append(time.perf_counter() - start)
+
+    # measure the memory retained by the parse result
+    gc.collect()
+    tracemalloc.start()
+    result = read_gef_file(file_path, layout=layout, engine=engine)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_rows = len(result[2]) if layout == 'rows' else len(next(iter(result[2].values())))
+    del result
+    return {'layout': f'{layout}/{engine}', 'rows': n_rows, 'best_s': min(timings), 'retained_mb': retained / 1e6, 'peak_mb': peak / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50, help='how often the data rows of the example file are repeated')
+    parser.add_argument('--runs', type=int, default=3, help='number of timed runs per layout')
+    args = parser.parse_args()
+
+    file_path = create_scaled_file(args.repeat)
+    try:
+        results = [measure(file_path, layout, args.runs) for layout in ('rows', 'columns')]
+        try:
+            import numpy  # noqa: F401
+            results.append(measure(file_path, 'columns', args.runs, engine='numpy'))
+        except ImportError:
+            print('numpy is not installed, skipping the numpy engine')
+    finally:
+        file_path.unlink()
+
+    print(f"{'layout':<16}{'rows':>10}{'best [s]':>12}{'retained [MB]':>16}{'peak [MB]':>12}")
+    for r in results:
+        print(f"{r['layout']:<16}{r['rows']:>10}{r['best_s']:>12.3f}{r['retained_mb']:>16.1f}{r['peak_mb']:>12.1f}")
+    rows = results[0]
+    for r in results[1:]:
+        print(f"{r['layout']}: {rows['retained_mb'] / r['retained_mb']:.1f}x less retained memory, "
+              f"{rows['best_s'] / r['best_s']:.2f}x speed compared to rows/python")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares the conversion of the data rows with a per-column row plan (see gef_reader._RowPlan)
+to the conversion of every cell on its own (UNDEF check, replace(',', '.'), float() in try/except).
+
+The example file ./data/example_cptu_data_1.txt is scaled up by repeating its data rows,
+both variants run in the same process on the same data lines.
+Usage:
+    python benchmarks/bench_row_plan.py [--repeat 50] [--runs 5]
+"""
+import argparse
+import time
+from array import array
+
+from gef_reader import read_gef_file, read_gef_header
+from gef_reader.gef_reader import _convert_lines, _convert_raw_cell, _convert_raw_cell_to_float, _append_column_values
+
+from bench_layout import create_scaled_file
+
+
+def per_cell_rows(lines: list[bytes], column_names: list[str]) -> list[dict]:
+    measurements = []
+    for line in lines:
+        values = line.split()
+        if(values):
+            measurements.append({column_names[col_i]: _convert_raw_cell(value, 'windows-1252') for col_i, value in enumerate(values)})
+    return(measurements)
+
+
+def per_cell_columns(lines: list[bytes], column_names: list[str]) -> dict:
+    columns = [array('d') for _ in column_names]
+    for line in lines:
+        values = line.split()
+        if(values):
+            _append_column_values(columns, values, _convert_raw_cell_to_float)
+    return(dict(zip(column_names, columns)))
+
+
+def best_of(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return(min(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50, help='how often the data rows of the example file are repeated')
+    parser.add_argument('--runs', type=int, default=5, help='number of timed runs per variant')
+    args = parser.parse_args()
+
+    file_path = create_scaled_file(args.repeat)
+    try:
+        data_offset = read_gef_header(file_path, dialect='gef_txt')[3]
+        content = file_path.read_bytes()
+    finally:
+        file_path.unlink()
+    lines = content[data_offset:].splitlines()
+    # the column names in file order, the units dict is ordered by the unit line
+    column_names = list(read_gef_file(file_bytes=content[:data_offset], layout='columns')[2])
+    n_rows = sum(1 for line in lines if line.strip())
+
+    print(f"{'layout':<10}{'rows':>10}{'per cell [s]':>14}{'row plan [s]':>14}{'speedup':>10}")
+    for layout, baseline in (('rows', per_cell_rows), ('columns', per_cell_columns)):
+        per_cell = best_of(lambda: baseline(lines, column_names), args.runs)
+        planned = best_of(lambda: _convert_lines(lines, column_names, layout, raw=True, encoding='windows-1252'), args.runs)
+        print(f"{layout:<10}{n_rows:>10}{per_cell:>14.3f}{planned:>14.3f}{per_cell / planned:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
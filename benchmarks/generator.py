@@ -0,0 +1,107 @@
+"""
+Deterministic generator of synthetic CPT files for benchmarks.
+
+Both dialects are supported:
+    - 'gef_txt': .gef.txt files like ./data/example_cptu_data_1.txt (header with colons, decimal commas, UNDEF)
+    - 'columninfo': GEF files with #COLUMNINFO header lines (dot decimals, -99999.000 as void value)
+The same seed, dialect, number of rows and UNDEF density always produce the same bytes.
+"""
+import random
+from pathlib import Path
+
+GEF_TXT_COLUMNS = [
+    # name, unit, number of decimals
+    ('Tiefe', '', 2), ('qc', '[MPa]', 2), ('fs', '[MPa]', 3), ('u2', '[MPa]', 3), ('I', '[°]', 1),
+    ('Rf', '[%]', 2), ('qt', '[MPa]', 3), ('ic', '', 2), ('Su_min', '[kPa]', 3), ('Su_max', '[kPa]', 3),
+    ('soilfr', '', 1), ('soilbq', '', 1), ('soilavg', '', 1), ('IFA', '[°]', 3),
+]
+COLUMNINFO_COLUMNS = [
+    # name, unit, GEF quantity number, number of decimals
+    ('Sondeerlengte', 'm', 1, 2), ('Conusweerstand qc', 'MPa', 2, 3), ('Wrijvingsweerstand fs', 'MPa', 3, 4),
+    ('Wrijvingsgetal Rf', '%', 4, 2), ('Waterspanning u2', 'MPa', 6, 4), ('Helling X', 'deg', 21, 1),
+    ('Helling Y', 'deg', 22, 1), ('Gecorrigeerde diepte', 'm', 11, 2), ('Tijd', 's', 12, 1),
+]
+COLUMN_WIDTH = 10
+CHUNK_ROWS = 10_000
+
+
+def _values(rng: random.Random, n_rows: int, n_cols: int, undef_density: float):
+    """ Yields rows of random-walk values, the first column is the depth in 1 cm steps, None marks UNDEF cells."""
+    state = [rng.uniform(0.5, 5.0) for _ in range(n_cols)]
+    for i in range(n_rows):
+        row = [i / 100]
+        for col in range(1, n_cols):
+            state[col] = abs(state[col] + rng.gauss(0, 0.05))
+            row.append(None if rng.random() < undef_density else state[col])
+        yield row
+
+
+def _write_chunked(f, lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if(len(chunk) == CHUNK_ROWS):
+            f.write(''.join(chunk).encode('ascii'))
+            chunk = []
+    f.write(''.join(chunk).encode('ascii'))
+
+
+def write_gef_txt(path: str|Path, n_rows: int, undef_density: float = 0.1, seed: int = 0) -> Path:
+    """ Writes a synthetic .gef.txt file (windows-1252, CRLF line endings, decimal commas)."""
+    rng = random.Random(seed)
+    path = Path(path)
+    header = [
+        'Projekt-Nummer: 20250999', 'Projektname: Benchmark', f'Versuchs-Nummer: CPTU {seed}', 'Kundenname: -',
+        'Ort: Musterhausen', 'Datum: 29.03.2025', 'Konus-Nummer: xxxxxx.Sxxxxx', 'Geländekante: 0,00',
+        'Wasserspiegel: 1,50', 'Vorbohrwerte: 0,00', f'E Coordinate: {rng.uniform(3e5, 7e5):.3f}'.replace('.', ','),
+        f'N Coordinate: {rng.uniform(5.2e6, 6e6):.3f}'.replace('.', ','), '',
+        ''.join(name.ljust(COLUMN_WIDTH) for name, _, _ in GEF_TXT_COLUMNS),
+        ''.join(unit.ljust(COLUMN_WIDTH) for _, unit, _ in GEF_TXT_COLUMNS), '', '',
+    ]
+    formats = [f'{{:.{decimals}f}}' for _, _, decimals in GEF_TXT_COLUMNS]
+
+    def lines():
+        for row in _values(rng, n_rows, len(GEF_TXT_COLUMNS), undef_density):
+            cells = ['UNDEF' if v is None else fmt.format(v).replace('.', ',') for v, fmt in zip(row, formats)]
+            yield ''.join(cell.ljust(COLUMN_WIDTH) for cell in cells) + '\r\n'
+
+    with open(path, 'wb') as f:
+        f.write('\r\n'.join(header).encode('windows-1252'))
+        _write_chunked(f, lines())
+    return(path)
+
+
+def write_columninfo_gef(path: str|Path, n_rows: int, undef_density: float = 0.1, seed: int = 0) -> Path:
+    """ Writes a synthetic GEF file with #COLUMNINFO header lines and -99999.000 as void value."""
+    rng = random.Random(seed)
+    path = Path(path)
+    header = ['#GEFID= 1, 1, 0', f'#COLUMN= {len(COLUMNINFO_COLUMNS)}']
+    header += [f'#COLUMNINFO= {i}, {unit}, {name}, {quantity}' for i, (name, unit, quantity, _) in enumerate(COLUMNINFO_COLUMNS, start=1)]
+    header += [f'#COLUMNVOID= {i}, -99999.000' for i in range(2, len(COLUMNINFO_COLUMNS) + 1)]
+    header += [f'#LASTSCAN= {n_rows}', f'#TESTID= CPT-{seed}',
+               f'#XYID= 31000, {rng.uniform(1e5, 2.5e5):.2f}, {rng.uniform(3e5, 6e5):.2f}, 0.01, 0.01',
+               '#ZID= 31000, 0.00, 0.01', '#EOH=', '']
+    formats = [f'{{:.{decimals}f}}' for _, _, _, decimals in COLUMNINFO_COLUMNS]
+
+    def lines():
+        for row in _values(rng, n_rows, len(COLUMNINFO_COLUMNS), undef_density):
+            yield ' '.join('-99999.000' if v is None else fmt.format(v) for v, fmt in zip(row, formats)) + '\n'
+
+    with open(path, 'wb') as f:
+        f.write('\n'.join(header).encode('ascii'))
+        _write_chunked(f, lines())
+    return(path)
+
+
+WRITERS = {'gef_txt': write_gef_txt, 'columninfo': write_columninfo_gef}
+
+
+def generate(folder: str|Path, dialect: str, n_rows: int, undef_density: float = 0.1, seed: int = 0) -> Path:
+    """ Writes (or reuses) a synthetic file in folder, the file name encodes all parameters."""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    suffix = '.gef.txt' if dialect == 'gef_txt' else '.gef'
+    path = folder / f'{dialect}_{n_rows}_rows_{undef_density:g}_undef_seed{seed}{suffix}'
+    if(not path.exists()):
+        WRITERS[dialect](path, n_rows, undef_density=undef_density, seed=seed)
+    return(path)
@@ -0,0 +1,100 @@
+"""
+Load test for the asyncio upload API.
+
+Simulates a burst of concurrent uploads of ./data/example_cptu_data_1.txt, each read chunk by chunk
+from an async file-like object, while a heartbeat task measures how long the event loop is blocked.
+The blocking mode calls read_gef_file directly in the coroutine as a baseline.
+Usage:
+    python benchmarks/load_test_async.py [--uploads 200] [--concurrency 4] [--executor thread|process]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from gef_reader import read_gef_file
+from gef_reader.aio import aread_gef_file
+
+EXAMPLE_FILE = Path(__file__).resolve().parent.parent / 'data' / 'example_cptu_data_1.txt'
+
+
+class FakeUpload:
+    """ Async file-like object that returns the content in chunks, like an UploadFile."""
+
+    def __init__(self, content: bytes, chunk_size: int = 16 * 1024):
+        self.content = content
+        self.chunk_size = chunk_size
+        self.position = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        await asyncio.sleep(0)
+        size = self.chunk_size if size < 0 else min(size, self.chunk_size)
+        chunk = self.content[self.position:self.position + size]
+        self.position += len(chunk)
+        return(chunk)
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))])
+
+
+async def heartbeat(lags: list[float], stop: asyncio.Event, interval: float = 0.005):
+    while(not stop.is_set()):
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(content: bytes, uploads: int, concurrency: int, mode: str, executor) -> dict:
+    lags = []
+    stop = asyncio.Event()
+    heartbeat_task = asyncio.create_task(heartbeat(lags, stop))
+    limiter = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def upload():
+        # all uploads of the burst arrive at the same time, the latency is measured from the arrival
+        if(mode == 'blocking'):
+            read_gef_file(file_bytes=content)
+        else:
+            await aread_gef_file(FakeUpload(content), executor=executor, limiter=limiter)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload() for _ in range(uploads)))
+    total = time.perf_counter() - start
+    stop.set()
+    await heartbeat_task
+    return({
+        'mode': mode,
+        'uploads_per_s': uploads / total,
+        'latency_p50_ms': statistics.median(latencies) * 1000,
+        'latency_p99_ms': percentile(latencies, 99) * 1000,
+        'loop_lag_p99_ms': percentile(lags or [0.0], 99) * 1000,
+        'loop_lag_max_ms': max(lags or [0.0]) * 1000,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--executor', choices=['thread', 'process'], default='process')
+    args = parser.parse_args()
+
+    content = EXAMPLE_FILE.read_bytes()
+    executor_cls = ProcessPoolExecutor if args.executor == 'process' else ThreadPoolExecutor
+    with executor_cls(max_workers=args.concurrency) as executor:
+        results = [asyncio.run(run(content, args.uploads, args.concurrency, mode, executor)) for mode in ('blocking', 'async')]
+
+    print(f"{'mode':<10}{'uploads/s':>12}{'p50 [ms]':>10}{'p99 [ms]':>10}{'loop lag p99 [ms]':>19}{'loop lag max [ms]':>19}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['uploads_per_s']:>12.1f}{r['latency_p50_ms']:>10.1f}{r['latency_p99_ms']:>10.1f}"
+              f"{r['loop_lag_p99_ms']:>19.1f}{r['loop_lag_max_ms']:>19.1f}")
+
+
+if __name__ == '__main__':
+    main()
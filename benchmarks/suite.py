@@ -0,0 +1,222 @@
+"""
+Reproducible benchmark suite for the parser stages.
+
+Synthetic files of both dialects are generated deterministically (see generator.py),
+each stage is timed (best of --runs) and profiled with tracemalloc in a separate run.
+Throughput is reported in rows/s and MB/s of the input file, the results are saved as JSON.
+
+Usage (from the repository root):
+    python -m benchmarks.suite run --rows 1000 100000 --undef 0.0 0.5 --out results.json
+    python -m benchmarks.suite compare baseline.json results.json --threshold 0.1
+    python -m benchmarks.suite engines --rows 20000 --undef 0.0 0.5
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from gef_reader import read_gef_file, read_alt_gef_file, read_gef_header
+from gef_reader.gef_reader import (
+    read_txt_file,
+    extract_header_part,
+    extract_alternative_header_part,
+    map_to_default_header_names,
+    read_measurement_headers,
+    read_alt_measurements,
+    _alt_column_names,
+)
+
+from .generator import generate
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent / '_data'
+
+
+def _gef_txt_stages(path: Path) -> dict:
+    """ Returns the stages of the .gef.txt pipeline as callables, each stage gets the input of the previous stage prepared."""
+    lines, _ = read_txt_file(path)
+    header = map_to_default_header_names(extract_header_part(lines))
+    return({
+        'read_txt_file': lambda: read_txt_file(path),
+        'extract_header_part': lambda: extract_header_part(lines),
+        'read_measurement_headers': lambda: read_measurement_headers(lines, skip_lines=len(header)),
+        'read_gef_header': lambda: read_gef_header(path, dialect='gef_txt'),
+        'read_gef_file': lambda: read_gef_file(path),
+        'read_gef_file[columns]': lambda: read_gef_file(path, layout='columns'),
+        'read_gef_file[columns,mmap]': lambda: read_gef_file(path, layout='columns', mmap=True),
+    })
+
+
+def _columninfo_stages(path: Path) -> dict:
+    lines, _ = read_txt_file(path)
+    header, header_lines = extract_alternative_header_part(lines)
+    column_names, _ = _alt_column_names(header)
+    return({
+        'read_txt_file': lambda: read_txt_file(path),
+        'extract_alternative_header_part': lambda: extract_alternative_header_part(lines),
+        'read_alt_measurements': lambda: read_alt_measurements(lines, column_names, header_lines),
+        'read_gef_header': lambda: read_gef_header(path, dialect='columninfo'),
+        'read_alt_gef_file': lambda: read_alt_gef_file(path),
+        'read_alt_gef_file[columns]': lambda: read_alt_gef_file(path, layout='columns'),
+        'read_alt_gef_file[columns,mmap]': lambda: read_alt_gef_file(path, layout='columns', mmap=True),
+    })
+
+
+STAGES = {'gef_txt': _gef_txt_stages, 'columninfo': _columninfo_stages}
+
+
+def _numpy_stages(dialect: str, path: Path) -> dict:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return({})
+    reader = read_gef_file if dialect == 'gef_txt' else read_alt_gef_file
+    return({f'{reader.__name__}[numpy]': lambda: reader(path, engine='numpy'),
+            f'{reader.__name__}[columns,numpy]': lambda: reader(path, layout='columns', engine='numpy')})
+
+
+def measure_stage(func, runs: int) -> tuple[float, float]:
+    """ Returns the best wall time of `runs` calls and the peak traced memory of one extra call in MB."""
+    timings = []
+    for _ in range(runs):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return(min(timings), peak / 1e6)
+
+
+def _git_commit() -> str|None:
+    try:
+        return(subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return(None)
+
+
+def run(dialects: list[str], row_counts: list[int], undef_densities: list[float], runs: int, data_dir: Path, seed: int = 0) -> dict:
+    results = []
+    for dialect in dialects:
+        for n_rows in row_counts:
+            for undef_density in undef_densities:
+                path = generate(data_dir, dialect, n_rows, undef_density=undef_density, seed=seed)
+                size_mb = path.stat().st_size / 1e6
+                stages = {**STAGES[dialect](path), **_numpy_stages(dialect, path)}
+                for stage, func in stages.items():
+                    seconds, peak_mb = measure_stage(func, runs)
+                    result = {
+                        'dialect': dialect, 'rows': n_rows, 'undef_density': undef_density, 'stage': stage,
+                        'seconds': seconds, 'peak_mb': peak_mb, 'file_mb': size_mb,
+                        'rows_per_s': n_rows / seconds if seconds else None,
+                        'mb_per_s': size_mb / seconds if seconds else None,
+                    }
+                    results.append(result)
+                    print(f"{dialect:<11}{n_rows:>10}{undef_density:>7.2f}  {stage:<34}{seconds:>9.4f} s{result['rows_per_s']:>14,.0f} rows/s"
+                          f"{result['mb_per_s']:>9.1f} MB/s{peak_mb:>10.1f} MB peak", flush=True)
+    return({
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'runs': runs,
+            'seed': seed,
+        },
+        'results': results,
+    })
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[dict]:
+    """ Returns the stages whose time increased by more than threshold (e.g. 0.1 = 10 %) compared to the baseline."""
+    key = lambda r: (r['dialect'], r['rows'], r['undef_density'], r['stage'])
+    baseline_results = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        base = baseline_results.get(key(r))
+        if(base is None or not base['seconds']):
+            continue
+        change = r['seconds'] / base['seconds'] - 1
+        print(f"{r['dialect']:<11}{r['rows']:>10}{r['undef_density']:>7.2f}  {r['stage']:<34}{base['seconds']:>9.4f} s ->{r['seconds']:>9.4f} s{change:>+9.1%}")
+        if(change > threshold):
+            regressions.append({**r, 'baseline_seconds': base['seconds'], 'change': change})
+    return(regressions)
+
+
+def compare_engines(dialects: list[str], row_counts: list[int], undef_densities: list[float], runs: int, data_dir: Path,
+                    tolerance: float, seed: int = 0) -> list[dict]:
+    """ Times the python and the numpy engine on the same files, for both layouts.
+        Returns the cases where the numpy engine is more than tolerance (e.g. 0.05 = 5 %) slower than the python engine.
+    """
+    slower = []
+    print(f"{'dialect':<11}{'rows':>10}{'undef':>7}  {'layout':<9}{'python':>11}{'numpy':>11}{'speedup':>9}")
+    for dialect in dialects:
+        reader = read_gef_file if dialect == 'gef_txt' else read_alt_gef_file
+        for n_rows in row_counts:
+            for undef_density in undef_densities:
+                path = generate(data_dir, dialect, n_rows, undef_density=undef_density, seed=seed)
+                for layout in ('rows', 'columns'):
+                    seconds = {engine: measure_stage(lambda: reader(path, layout=layout, engine=engine), runs)[0]
+                               for engine in ('python', 'numpy')}
+                    speedup = seconds['python'] / seconds['numpy']
+                    print(f"{dialect:<11}{n_rows:>10}{undef_density:>7.2f}  {layout:<9}{seconds['python']:>9.4f} s{seconds['numpy']:>9.4f} s{speedup:>8.2f}x",
+                          flush=True)
+                    if(seconds['numpy'] > seconds['python'] * (1 + tolerance)):
+                        slower.append({'dialect': dialect, 'rows': n_rows, 'undef_density': undef_density, 'layout': layout, **seconds})
+    return(slower)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='generate the files and run the benchmarks')
+    run_parser.add_argument('--dialects', nargs='+', choices=list(STAGES), default=list(STAGES))
+    run_parser.add_argument('--rows', nargs='+', type=int, default=[1_000, 10_000, 100_000],
+                            help='number of data rows per file, e.g. 1000 100000 10000000')
+    run_parser.add_argument('--undef', nargs='+', type=float, default=[0.1], help='share of UNDEF cells')
+    run_parser.add_argument('--runs', type=int, default=3)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--data-dir', type=Path, default=DEFAULT_DATA_DIR, help='folder for the generated files')
+    run_parser.add_argument('--out', type=Path, default=None, help='JSON file for the results')
+    compare_parser = subparsers.add_parser('compare', help='compare two JSON result files')
+    compare_parser.add_argument('baseline', type=Path)
+    compare_parser.add_argument('current', type=Path)
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown, 0.1 = 10 %%')
+    engines_parser = subparsers.add_parser('engines', help='check that the numpy engine is not slower than the python engine')
+    engines_parser.add_argument('--dialects', nargs='+', choices=list(STAGES), default=list(STAGES))
+    engines_parser.add_argument('--rows', nargs='+', type=int, default=[20_000])
+    engines_parser.add_argument('--undef', nargs='+', type=float, default=[0.0, 0.5], help='share of UNDEF cells')
+    engines_parser.add_argument('--runs', type=int, default=5)
+    engines_parser.add_argument('--tolerance', type=float, default=0.05, help='allowed slowdown of the numpy engine, 0.05 = 5 %%')
+    engines_parser.add_argument('--data-dir', type=Path, default=DEFAULT_DATA_DIR, help='folder for the generated files')
+    args = parser.parse_args(argv)
+
+    if(args.command == 'engines'):
+        slower = compare_engines(args.dialects, args.rows, args.undef, args.runs, args.data_dir, args.tolerance)
+        for r in slower:
+            print(f"SLOWER {r['dialect']} {r['rows']} rows {r['layout']}: numpy {r['numpy']:.4f} s, python {r['python']:.4f} s")
+        return(1 if slower else 0)
+
+    if(args.command == 'run'):
+        report = run(args.dialects, args.rows, args.undef, args.runs, args.data_dir, seed=args.seed)
+        if(args.out is not None):
+            args.out.write_text(json.dumps(report, indent=2))
+            print(f'results saved to {args.out}')
+        return(0)
+
+    regressions = compare(json.loads(args.baseline.read_text()), json.loads(args.current.read_text()), args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r['dialect']} {r['rows']} rows {r['stage']}: {r['change']:+.1%}")
+    return(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
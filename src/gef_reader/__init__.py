@@ -1,3 +1,15 @@
 import gef_reader.gef_reader as gef_reader
 
-from .gef_reader import read_gef_file, read_alt_gef_file
\ No newline at end of file
+from .gef_reader import read_gef_file, read_alt_gef_file, read_any_gef_file, read_gef_header, iter_gef_measurements
+from .batch import read_gef_folder, read_gef_archive, iter_gef_files, GefBatchResult
+from .cache import ParseCache
+from .binary import write_cpt_binary, read_cpt_binary, write_cpt_bundle, read_cpt_bundle, CPTBundle, CPTBinaryWriter
+from .stats import ParseStats, register_parse_hook, unregister_parse_hook
+from .models import CPT, CPTHeader, CPTMeasurement, decimate_cpts
+from .mapping import HeaderMapper
+from .spatial import CPTCatalog
+from .catalog import DirectoryCatalog
+from .store import CPTStore, CPTIngest
+from .interop import to_pandas, to_arrow, concat_to_pandas, concat_to_arrow
+from .derived import derive_parameters, derive_batch, SiteParameters
+from .aggregate import DepthBinAggregator, aggregate_files
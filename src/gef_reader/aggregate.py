@@ -0,0 +1,402 @@
+"""
+Streaming campaign statistics per depth bin.
+
+DepthBinAggregator collects count, mean, variance, min, max (Welford / Chan et al., exact) and approximate
+quantiles (a merging t-digest) of every column per depth bin. Values are buffered per bin and column and folded
+into the statistics in blocks, so the memory depends on the number of bins and columns, not on the number of rows.
+Aggregators of different files or worker processes are merged with merge(), aggregate_files() does this across CPU cores.
+
+    aggregator = aggregate_files(glob('./GEF_SAMPLES/**/*.GEF.txt', recursive=True), step=0.5, columns=['qc', 'fs'])
+    profile = aggregator.summary(quantiles=(0.1, 0.5, 0.9))   # columns depth_top, depth_bottom, qc_mean, qc_p50, ...
+"""
+import os
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from math import asin, floor, pi, sin, sqrt
+
+from .gef_reader import iter_gef_measurements, NAN
+from .profile import DEPTH_COLUMNS
+
+DEFAULT_COMPRESSION = 100
+# values per bin and column that are buffered before they are folded into the statistics
+DEFAULT_BUFFER_SIZE = 256
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+STREAM_CHUNK_SIZE = 4096
+
+
+class QuantileSketch:
+    """
+    Mergeable sketch for approximate quantiles (merging t-digest with the k1 scale function).
+    Keeps at most about compression centroids, the tails are kept more precise than the median.
+    """
+    __slots__ = ('compression', 'means', 'weights', '_buffer', 'count', 'min', 'max')
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self._buffer = []
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def update(self, values: list[float]):
+        """ Adds values (without NaN)."""
+        if(not values):
+            return
+        self._buffer.extend(values)
+        self.count += len(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        if(len(self._buffer) >= 5 * self.compression):
+            self._compress()
+
+    def merge(self, other: 'QuantileSketch'):
+        if(other.count == 0):
+            return
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(list(zip(other.means, other.weights)) + [(v, 1.0) for v in other._buffer])
+
+    def _q_limit(self, q: float) -> float:
+        """ Returns the largest quantile a centroid starting at q may reach, k(q_limit) = k(q) + 1."""
+        k = self.compression / (2 * pi) * asin(2 * q - 1) + 1
+        if(k >= self.compression / 4):
+            return(1.0)
+        return((sin(k * 2 * pi / self.compression) + 1) / 2)
+
+    def _compress(self, extra: list[tuple[float, float]] = ()):
+        items = list(zip(self.means, self.weights))
+        items.extend((v, 1.0) for v in self._buffer)
+        items.extend(extra)
+        self._buffer = []
+        if(not items):
+            return
+        items.sort()
+        total = sum(w for _, w in items)
+        means, weights = [], []
+        mean, weight = items[0]
+        weight_before = 0.0
+        q_limit = self._q_limit(0.0)
+        for m, w in items[1:]:
+            if((weight_before + weight + w) / total <= q_limit):
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                weight_before += weight
+                q_limit = self._q_limit(weight_before / total)
+                mean, weight = m, w
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> float:
+        """ Returns the approximate q-quantile (0 <= q <= 1), NaN if the sketch is empty."""
+        if(self._buffer):
+            self._compress()
+        if(not self.means):
+            return(NAN)
+        if(len(self.means) == 1):
+            return(self.means[0])
+        # centroid i covers its weight around its center, values are interpolated between the centers
+        centers = []
+        cumulated = 0.0
+        for w in self.weights:
+            centers.append(cumulated + w / 2)
+            cumulated += w
+        target = q * cumulated
+        if(target <= centers[0]):
+            if(self.weights[0] == 1):
+                return(self.means[0])
+            return(self.min + (self.means[0] - self.min) * target / centers[0])
+        if(target >= centers[-1]):
+            if(self.weights[-1] == 1):
+                return(self.means[-1])
+            return(self.means[-1] + (self.max - self.means[-1]) * (target - centers[-1]) / (cumulated - centers[-1]))
+        i = bisect_left(centers, target) - 1
+        fraction = (target - centers[i]) / (centers[i + 1] - centers[i])
+        return(self.means[i] + (self.means[i + 1] - self.means[i]) * fraction)
+
+    def __getstate__(self):
+        return({name: getattr(self, name) for name in self.__slots__})
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class RunningStats:
+    """ Exact count, mean, variance, min and max, updated in blocks and merged with the formulas of Chan et al."""
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def _combine(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        if(count == 0):
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def update(self, values: list[float]):
+        """ Adds values (without NaN)."""
+        if(not values):
+            return
+        mean = sum(values) / len(values)
+        self._combine(len(values), mean, sum((v - mean) ** 2 for v in values), min(values), max(values))
+
+    def merge(self, other: 'RunningStats'):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def variance(self) -> float:
+        """ Sample variance, NaN for less than two values."""
+        return(self.m2 / (self.count - 1) if self.count > 1 else NAN)
+
+    @property
+    def std(self) -> float:
+        return(sqrt(self.variance) if self.count > 1 else NAN)
+
+    def __getstate__(self):
+        return({name: getattr(self, name) for name in self.__slots__})
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class _BinColumn:
+    """ Statistics of one column in one depth bin, with a buffer of values that are not folded in yet."""
+    __slots__ = ('stats', 'sketch', 'pending')
+
+    def __init__(self, compression: float):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(compression)
+        self.pending = []
+
+    def flush(self):
+        if(self.pending):
+            self.stats.update(self.pending)
+            self.sketch.update(self.pending)
+            self.pending = []
+
+    def merge(self, other: '_BinColumn'):
+        """ Combines the folded statistics, the pending values of other stay pending until the next flush."""
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        self.pending.extend(other.pending)
+
+    def __getstate__(self):
+        self.flush()
+        return(self.stats, self.sketch)
+
+    def __setstate__(self, state):
+        self.stats, self.sketch = state
+        self.pending = []
+
+
+def _quantile_name(q: float) -> str:
+    percent = round(q * 100, 6)
+    return(f'p{int(percent)}' if percent == int(percent) else f'p{percent:g}')
+
+
+class DepthBinAggregator:
+    """
+    Per depth bin statistics of many CPTs. Bins are aligned to multiples of step (bin i covers [i*step, (i+1)*step)).
+    columns limits the aggregated columns (default: all numeric columns except the depth column),
+    depth_column defaults to the first of profile.DEPTH_COLUMNS found in the data.
+    """
+
+    def __init__(self, step: float, columns: list[str]|None = None, depth_column: str|None = None,
+                 compression: float = DEFAULT_COMPRESSION, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        if(step <= 0):
+            raise ValueError(f'step must be positive, got {step}')
+        self.step = step
+        self.columns = None if columns is None else list(columns)
+        self.depth_column = depth_column
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.bins: dict[int, dict[str, _BinColumn]] = {}
+        self.n_cpts = 0
+
+    def _depth_name(self, names) -> str:
+        if(self.depth_column is not None):
+            if(self.depth_column not in names):
+                raise KeyError(f'depth column {self.depth_column!r} not found, columns: {list(names)}')
+            return(self.depth_column)
+        for name in DEPTH_COLUMNS:
+            if(name in names):
+                return(name)
+        raise KeyError(f'no depth column found, expected one of {DEPTH_COLUMNS}')
+
+    def _cell(self, bin_index: int, name: str) -> _BinColumn:
+        columns = self.bins.get(bin_index)
+        if(columns is None):
+            columns = self.bins[bin_index] = {}
+        cell = columns.get(name)
+        if(cell is None):
+            cell = columns[name] = _BinColumn(self.compression)
+        return(cell)
+
+    def _add_columns(self, columns: dict):
+        depth_name = self._depth_name(columns)
+        names = [name for name in (self.columns if self.columns is not None else columns) if name != depth_name and name in columns]
+        depths = columns[depth_name]
+        step, buffer_size = self.step, self.buffer_size
+        bin_indexes = [None if d is None or d != d else floor(d / step + 1e-9) for d in depths]
+        for name in names:
+            values = columns[name]
+            cells = {}
+            for bin_index, value in zip(bin_indexes, values):
+                if(bin_index is None or value is None or value != value or isinstance(value, str)):
+                    continue
+                cell = cells.get(bin_index)
+                if(cell is None):
+                    cell = cells[bin_index] = self._cell(bin_index, name)
+                cell.pending.append(value)
+                if(len(cell.pending) >= buffer_size):
+                    cell.flush()
+
+    def add(self, measurements: list[dict]|dict):
+        """ Adds the measurements of one CPT or a chunk of it: rows (read_measurement_headers, read_alt_measurements,
+            read_gef_file) with None for UNDEF, or columns (layout='columns') with NaN for UNDEF.
+        """
+        if(isinstance(measurements, dict)):
+            self._add_columns(measurements)
+            return
+        if(not measurements):
+            return
+        names = list(dict.fromkeys(name for row in measurements for name in row))
+        self._add_columns({name: [row.get(name) for row in measurements] for name in names})
+
+    def add_cpt(self, cpt_header: dict, header_units, measurements):
+        """ Adds a parse result of read_gef_file / read_alt_gef_file."""
+        self.add(measurements)
+        self.n_cpts += 1
+
+    def add_file(self, file_path, dialect: str = 'auto', header_mapping_dict={}, chunk_size: int = STREAM_CHUNK_SIZE):
+        """ Streams the measurements of a file into the aggregator, the file is never held in memory as a whole.
+            The chunks are collected in a partial aggregator that is merged only after the whole file was read,
+            so a file that fails partway (e.g. a broken row) leaves the aggregator unchanged.
+        """
+        partial = DepthBinAggregator(self.step, self.columns, self.depth_column, self.compression, self.buffer_size)
+        _, _, chunks = iter_gef_measurements(file_path, chunk_size=chunk_size, dialect=dialect, layout='columns',
+                                             header_mapping_dict=header_mapping_dict)
+        for chunk in chunks:
+            partial._add_columns(chunk)
+        partial.n_cpts = 1
+        self.merge(partial)
+
+    def merge(self, other: 'DepthBinAggregator'):
+        """ Merges the statistics of another aggregator with the same step into this one."""
+        if(other.step != self.step):
+            raise ValueError(f'cannot merge aggregators with step {self.step} and {other.step}')
+        for bin_index, columns in other.bins.items():
+            for name, other_cell in columns.items():
+                cell = self._cell(bin_index, name)
+                cell.merge(other_cell)
+                if(len(cell.pending) >= self.buffer_size):
+                    cell.flush()
+        self.n_cpts += other.n_cpts
+
+    def flush(self):
+        for columns in self.bins.values():
+            for cell in columns.values():
+                cell.flush()
+
+    def column_names(self) -> list[str]:
+        return(list(dict.fromkeys(name for columns in self.bins.values() for name in columns)))
+
+    def summary(self, quantiles: tuple[float, ...] = DEFAULT_QUANTILES) -> dict[str, array]:
+        """
+        Returns the statistics as columns of array('d'), one row per bin from the first to the last filled bin:
+        depth_top, depth_bottom and per column <name>_count, _mean, _std, _min, _max and _p<percent> per quantile.
+        Empty bins have count 0 and NaN statistics.
+        """
+        self.flush()
+        result = {'depth_top': array('d'), 'depth_bottom': array('d')}
+        if(not self.bins):
+            return(result)
+        names = self.column_names()
+        quantile_names = [_quantile_name(q) for q in quantiles]
+        for name in names:
+            for stat in ('count', 'mean', 'std', 'min', 'max', *quantile_names):
+                result[f'{name}_{stat}'] = array('d')
+        for bin_index in range(min(self.bins), max(self.bins) + 1):
+            result['depth_top'].append(round(bin_index * self.step, 10))
+            result['depth_bottom'].append(round((bin_index + 1) * self.step, 10))
+            columns = self.bins.get(bin_index, {})
+            for name in names:
+                cell = columns.get(name)
+                if(cell is None or cell.stats.count == 0):
+                    result[f'{name}_count'].append(0.0)
+                    for stat in ('mean', 'std', 'min', 'max', *quantile_names):
+                        result[f'{name}_{stat}'].append(NAN)
+                    continue
+                stats = cell.stats
+                result[f'{name}_count'].append(stats.count)
+                result[f'{name}_mean'].append(stats.mean)
+                result[f'{name}_std'].append(stats.std)
+                result[f'{name}_min'].append(stats.min)
+                result[f'{name}_max'].append(stats.max)
+                for q, quantile_name in zip(quantiles, quantile_names):
+                    result[f'{name}_{quantile_name}'].append(cell.sketch.quantile(q))
+        return(result)
+
+    def __repr__(self):
+        return(f'DepthBinAggregator(step={self.step}, {len(self.bins)} bins, {self.n_cpts} CPTs)')
+
+
+def _aggregate_chunk(file_paths: list[str], step: float, columns, depth_column, compression: float, dialect: str,
+                     header_mapping_dict) -> tuple[DepthBinAggregator, dict[str, str]]:
+    aggregator = DepthBinAggregator(step, columns=columns, depth_column=depth_column, compression=compression)
+    errors = {}
+    for file_path in file_paths:
+        try:
+            aggregator.add_file(file_path, dialect=dialect, header_mapping_dict=header_mapping_dict)
+        except Exception as e:
+            errors[str(file_path)] = f'{type(e).__name__}: {e}'
+    return(aggregator, errors)
+
+
+def aggregate_files(file_paths: list[str], step: float, columns: list[str]|None = None, depth_column: str|None = None,
+                    workers: int|None = None, compression: float = DEFAULT_COMPRESSION, dialect: str = 'auto',
+                    header_mapping_dict={}, errors: dict|None = None) -> DepthBinAggregator:
+    """
+    Streams many files into one DepthBinAggregator, across worker processes (None: all CPU cores, 1: in this process).
+    Every worker aggregates a share of the files, the partial aggregators are merged. Files that cannot be parsed
+    are skipped, their error messages are added to the errors dict if one is given.
+    """
+    file_paths = [str(p) for p in file_paths]
+    if(workers is None):
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(file_paths)))
+    args = (step, columns, depth_column, compression, dialect, header_mapping_dict)
+    if(workers == 1):
+        aggregator, chunk_errors = _aggregate_chunk(file_paths, *args)
+        if(errors is not None):
+            errors.update(chunk_errors)
+        return(aggregator)
+    # a few chunks per worker balance the load, one aggregator per chunk is sent back
+    n_chunks = min(len(file_paths), workers * 4)
+    chunks = [file_paths[i::n_chunks] for i in range(n_chunks)]
+    aggregator = DepthBinAggregator(step, columns=columns, depth_column=depth_column, compression=compression)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial, chunk_errors in executor.map(_aggregate_chunk, chunks, *[[arg] * n_chunks for arg in args]):
+            aggregator.merge(partial)
+            if(errors is not None):
+                errors.update(chunk_errors)
+    return(aggregator)
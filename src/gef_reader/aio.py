@@ -0,0 +1,87 @@
+"""
+Asyncio API for parsing uploads in web services (e.g. FastAPI endpoints).
+
+Parsing is CPU-bound, so the parser runs in an executor and never blocks the event loop.
+A semaphore bounds the number of files that are read and parsed at the same time,
+uploads are only read into memory once they hold the semaphore, so a burst of large uploads
+neither stalls the other requests of the service nor piles up in memory.
+"""
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from pathlib import Path
+
+from .gef_reader import read_gef_file, read_alt_gef_file, read_any_gef_file, _check_dialect
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+async def _read_source(source) -> tuple[str|Path|None, bytes|None]:
+    """ Returns (file_path, file_bytes) for a path, bytes or an async file-like object with `async read(size)`,
+        e.g. starlette's UploadFile. File-like objects are read chunk by chunk.
+    """
+    if(isinstance(source, (str, Path))):
+        return(source, None)
+    if(isinstance(source, (bytes, bytearray, memoryview))):
+        return(None, bytes(source))
+    buffer = bytearray()
+    while(chunk := await source.read(READ_CHUNK_SIZE)):
+        buffer += chunk
+    return(None, bytes(buffer))
+
+
+def _read(file_path, file_bytes, dialect: str, kwargs: dict):
+    if(dialect == 'auto'):
+        return(read_any_gef_file(file_path=file_path, file_bytes=file_bytes, **kwargs)[1:])
+    reader = read_alt_gef_file if dialect == 'columninfo' else read_gef_file
+    return(reader(file_path=file_path, file_bytes=file_bytes, **kwargs))
+
+
+async def aread_gef_file(source=None, file_path: str|Path = None, file_bytes: bytes = None, dialect: str = 'gef_txt',
+                         executor: Executor|None = None, limiter: asyncio.Semaphore|None = None, **kwargs):
+    """
+    Async variant of read_gef_file, the parsing runs in an executor.
+
+    Parameters
+    ----------
+    source :
+        path, bytes or async file-like object with `async read(size)` (e.g. an UploadFile),
+        alternatively file_path or file_bytes can be given as for read_gef_file
+    dialect : str
+        'gef_txt' (default) uses read_gef_file, 'columninfo' read_alt_gef_file, 'auto' detects the dialect
+    executor : Executor|None
+        executor that runs the parser, None uses the default thread pool of the event loop.
+        A ProcessPoolExecutor parses on other CPU cores.
+    limiter : asyncio.Semaphore|None
+        semaphore shared by all requests of a service to bound the number of files that are read and parsed at the same time,
+        an upload is read into memory only after acquiring it
+    kwargs :
+        passed to the reader, e.g. layout='columns'
+    Returns
+    -------
+    cpt_header, header_units, measurements as returned by the reader
+    """
+    _check_dialect(dialect)
+    if(limiter is None):
+        return(await _read_and_parse(source, file_path, file_bytes, dialect, executor, kwargs))
+    async with limiter:
+        return(await _read_and_parse(source, file_path, file_bytes, dialect, executor, kwargs))
+
+
+async def _read_and_parse(source, file_path, file_bytes, dialect: str, executor: Executor|None, kwargs: dict):
+    if(source is not None):
+        file_path, file_bytes = await _read_source(source)
+    loop = asyncio.get_running_loop()
+    return(await loop.run_in_executor(executor, partial(_read, file_path, file_bytes, dialect, kwargs)))
+
+
+async def aread_gef_many(sources, concurrency: int = 4, dialect: str = 'gef_txt', executor: Executor|None = None,
+                         return_exceptions: bool = False, **kwargs) -> list:
+    """
+    Parses many sources (paths, bytes or async file-like objects) concurrently, at most `concurrency` at a time.
+    The results are returned in the order of the sources. With return_exceptions=True the exception
+    of a failed source is returned in its place instead of being raised.
+    """
+    limiter = asyncio.Semaphore(concurrency)
+    tasks = [aread_gef_file(source, dialect=dialect, executor=executor, limiter=limiter, **kwargs) for source in sources]
+    return(await asyncio.gather(*tasks, return_exceptions=return_exceptions))
@@ -0,0 +1,312 @@
+"""
+Batch reading of whole folders (or zip / tar archives) of CPT files.
+"""
+import os
+import tarfile
+import zipfile
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from glob import glob
+from itertools import islice
+from pathlib import Path
+from zipfile import ZipFile
+
+from .gef_reader import read_any_gef_file, _check_dialect, _check_layout, _hole_id, NAN
+from .stats import ParseStats
+
+# files per task and tasks per worker that are submitted ahead
+MAX_CHUNK_SIZE = 16
+IN_FLIGHT_CHUNKS_PER_WORKER = 2
+# archive members that are read by default
+ARCHIVE_SUFFIXES = ('.gef', '.gef.txt')
+
+
+@dataclass
+class GefBatchResult:
+    """ Combined result of a batch run, headers and units are in the same order as file_paths.
+        measurements is a list of row dicts (layout='rows') or a dict of column arrays (layout='columns').
+        errors contains the error message for each file that could not be parsed.
+    """
+    file_paths: list[str] = field(default_factory=list)
+    headers: list[dict] = field(default_factory=list)
+    header_units: list = field(default_factory=list)
+    measurements: list[dict]|dict = field(default_factory=list)
+    errors: dict[str, str] = field(default_factory=dict)
+
+    def units(self) -> dict[str, str]:
+        """ Returns the unit of each column, from the first file that has one (only .gef.txt files name their units)."""
+        units = {}
+        for header_units in self.header_units:
+            if(isinstance(header_units, dict)):
+                for name, unit in header_units.items():
+                    units.setdefault(name, unit)
+        return(units)
+
+    def to_pandas(self, copy: bool = False):
+        """ Returns the measurements as pandas DataFrame, see interop.to_pandas, the headers are in df.attrs['headers']."""
+        from .interop import to_pandas
+        df = to_pandas({}, self.units(), self.measurements, copy=copy)
+        del df.attrs['header']
+        df.attrs['headers'] = self.headers
+        return(df)
+
+    def to_arrow(self, nan_as_null: bool = True):
+        """ Returns the measurements as pyarrow Table, see interop.to_arrow."""
+        from .interop import to_arrow
+        return(to_arrow({'files': self.file_paths, 'headers': self.headers}, self.units(), self.measurements, nan_as_null=nan_as_null))
+
+
+def _parse_file(file_path: str, dialect: str, layout: str, hole_id_column: str|None, header_mapping_dict: dict, stats: ParseStats|None = None,
+                file_bytes: bytes|None = None):
+    """ Parses one file (or the bytes of an archive member named file_path) in a worker process, the hole id is added to the rows in place."""
+    try:
+        dialect, cpt_header, header_units, measurements = read_any_gef_file(
+            file_path=file_path if file_bytes is None else None, file_bytes=file_bytes, dialect=dialect, layout=layout,
+            header_mapping_dict=header_mapping_dict, stats=stats)
+    except Exception as e:
+        return(file_path, None, None, None, None, None, f'{type(e).__name__}: {e}')
+    hole_id = _hole_id(cpt_header, dialect)
+    if(hole_id_column is not None and layout == 'rows'):
+        for row in measurements:
+            row[hole_id_column] = hole_id
+    return(file_path, dialect, cpt_header, header_units, measurements, hole_id, None)
+
+
+def _parse_files(file_paths: list[str], dialect: str, layout: str, hole_id_column: str|None, header_mapping_dict: dict,
+                 stats: ParseStats|None = None) -> tuple[list[tuple], ParseStats|None]:
+    """ Parses a chunk of files in a worker process, one task per chunk keeps the overhead per file small."""
+    return([_parse_file(file_path, dialect, layout, hole_id_column, header_mapping_dict, stats) for file_path in file_paths], stats)
+
+
+def _imap_bounded(executor, func, task_args, workers: int):
+    """ Runs func(*args) for every tuple of task_args in the executor and yields the results in order.
+        At most IN_FLIGHT_CHUNKS_PER_WORKER tasks per worker are submitted ahead, task_args is consumed lazily.
+    """
+    task_args = iter(task_args)
+    in_flight = deque()
+    try:
+        for args in islice(task_args, workers * IN_FLIGHT_CHUNKS_PER_WORKER):
+            in_flight.append(executor.submit(func, *args))
+        while(in_flight):
+            result = in_flight.popleft().result()
+            args = next(task_args, None)
+            if(args is not None):
+                in_flight.append(executor.submit(func, *args))
+            yield result
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def _default_chunksize(n_items: int, workers: int) -> int:
+    return(max(1, min(MAX_CHUNK_SIZE, n_items // (workers * 4))))
+
+
+def iter_gef_files(file_paths: list[str], workers: int|None = None, dialect: str = 'auto', layout: str = 'rows',
+                   hole_id_column: str|None = None, header_mapping_dict={}, stats: ParseStats|None = None,
+                   chunksize: int|None = None):
+    """
+    Parses files across CPU cores and yields one tuple per file, in the order of file_paths:
+
+        (file_path, dialect, cpt_header, header_units, measurements, hole_id, error)
+
+    dialect, header, units, measurements and hole id are None for files that could not be parsed, error holds the message.
+    Only a few chunks of files per worker are in flight, so a slow consumer (e.g. writing a database)
+    does not pile up parsed files in memory. Parameters as for read_gef_folder, chunksize is the number of files per task.
+    """
+    _check_dialect(dialect)
+    _check_layout(layout)
+    file_paths = list(file_paths)
+    if(workers is None):
+        workers = os.cpu_count() or 1
+    if(workers == 1 or len(file_paths) <= 1):
+        for file_path in file_paths:
+            yield _parse_file(file_path, dialect, layout, hole_id_column, header_mapping_dict, stats)
+        return
+    workers = min(workers, len(file_paths))
+    chunksize = chunksize or _default_chunksize(len(file_paths), workers)
+    # every task records into its own ParseStats, they are merged into stats here
+    task_args = ((file_paths[i:i + chunksize], dialect, layout, hole_id_column, header_mapping_dict, None if stats is None else ParseStats())
+                 for i in range(0, len(file_paths), chunksize))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for parsed_files, chunk_stats in _imap_bounded(executor, _parse_files, task_args, workers):
+            if(chunk_stats is not None):
+                stats.merge(chunk_stats)
+            yield from parsed_files
+
+
+def _extend_columns(columns: dict, n_rows: int, new_columns: dict, hole_id_column: str|None, hole_id):
+    """ Appends the columns of one file to the combined columns, missing columns are filled with NaN."""
+    n_new = len(next(iter(new_columns.values()), ()))
+    for name, values in new_columns.items():
+        if(name not in columns):
+            columns[name] = array('d', [NAN]) * n_rows
+        columns[name].extend(values)
+    for name, values in columns.items():
+        if(name not in new_columns and name != hole_id_column):
+            values.extend(array('d', [NAN]) * n_new)
+    if(hole_id_column is not None):
+        columns.setdefault(hole_id_column, []).extend([hole_id] * n_new)
+    return(n_rows + n_new)
+
+
+def read_gef_folder(pattern: str, workers: int|None = None, dialect: str = 'auto', layout: str = 'rows',
+                    hole_id_column: str|None = 'hole_id', header_mapping_dict={}, stats: ParseStats|None = None) -> GefBatchResult:
+    """
+    Parses all files matching a glob pattern (e.g. './GEF_SAMPLES/**/*.GEF.txt') across CPU cores.
+
+    Parameters
+    ----------
+    pattern : str
+        glob pattern, '**' matches subfolders
+    workers : int|None
+        number of worker processes, None uses all CPU cores, 1 parses in the current process
+    dialect : str
+        'auto' (default) detects the dialect per file, 'gef_txt' or 'columninfo'
+    layout : str
+        'rows' or 'columns', the columnar layout is much cheaper to send between processes
+    hole_id_column : str|None
+        name of the column that is added to the measurements with the hole id of the file
+        ('aufschluss_name' for .gef.txt files, 'TESTID' for #COLUMNINFO files), None disables it.
+    stats : ParseStats|None
+        aggregates the per-stage parse statistics of all files, including the files parsed in worker processes
+    Returns
+    -------
+    GefBatchResult with the combined measurements of all files and the per-file errors
+    """
+    result = GefBatchResult(measurements={} if layout == 'columns' else [])
+    n_rows = 0
+    parsed_files = iter_gef_files(sorted(glob(pattern, recursive=True)), workers=workers, dialect=dialect, layout=layout,
+                                  hole_id_column=hole_id_column, header_mapping_dict=header_mapping_dict, stats=stats)
+    for file_path, _, cpt_header, header_units, measurements, hole_id, error in parsed_files:
+        if(error is not None):
+            result.errors[file_path] = error
+            continue
+        result.file_paths.append(file_path)
+        result.headers.append(cpt_header)
+        result.header_units.append(header_units)
+        if(layout == 'columns'):
+            n_rows = _extend_columns(result.measurements, n_rows, measurements, hole_id_column, hole_id)
+        else:
+            result.measurements += measurements
+    return(result)
+
+
+def _is_gef_member(name: str, pattern: str|None) -> bool:
+    name = name.lower()
+    if(pattern is not None):
+        return(fnmatch(name, pattern.lower()))
+    return(name.endswith(ARCHIVE_SUFFIXES))
+
+
+def _parse_zip_members(archive_path: str, names: list[str], dialect: str, layout: str, hole_id_column: str|None,
+                       header_mapping_dict: dict, stats: ParseStats|None = None) -> tuple[list[tuple], ParseStats|None]:
+    """ Decompresses and parses a chunk of zip members in a worker process, the archive is opened once per chunk."""
+    parsed_members = []
+    with ZipFile(archive_path) as zip_file:
+        for name in names:
+            try:
+                file_bytes = zip_file.read(name)
+            except Exception as e:
+                parsed_members.append((name, None, None, None, None, None, f'{type(e).__name__}: {e}'))
+                continue
+            parsed_members.append(_parse_file(name, dialect, layout, hole_id_column, header_mapping_dict, stats, file_bytes=file_bytes))
+    return(parsed_members, stats)
+
+
+def _parse_members(members: list[tuple[str, bytes]], dialect: str, layout: str, hole_id_column: str|None,
+                   header_mapping_dict: dict, stats: ParseStats|None = None) -> tuple[list[tuple], ParseStats|None]:
+    """ Parses a chunk of (name, bytes) archive members in a worker process."""
+    return([_parse_file(name, dialect, layout, hole_id_column, header_mapping_dict, stats, file_bytes=file_bytes)
+            for name, file_bytes in members], stats)
+
+
+def _iter_tar_members(archive_path: str, pattern: str|None):
+    """ Yields (name, bytes) of the matching tar members in archive order, the archive is read as a stream (any compression)."""
+    with tarfile.open(archive_path, 'r|*') as tar_file:
+        for member in tar_file:
+            if(member.isfile() and _is_gef_member(member.name, pattern)):
+                yield member.name, tar_file.extractfile(member).read()
+
+
+def _chunked(iterable, chunksize: int):
+    iterator = iter(iterable)
+    while(chunk := list(islice(iterator, chunksize))):
+        yield chunk
+
+
+def read_gef_archive(archive_path: str|Path, workers: int|None = None, dialect: str = 'auto', layout: str = 'rows',
+                     hole_id_column: str|None = 'hole_id', header_mapping_dict={}, stats: ParseStats|None = None,
+                     pattern: str|None = None):
+    """
+    Parses the CPT files inside a zip or tar archive (.tar, .tar.gz, .tar.bz2, .tar.xz) without extracting it to disk.
+    Returns an iterator with one tuple per member, in archive order, like iter_gef_files:
+
+        (member_name, dialect, cpt_header, header_units, measurements, hole_id, error)
+
+    The members are passed to the readers as file_bytes, the dialect is detected per member.
+    Zip members are decompressed in the worker processes, every task opens the archive itself.
+    Tar archives can only be read sequentially, they are decompressed in this process and the members are parsed by the workers.
+    Only a few chunks of members per worker are in flight, so memory stays bounded for archives of any size.
+    The arguments and the archive type are checked when the function is called, not on the first member.
+
+    Parameters
+    ----------
+    archive_path : str|Path
+        zip or tar archive, the type is detected from the content
+    workers : int|None
+        number of worker processes, None uses all CPU cores, 1 parses in the current process
+    pattern : str|None
+        fnmatch pattern for the member names (case insensitive), None selects the members ending in .gef or .gef.txt
+    dialect, layout, hole_id_column, header_mapping_dict, stats
+        as for read_gef_folder
+    """
+    _check_dialect(dialect)
+    _check_layout(layout)
+    archive_path = str(archive_path)
+    if(not os.path.isfile(archive_path)):
+        raise FileNotFoundError(f'{archive_path} does not exist')
+    if(workers is None):
+        workers = os.cpu_count() or 1
+    parse_args = (dialect, layout, hole_id_column, header_mapping_dict)
+    if(zipfile.is_zipfile(archive_path)):
+        with ZipFile(archive_path) as zip_file:
+            names = [info.filename for info in zip_file.infolist() if not info.is_dir() and _is_gef_member(info.filename, pattern)]
+        return(_iter_zip_archive(archive_path, names, workers, parse_args, stats))
+    if(tarfile.is_tarfile(archive_path)):
+        return(_iter_tar_archive(archive_path, pattern, workers, parse_args, stats))
+    raise ValueError(f'{archive_path} is neither a zip nor a tar archive')
+
+
+def _iter_zip_archive(archive_path: str, names: list[str], workers: int, parse_args: tuple, stats: ParseStats|None):
+    if(workers == 1 or len(names) <= 1):
+        for names_chunk in _chunked(names, MAX_CHUNK_SIZE):
+            yield from _parse_zip_members(archive_path, names_chunk, *parse_args, stats)[0]
+        return
+    workers = min(workers, len(names))
+    chunksize = _default_chunksize(len(names), workers)
+    task_args = ((archive_path, names[i:i + chunksize], *parse_args, None if stats is None else ParseStats())
+                 for i in range(0, len(names), chunksize))
+    yield from _iter_tasks(_parse_zip_members, task_args, workers, stats)
+
+
+def _iter_tar_archive(archive_path: str, pattern: str|None, workers: int, parse_args: tuple, stats: ParseStats|None):
+    members = _iter_tar_members(archive_path, pattern)
+    if(workers == 1):
+        for name, file_bytes in members:
+            yield _parse_file(name, *parse_args, stats, file_bytes=file_bytes)
+        return
+    task_args = ((members_chunk, *parse_args, None if stats is None else ParseStats()) for members_chunk in _chunked(members, MAX_CHUNK_SIZE))
+    yield from _iter_tasks(_parse_members, task_args, workers, stats)
+
+
+def _iter_tasks(func, task_args, workers: int, stats: ParseStats|None):
+    """ Runs the chunk tasks in worker processes and yields the parsed members in order, the task stats are merged into stats."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for parsed_members, chunk_stats in _imap_bounded(executor, func, task_args, workers):
+            if(chunk_stats is not None):
+                stats.merge(chunk_stats)
+            yield from parsed_members
@@ -0,0 +1,287 @@
+"""
+Compact binary container for parsed CPTs.
+
+Layout of a .cptb file (all integers little-endian):
+
+    magic b'GEFCPTB\\x00' | format version (u32) | reserved (u32)
+    column blocks, 8-byte aligned: float64 values, followed by a validity bitmap
+        (bit i set = value i is defined, least significant bit first, as in Apache Arrow)
+    table of contents (JSON, utf-8)
+    trailer: offset of the table of contents (u64) | length of the table of contents (u64) | magic
+
+The table of contents holds one entry per CPT with its header, the number of rows and
+name, unit and byte offsets of each column. A file with one entry is a single CPT,
+a file with many entries is a bundle, e.g. a whole campaign.
+Because the table of contents sits at the end, a bundle can be written in one pass
+and opened without touching the column blocks, which can be memory-mapped.
+"""
+import json
+import math
+import mmap as mmap_lib
+import struct
+import sys
+from array import array
+from collections.abc import Iterable
+from itertools import repeat
+from pathlib import Path
+
+from .gef_reader import NAN
+
+MAGIC = b'GEFCPTB\x00'
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct('<8sII')
+_TRAILER = struct.Struct('<QQ8s')
+
+
+def _as_float_array(values) -> array:
+    """ Converts a column (array.array, numpy array or list of values as returned by read_gef_file) to array('d')."""
+    if(isinstance(values, array) and values.typecode == 'd'):
+        return(values)
+    try:
+        view = memoryview(values)
+        if(view.format == 'd' and view.c_contiguous):
+            result = array('d')
+            result.frombytes(view.cast('B'))
+            return(result)
+    except TypeError:
+        pass
+    result = array('d')
+    for value in values:
+        try:
+            result.append(NAN if value is None else float(value))
+        except (TypeError, ValueError):
+            result.append(NAN)
+    return(result)
+
+
+def _validity_bitmap(values: array, cells: Iterable|None = None) -> bytes:
+    """ Clears the bit of each NaN value. With the cells of a rows layout column only UNDEF (None), missing and text cells
+        are nulls, a literal nan cell is a defined value.
+    """
+    if(not any(map(math.isnan, values))):
+        return(b'\xff' * ((len(values) + 7) // 8))
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, (value, cell) in enumerate(zip(values, cells if cells is not None else repeat(None))):
+        if(value == value or isinstance(cell, float)):
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return(bytes(bitmap))
+
+
+def _to_columns(header_units, measurements) -> tuple[dict[str, array], dict[str, str]]:
+    """ Normalizes the output of read_gef_file / read_alt_gef_file (both layouts) to float columns and a unit dict."""
+    if(isinstance(measurements, dict)):
+        column_names = list(measurements.keys())
+        columns = {name: _as_float_array(values) for name, values in measurements.items()}
+    else:
+        column_names = list(dict.fromkeys(k for row in measurements for k in row))
+        columns = {name: _as_float_array([row.get(name) for row in measurements]) for name in column_names}
+    if(isinstance(header_units, dict)):
+        units = {name: header_units.get(name, '') for name in column_names}
+    else:
+        units = dict(zip(column_names, header_units or []))
+    return(columns, units)
+
+
+def _write_padding(f, position: int) -> int:
+    padding = -position % 8
+    f.write(b'\x00' * padding)
+    return(position + padding)
+
+
+class CPTBinaryWriter:
+    """ Writes one or many parsed CPTs into a binary container file, use it as a context manager:
+
+        with CPTBinaryWriter('campaign.cptb') as writer:
+            for file_path in file_paths:
+                writer.add(*read_gef_file(file_path, layout='columns'))
+    """
+
+    def __init__(self, path: str|Path):
+        self.path = Path(path)
+        self._f = open(self.path, 'wb')
+        self._f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0))
+        self._position = _PREAMBLE.size
+        self._entries = []
+
+    def add(self, cpt_header: dict, header_units, measurements):
+        """ Appends a CPT as returned by read_gef_file / read_alt_gef_file (rows or columns layout)."""
+        columns, units = _to_columns(header_units, measurements)
+        n_rows = len(next(iter(columns.values()), ()))
+        column_entries = []
+        for name, values in columns.items():
+            if(len(values) != n_rows):
+                raise ValueError(f'column {name!r} has {len(values)} values, expected {n_rows}')
+            data = values
+            if(sys.byteorder == 'big'):
+                data = array('d', values)
+                data.byteswap()
+            offset = self._position
+            self._f.write(data.tobytes())
+            self._position += n_rows * 8
+            validity_offset = self._position
+            cells = None if isinstance(measurements, dict) else (row.get(name) for row in measurements)
+            self._f.write(_validity_bitmap(values, cells))
+            self._position = _write_padding(self._f, self._position + (n_rows + 7) // 8)
+            column_entries.append({'name': name, 'unit': units.get(name, ''), 'offset': offset, 'validity_offset': validity_offset})
+        self._entries.append({'header': cpt_header, 'n_rows': n_rows, 'columns': column_entries})
+
+    def close(self):
+        if(self._f.closed):
+            return
+        toc = json.dumps({'entries': self._entries}, ensure_ascii=False, default=str).encode('utf-8')
+        self._f.write(toc)
+        self._f.write(_TRAILER.pack(self._position, len(toc), MAGIC))
+        self._f.close()
+
+    def __enter__(self):
+        return(self)
+
+    def abort(self):
+        """ Closes and removes an unfinished file, it would otherwise look like a valid file with fewer CPTs."""
+        if(not self._f.closed):
+            self._f.close()
+        self.path.unlink(missing_ok=True)
+
+    def __exit__(self, *exc_info):
+        if(exc_info[0] is None):
+            self.close()
+        else:
+            self.abort()
+
+
+class CPTBundle:
+    """ A binary container file opened with read_cpt_bundle.
+        Only the table of contents is read when opening, the columns of an entry are loaded when the entry is accessed:
+
+            bundle = read_cpt_bundle('campaign.cptb')
+            print(len(bundle), bundle.headers[0])
+            cpt_header, header_units, columns = bundle[0]
+    """
+
+    def __init__(self, path: str|Path, mmap: bool = True):
+        self.path = Path(path)
+        self._f = open(self.path, 'rb')
+        try:
+            magic, version, _ = _PREAMBLE.unpack(self._f.read(_PREAMBLE.size))
+            if(magic != MAGIC):
+                raise ValueError(f'{self.path} is not a binary CPT file')
+            if(version > FORMAT_VERSION):
+                raise ValueError(f'{self.path} has format version {version}, only versions up to {FORMAT_VERSION} are supported')
+            self._f.seek(-_TRAILER.size, 2)
+            toc_offset, toc_len, magic = _TRAILER.unpack(self._f.read(_TRAILER.size))
+            if(magic != MAGIC):
+                raise ValueError(f'{self.path} is truncated')
+            self._f.seek(toc_offset)
+            self.entries = json.loads(self._f.read(toc_len).decode('utf-8'))['entries']
+            self._mmap = None
+            if(mmap):
+                # the mapping stays valid after closing the file
+                self._mmap = mmap_lib.mmap(self._f.fileno(), 0, access=mmap_lib.ACCESS_READ)
+                self._f.close()
+        except BaseException:
+            self._f.close()
+            raise
+
+    @property
+    def headers(self) -> list[dict]:
+        return([entry['header'] for entry in self.entries])
+
+    def __len__(self) -> int:
+        return(len(self.entries))
+
+    def _read_block(self, offset: int, size: int):
+        if(self._mmap is not None):
+            return(memoryview(self._mmap)[offset:offset + size])
+        self._f.seek(offset)
+        return(self._f.read(size))
+
+    def read(self, index: int, with_validity: bool = False):
+        """ Returns cpt header, units and columns of an entry.
+            With mmap the columns are zero-copy memoryviews (format 'd') into the file, otherwise array('d') copies.
+            With with_validity=True the validity bitmaps of the columns are returned as fourth element.
+        """
+        entry = self.entries[index]
+        n_rows = entry['n_rows']
+        columns = {}
+        validity = {}
+        for column in entry['columns']:
+            data = self._read_block(column['offset'], n_rows * 8)
+            if(self._mmap is not None and sys.byteorder == 'little'):
+                columns[column['name']] = data.cast('d')
+            else:
+                values = array('d')
+                values.frombytes(data)
+                if(sys.byteorder == 'big'):
+                    values.byteswap()
+                columns[column['name']] = values
+            if(with_validity):
+                validity[column['name']] = self._read_block(column['validity_offset'], (n_rows + 7) // 8)
+        units = {column['name']: column['unit'] for column in entry['columns']}
+        if(with_validity):
+            return(entry['header'], units, columns, validity)
+        return(entry['header'], units, columns)
+
+    def __getitem__(self, index: int):
+        return(self.read(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.read(index)
+
+    def close(self):
+        """ Closes the file, with mmap=True the returned memoryviews must be released before."""
+        if(self._mmap is not None):
+            self._mmap.close()
+        self._f.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_cpt_binary(path: str|Path, cpt_header: dict, header_units, measurements):
+    """ Writes a single parsed CPT (as returned by read_gef_file / read_alt_gef_file) into a binary file."""
+    with CPTBinaryWriter(path) as writer:
+        writer.add(cpt_header, header_units, measurements)
+
+
+def read_cpt_binary(path: str|Path, mmap: bool = False, with_validity: bool = False):
+    """ Reads a single CPT written with write_cpt_binary.
+
+        Returns:
+            - cpt header
+            - dict of column name and unit
+            - dict of column name and values, array('d') or with mmap=True zero-copy memoryviews into the mapped file
+            - with with_validity=True: dict of column name and validity bitmap
+
+        The file is closed before returning. With mmap=True the returned memoryviews own the mapping,
+        it is unmapped when the last of them is released. read_cpt_bundle gives explicit control (close()).
+    """
+    bundle = CPTBundle(path, mmap=mmap)
+    try:
+        if(len(bundle) != 1):
+            raise ValueError(f'{path} contains {len(bundle)} CPTs, use read_cpt_bundle')
+        result = bundle.read(0, with_validity=with_validity)
+    except BaseException:
+        bundle.close()
+        raise
+    if(mmap):
+        # the file is already closed, the mapping is handed over to the memoryviews of the result
+        bundle._mmap = None
+    else:
+        bundle.close()
+    return(result)
+
+
+def write_cpt_bundle(path: str|Path, cpts):
+    """ Writes many parsed CPTs, an iterable of (cpt_header, header_units, measurements) tuples, into one binary file."""
+    with CPTBinaryWriter(path) as writer:
+        for cpt_header, header_units, measurements in cpts:
+            writer.add(cpt_header, header_units, measurements)
+
+
+def read_cpt_bundle(path: str|Path, mmap: bool = True) -> CPTBundle:
+    """ Opens a binary file written with write_cpt_bundle (or write_cpt_binary), only the table of contents is read."""
+    return(CPTBundle(path, mmap=mmap))
@@ -0,0 +1,206 @@
+"""
+Persistent on-disk cache for parsed GEF files.
+
+Every entry is a .cptb file (see binary.py) with one CPT: the measurements are float64 column blocks,
+the header, the units and what is needed to rebuild the reader output exactly (layout, text cells,
+missing cells of short rows) are in its JSON table of contents. Loading an entry never executes code,
+so a cache folder can be shared between users; a broken or foreign entry is treated as a miss.
+Entries are keyed by the hash of the file content, the parser version and the reader options,
+so a changed file or a new parser version never returns a stale result.
+The least recently used entries are evicted when the cache grows beyond max_bytes.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+from .binary import CPTBinaryWriter, CPTBundle
+from .gef_reader import read_gef_file, read_alt_gef_file, read_any_gef_file, PARSER_VERSION, _import_numpy
+
+CACHE_FILE_SUFFIX = '.cptb'
+# reader options that do not change the result and are not part of the key
+NON_KEY_KWARGS = ('stats', 'mmap')
+
+
+def _encode_entry(result: tuple) -> tuple[dict, dict|list]:
+    """ Splits a reader result into the table of contents header of the entry and the measurements for the writer."""
+    dialect = result[0] if len(result) == 4 else None
+    cpt_header, header_units, measurements = result[-3:]
+    entry = {'header': cpt_header, 'units': header_units, 'dialect': dialect}
+    if(isinstance(measurements, dict)):
+        entry['layout'] = 'columns'
+        entry['numpy'] = any(type(values).__name__ == 'ndarray' for values in measurements.values())
+        return(entry, measurements)
+    names = list(dict.fromkeys(name for row in measurements for name in row))
+    cells, missing = {}, {}
+    for i, row in enumerate(measurements):
+        for name in names:
+            if(name not in row):
+                missing.setdefault(name, []).append(i)
+            elif(isinstance(row[name], str)):
+                cells.setdefault(name, {})[str(i)] = row[name]
+    entry.update(layout='rows', names=names, cells=cells, missing=missing)
+    # the writer keeps literal nan cells of the rows valid, only UNDEF cells are nulls
+    return(entry, measurements)
+
+
+def _with_nulls(values: list, bitmap: bytes) -> list:
+    """ Sets the values of the cleared bits of a validity bitmap to None."""
+    for i, value in enumerate(values):
+        if(value != value and not bitmap[i >> 3] >> (i & 7) & 1):
+            values[i] = None
+    return(values)
+
+
+def _decode_entry(entry: dict, columns: dict, validity: dict) -> tuple:
+    """ Rebuilds the reader result of an entry, the inverse of _encode_entry.
+        In the rows layout only the nulls of the validity bitmaps (UNDEF) become None, literal nan cells stay float nan.
+    """
+    if(entry['layout'] == 'columns'):
+        measurements = dict(columns)
+        if(entry['numpy']):
+            np = _import_numpy()
+            measurements = {name: np.frombuffer(values, dtype=np.float64) for name, values in measurements.items()}
+    else:
+        names = entry['names']
+        values = [_with_nulls(columns[name].tolist(), validity[name]) for name in names]
+        measurements = [dict(zip(names, row)) for row in zip(*values)]
+        for name, row_cells in entry['cells'].items():
+            for i, value in row_cells.items():
+                measurements[int(i)][name] = value
+        for name, rows in entry['missing'].items():
+            for i in rows:
+                del measurements[i][name]
+    result = (entry['header'], entry['units'], measurements)
+    return(result if entry['dialect'] is None else (entry['dialect'], *result))
+
+
+class ParseCache:
+    """
+    Opt-in parse cache, use its read functions instead of the module level ones:
+
+        cache = ParseCache('./.gef_cache', max_bytes=2 * 1024**3)
+        cpt_header, header_units, measurements = cache.read_gef_file(file_path)
+        print(cache.stats())
+    """
+
+    def __init__(self, cache_dir: str|Path, max_bytes: int = 1024**3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # size of each entry in least recently used order,
+        # the access time is persisted as mtime of the entry file for the next session
+        entries = sorted((p.stat().st_mtime, p.name, p.stat().st_size) for p in self.cache_dir.glob('*' + CACHE_FILE_SUFFIX))
+        self._sizes = {name: size for _, name, size in entries}
+        self._total_bytes = sum(self._sizes.values())
+
+    def _key(self, content: bytes, reader_name: str, kwargs: dict) -> str:
+        h = hashlib.blake2b(content, digest_size=20)
+        # stats only records how the file was parsed and mmap how it is read, they do not change the result
+        key_kwargs = sorted((key, value) for key, value in kwargs.items() if key not in NON_KEY_KWARGS)
+        h.update(f'|{PARSER_VERSION}|{reader_name}|{key_kwargs!r}'.encode())
+        return(h.hexdigest())
+
+    def _load(self, name: str):
+        path = self.cache_dir / name
+        try:
+            with CPTBundle(path, mmap=False) as bundle:
+                _, _, columns, validity = bundle.read(0, with_validity=True)
+                result = _decode_entry(bundle.headers[0], columns, validity)
+            os.utime(path)
+        except (OSError, ValueError, KeyError, IndexError, TypeError, struct.error):
+            # missing (e.g. evicted by another process), broken or foreign entry
+            return(None)
+        return(result)
+
+    def _store(self, name: str, result):
+        entry, columns = _encode_entry(result)
+        if(json.loads(json.dumps(entry, ensure_ascii=False, default=str)) != entry):
+            # e.g. header values without a JSON representation, they would not be returned unchanged
+            return
+        # write atomically, other processes may read the same cache folder
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            with CPTBinaryWriter(tmp_path) as writer:
+                writer.add(entry, {}, columns)
+            size = os.path.getsize(tmp_path)
+            if(size > self.max_bytes):
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self.cache_dir / name)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self._total_bytes += size - self._sizes.pop(name, 0)
+        self._sizes[name] = size
+        self._evict()
+
+    def _evict(self):
+        for name in list(self._sizes):
+            if(self._total_bytes <= self.max_bytes):
+                break
+            try:
+                (self.cache_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= self._sizes.pop(name)
+            self.evictions += 1
+
+    def _read(self, reader, file_path: str|Path, kwargs: dict):
+        content = Path(file_path).read_bytes()
+        name = self._key(content, reader.__name__, kwargs) + CACHE_FILE_SUFFIX
+        result = self._load(name)
+        if(result is not None):
+            self.hits += 1
+            if(name in self._sizes):
+                self._sizes[name] = self._sizes.pop(name) # mark as most recently used
+            else:
+                # entry written by another process
+                self._sizes[name] = (self.cache_dir / name).stat().st_size
+                self._total_bytes += self._sizes[name]
+            return(result)
+        self.misses += 1
+        result = reader(file_bytes=content, **kwargs)
+        self._store(name, result)
+        return(result)
+
+    def read_gef_file(self, file_path: str|Path, **kwargs):
+        """ Cached read_gef_file, keyword arguments are passed to the reader."""
+        return(self._read(read_gef_file, file_path, kwargs))
+
+    def read_alt_gef_file(self, file_path: str|Path, **kwargs):
+        """ Cached read_alt_gef_file, keyword arguments are passed to the reader."""
+        return(self._read(read_alt_gef_file, file_path, kwargs))
+
+    def read_any_gef_file(self, file_path: str|Path, **kwargs):
+        """ Cached read_any_gef_file, keyword arguments are passed to the reader."""
+        return(self._read(read_any_gef_file, file_path, kwargs))
+
+    def stats(self) -> dict:
+        """ Returns the hit/miss statistics and the size of the cache."""
+        requests = self.hits + self.misses
+        return({
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._sizes),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+        })
+
+    def clear(self):
+        """ Removes all entries from the cache folder."""
+        for name in list(self._sizes):
+            try:
+                (self.cache_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+        self._sizes.clear()
+        self._total_bytes = 0
@@ -0,0 +1,185 @@
+"""
+Incremental catalog of a directory tree of CPT files.
+
+The catalog keeps a JSON manifest with path, size, mtime and content hash of every file
+together with the parsed header. refresh() only stats the files, files whose size or mtime changed
+are hashed and only re-parsed if the content changed, deleted files are dropped.
+"""
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, field
+from glob import glob
+from pathlib import Path
+
+from .gef_reader import read_gef_header, _check_dialect, PARSER_VERSION
+from .mapping import get_mapper
+from .spatial import CPTCatalog
+
+MANIFEST_FILE_NAME = '.gef_catalog.json'
+MANIFEST_VERSION = 1
+
+
+@dataclass(slots=True)
+class CatalogEntry:
+    path: str # relative to the catalog root, with forward slashes
+    size: int
+    mtime_ns: int
+    hash: str
+    dialect: str|None = None
+    header: dict|None = None
+    header_units: dict|list|None = None
+    n_rows: int = 0
+    error: str|None = None
+
+
+@dataclass
+class RefreshResult:
+    """ Relative paths of the files that changed in a refresh."""
+    added: list[str] = field(default_factory=list)
+    modified: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: int = 0
+
+
+def _content_hash(content: bytes) -> str:
+    return(hashlib.blake2b(content, digest_size=20).hexdigest())
+
+
+def _parse_entry(path: Path, rel_path: str, size: int, mtime_ns: int, old_entry: CatalogEntry|None, dialect: str,
+                 header_mapping_dict) -> CatalogEntry:
+    """ Reads, hashes and parses one file, runs in a worker process for large refreshes.
+        If the content did not change (e.g. the file was only touched), the old entry is kept with the new mtime.
+    """
+    content = path.read_bytes()
+    entry = CatalogEntry(rel_path, size, mtime_ns, _content_hash(content))
+    if(old_entry is not None and old_entry.hash == entry.hash):
+        old_entry.size, old_entry.mtime_ns = size, mtime_ns
+        return(old_entry)
+    try:
+        # only the header is parsed, the data rows are counted
+        entry.dialect, entry.header, entry.header_units, data_offset = read_gef_header(
+            file_bytes=content, dialect=dialect, header_mapping_dict=header_mapping_dict)
+        entry.n_rows = sum(1 for line in content[data_offset:].splitlines() if line.strip())
+    except Exception as e:
+        entry.error = f'{type(e).__name__}: {e}'
+    return(entry)
+
+
+class DirectoryCatalog:
+    """
+    Catalog of all files matching pattern below root, persisted in a manifest file.
+
+    e.g. catalog = DirectoryCatalog('./GEF_SAMPLES', pattern='**/*.GEF.txt')
+         changes = catalog.refresh()   # parses only new and modified files
+         headers = catalog.headers()
+    """
+
+    def __init__(self, root: str|Path, pattern: str = '**/*.gef.txt', manifest_path: str|Path|None = None,
+                 dialect: str = 'auto', header_mapping_dict={}, workers: int = 1):
+        _check_dialect(dialect)
+        self.root = Path(root)
+        self.pattern = pattern
+        self.manifest_path = Path(manifest_path) if manifest_path is not None else self.root / MANIFEST_FILE_NAME
+        self.dialect = dialect
+        self.header_mapping_dict = header_mapping_dict
+        self.workers = workers
+        self.entries: dict[str, CatalogEntry] = {}
+        self._load()
+
+    def _options(self) -> dict:
+        # a manifest written with other options or another parser version is not reused
+        return({'parser_version': PARSER_VERSION, 'dialect': self.dialect,
+                'header_mapping': repr(get_mapper(self.header_mapping_dict).additional_mapping_dict)})
+
+    def _load(self):
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        if(manifest.get('version') != MANIFEST_VERSION or manifest.get('options') != self._options()):
+            return
+        self.entries = {entry['path']: CatalogEntry(**entry) for entry in manifest['entries']}
+
+    def save(self):
+        """ Writes the manifest atomically, refresh calls it if anything changed."""
+        manifest = {'version': MANIFEST_VERSION, 'options': self._options(), 'entries': [asdict(e) for e in self.entries.values()]}
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.manifest_path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def refresh(self) -> RefreshResult:
+        """ Updates the catalog with one stat per file, only added or modified files are read and parsed."""
+        result = RefreshResult()
+        seen = set()
+        changed = [] # (path, rel_path, size, mtime_ns, old entry)
+        # plain string operations, pathlib would cost more than the stat per file
+        root_prefix_len = len(os.path.join(str(self.root), ''))
+        for file_path in glob(os.path.join(str(self.root), self.pattern), recursive=True):
+            try:
+                st = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            if(not stat.S_ISREG(st.st_mode)):
+                continue
+            rel_path = file_path[root_prefix_len:].replace(os.sep, '/')
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if(entry is not None and entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns):
+                result.unchanged += 1
+                continue
+            changed.append((Path(file_path), rel_path, st.st_size, st.st_mtime_ns, entry))
+
+        for rel_path in [p for p in self.entries if p not in seen]:
+            del self.entries[rel_path]
+            result.removed.append(rel_path)
+
+        for entry in self._parse_changed(changed):
+            old_entry = self.entries.get(entry.path)
+            if(old_entry is None):
+                result.added.append(entry.path)
+            elif(old_entry.hash == entry.hash):
+                result.unchanged += 1
+            else:
+                result.modified.append(entry.path)
+            self.entries[entry.path] = entry
+
+        if(changed or result.removed or not self.manifest_path.exists()):
+            self.save()
+        return(result)
+
+    def _parse_changed(self, changed: list[tuple]):
+        if(not changed):
+            return([])
+        args = list(zip(*changed)) + [[self.dialect] * len(changed), [self.header_mapping_dict] * len(changed)]
+        if(self.workers == 1 or len(changed) == 1):
+            return(list(map(_parse_entry, *args)))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return(list(executor.map(_parse_entry, *args, chunksize=max(1, len(changed) // (self.workers * 4)))))
+
+    def __len__(self) -> int:
+        return(len(self.entries))
+
+    def __iter__(self):
+        return(iter(self.entries.values()))
+
+    def paths(self) -> list[Path]:
+        """ Returns the absolute paths of all files that could be parsed."""
+        return([self.root / e.path for e in self.entries.values() if e.error is None])
+
+    def headers(self) -> list[dict]:
+        """ Returns the headers of all files that could be parsed, in the order of paths()."""
+        return([e.header for e in self.entries.values() if e.error is None])
+
+    def errors(self) -> dict[str, str]:
+        return({e.path: e.error for e in self.entries.values() if e.error is not None})
+
+    def to_spatial_catalog(self):
+        """ Returns a CPTCatalog (spatial index) of the collars, the ids are the relative paths."""
+        entries = [e for e in self.entries.values() if e.error is None]
+        return(CPTCatalog.from_headers([e.header for e in entries], ids=[e.path for e in entries]))
@@ -0,0 +1,288 @@
+"""
+Command line interface, installed as the gef-reader console script (or python -m gef_reader).
+
+    gef-reader parse ./GEF_SAMPLES --jobs 4
+    gef-reader validate ./GEF_SAMPLES
+    gef-reader convert ./GEF_SAMPLES --to csv --out ./leapfrog
+    gef-reader convert ./GEF_SAMPLES --to sqlite --out campaign.sqlite
+
+Paths can be files or folders, folders are searched recursively for --pattern (case insensitive).
+Progress goes to stderr, the summary (files/s, rows/s, failures) to stdout.
+The exit code is 1 if any file failed, so cron jobs notice broken files. Only the standard library is used.
+"""
+import argparse
+import csv
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .batch import iter_gef_files
+from .binary import CPTBinaryWriter
+from .gef_reader import DIALECTS
+from .models import _header_from_gef
+from .profile import DEPTH_COLUMNS
+from .stats import ParseStats
+from .store import CPTStore
+
+DEFAULT_PATTERN = '*.gef.txt'
+OUTPUT_FORMATS = ('csv', 'cptb', 'sqlite')
+# seconds between progress lines, on a terminal the line is overwritten more often
+PROGRESS_INTERVAL = 10.0
+PROGRESS_INTERVAL_TTY = 0.2
+
+
+def find_files(paths: list[str], pattern: str = DEFAULT_PATTERN) -> list[str]:
+    """ Returns the files and the files matching pattern below the folders of paths, sorted per folder and without duplicates."""
+    file_paths = []
+    for path in map(Path, paths):
+        if(path.is_dir()):
+            file_paths += sorted(str(p) for p in path.rglob(pattern, case_sensitive=False) if p.is_file())
+        elif(path.exists()):
+            file_paths.append(str(path))
+        else:
+            raise FileNotFoundError(f'{path} does not exist')
+    return(list(dict.fromkeys(file_paths)))
+
+
+def _depth_name(columns: dict) -> str|None:
+    return(next((name for name in DEPTH_COLUMNS if name in columns), None))
+
+
+def validate_cpt(cpt_header: dict, header_units, columns: dict) -> list[str]:
+    """ Returns the problems of a parsed CPT (columns layout): no rows, no depth column, depths not increasing."""
+    n_rows = len(next(iter(columns.values()), ()))
+    if(n_rows == 0):
+        return(['no measurement rows'])
+    depth_name = _depth_name(columns)
+    if(depth_name is None):
+        return([f'no depth column, expected one of {DEPTH_COLUMNS}'])
+    depths = columns[depth_name]
+    problems = []
+    undefined = sum(1 for d in depths if d != d)
+    if(undefined):
+        problems.append(f'{undefined} rows without depth')
+    for i in range(1, n_rows):
+        if(depths[i] <= depths[i - 1]):
+            problems.append(f'depth not increasing at row {i} ({depths[i - 1]} -> {depths[i]})')
+            break
+    return(problems)
+
+
+class _Progress:
+    """ Counts files, rows and failures and writes a progress line to stderr from time to time."""
+
+    def __init__(self, n_files: int, quiet: bool = False, stream=None):
+        self.n_files = n_files
+        self.files = self.rows = 0
+        self.failures = {}
+        self.stream = stream = sys.stderr if stream is None else stream
+        self.quiet = quiet
+        self.tty = stream.isatty()
+        self.interval = PROGRESS_INTERVAL_TTY if self.tty else PROGRESS_INTERVAL
+        self.stats = None
+        self.start = self._last = time.perf_counter()
+
+    def update(self, file_path: str, rows: int = 0, error: str|None = None):
+        self.files += 1
+        self.rows += rows
+        if(error is not None):
+            self.failures[file_path] = error
+        now = time.perf_counter()
+        if(not self.quiet and (now - self._last >= self.interval or self.files == self.n_files)):
+            self._last = now
+            line = f'{self.files}/{self.n_files} files, {self.rows} rows, {len(self.failures)} failed'
+            self.stream.write(f'\r{line}' if self.tty else f'{line}\n')
+            if(self.tty and self.files == self.n_files):
+                self.stream.write('\n')
+            self.stream.flush()
+
+    def summary(self) -> str:
+        seconds = max(time.perf_counter() - self.start, 1e-9)
+        return(f'{self.files} files ({len(self.failures)} failed), {self.rows} rows in {seconds:.2f} s: '
+               f'{self.files / seconds:.1f} files/s, {self.rows / seconds:.0f} rows/s')
+
+
+class _CsvOutput:
+    """ Writes collar.csv (one line per CPT) and intervals.csv (one line per depth step, from/to) as read by Leapfrog.
+        The columns differ between files, the intervals are spooled to a temporary file and written with the union of all columns on close.
+    """
+
+    def __init__(self, out: Path):
+        out.mkdir(parents=True, exist_ok=True)
+        self.out = out
+        self.collars = []
+        self.blocks = [] # (column names, number of rows) per file
+        self.spool = tempfile.TemporaryFile('w+', newline='', encoding='utf-8')
+        self.spool_writer = csv.writer(self.spool)
+
+    def add(self, file_path: str, dialect: str, cpt_header: dict, header_units, columns: dict):
+        depth_name = _depth_name(columns)
+        if(depth_name is None):
+            raise ValueError(f'no depth column, expected one of {DEPTH_COLUMNS}')
+        header = _header_from_gef(cpt_header)
+        hole_id = header.hole_id if header.hole_id not in (None, '') else Path(file_path).name
+        self.collars.append({'hole_id': hole_id, 'x': header.easting, 'y': header.northing, 'z': header.elevation,
+                             'file': file_path, 'dialect': dialect,
+                             **{key: json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+                                for key, value in cpt_header.items()}})
+        depths = columns[depth_name]
+        names = [name for name in columns if name != depth_name]
+        values = [columns[name] for name in names]
+        n_rows = len(depths)
+        for i in range(n_rows):
+            # the last interval gets the length of the one before
+            to = depths[i + 1] if i + 1 < n_rows else (round(2 * depths[i] - depths[i - 1], 10) if n_rows > 1 else depths[i])
+            self.spool_writer.writerow([hole_id, depths[i], to, *('' if v[i] != v[i] else v[i] for v in values)])
+        self.blocks.append((names, n_rows))
+
+    def close(self):
+        fieldnames = list(dict.fromkeys(key for collar in self.collars for key in collar))
+        with open(self.out / 'collar.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(self.collars)
+        all_names = list(dict.fromkeys(name for names, _ in self.blocks for name in names))
+        self.spool.seek(0)
+        reader = csv.reader(self.spool)
+        with open(self.out / 'intervals.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['hole_id', 'from', 'to', *all_names])
+            for names, n_rows in self.blocks:
+                if(names == all_names):
+                    for _ in range(n_rows):
+                        writer.writerow(next(reader))
+                    continue
+                positions = {name: 3 + i for i, name in enumerate(names)}
+                for _ in range(n_rows):
+                    row = next(reader)
+                    writer.writerow(row[:3] + [row[positions[name]] if name in positions else '' for name in all_names])
+        self.spool.close()
+
+    def abort(self):
+        """ Discards the spooled intervals, collar.csv and intervals.csv are only written by close."""
+        self.spool.close()
+
+
+class _BundleOutput:
+    def __init__(self, out: Path):
+        self.writer = CPTBinaryWriter(out)
+
+    def add(self, file_path: str, dialect: str, cpt_header: dict, header_units, columns: dict):
+        self.writer.add(cpt_header, header_units, columns)
+
+    def close(self):
+        self.writer.close()
+
+    def abort(self):
+        self.writer.abort()
+
+
+class _SqliteOutput:
+    def __init__(self, out: Path):
+        self.store = CPTStore(out)
+        self.ingest = self.store.ingest()
+
+    def add(self, file_path: str, dialect: str, cpt_header: dict, header_units, columns: dict):
+        self.ingest.add(cpt_header, header_units, columns, source=file_path, dialect=dialect)
+
+    def close(self):
+        self.ingest.close()
+        self.store.close()
+
+    def abort(self):
+        self.ingest.abort()
+        self.store.close()
+
+
+_OUTPUTS = {'csv': _CsvOutput, 'cptb': _BundleOutput, 'sqlite': _SqliteOutput}
+
+
+def _run(args, handle_cpt=None) -> _Progress:
+    """ Parses the files of args.paths and calls handle_cpt(file_path, dialect, header, units, columns) per parsed file,
+        a returned error message or exception counts the file as failed.
+    """
+    file_paths = find_files(args.paths, args.pattern)
+    progress = _Progress(len(file_paths), quiet=args.quiet)
+    stats = ParseStats() if getattr(args, 'stats', False) else None
+    for file_path, dialect, cpt_header, header_units, columns, _, error in iter_gef_files(
+            file_paths, workers=args.jobs, dialect=args.dialect, layout='columns', stats=stats):
+        rows = 0
+        if(error is None):
+            rows = len(next(iter(columns.values()), ()))
+            if(handle_cpt is not None):
+                try:
+                    error = handle_cpt(file_path, dialect, cpt_header, header_units, columns)
+                except Exception as e:
+                    error = f'{type(e).__name__}: {e}'
+        progress.update(file_path, rows=rows, error=error)
+    progress.stats = stats
+    return(progress)
+
+
+def _parse(args) -> _Progress:
+    return(_run(args))
+
+
+def _validate(args) -> _Progress:
+    def handle_cpt(file_path, dialect, cpt_header, header_units, columns):
+        problems = validate_cpt(cpt_header, header_units, columns)
+        return('; '.join(problems) if problems else None)
+    return(_run(args, handle_cpt))
+
+
+def _convert(args) -> _Progress:
+    out = Path(args.out)
+    output = _OUTPUTS[args.to](out)
+    def handle_cpt(file_path, dialect, cpt_header, header_units, columns):
+        output.add(file_path, dialect, cpt_header, header_units, columns)
+    try:
+        progress = _run(args, handle_cpt)
+    except BaseException:
+        # e.g. Ctrl+C, an unfinished output must not look like a complete one
+        output.abort()
+        raise
+    output.close()
+    return(progress)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='gef-reader', description='Parse, validate and convert CPT files (.gef.txt and #COLUMNINFO).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('paths', nargs='+', help='files or folders, folders are searched recursively')
+    common.add_argument('--pattern', default=DEFAULT_PATTERN, help=f'file name pattern in folders, case insensitive (default: {DEFAULT_PATTERN})')
+    common.add_argument('--jobs', '-j', type=int, default=None, help='number of worker processes (default: all CPU cores)')
+    common.add_argument('--dialect', default='auto', choices=DIALECTS, help='file dialect (default: auto, detected per file)')
+    common.add_argument('--quiet', '-q', action='store_true', help='no progress output')
+
+    parse_parser = subparsers.add_parser('parse', parents=[common], help='parse the files and report throughput and failures')
+    parse_parser.add_argument('--stats', action='store_true', help='print the per-stage parse statistics as JSON')
+    parse_parser.set_defaults(func=_parse)
+    subparsers.add_parser('validate', parents=[common], help='parse the files and check rows and depths').set_defaults(func=_validate)
+    convert_parser = subparsers.add_parser('convert', parents=[common], help='convert the files to csv, cptb or sqlite')
+    convert_parser.add_argument('--to', required=True, choices=OUTPUT_FORMATS,
+                                help='csv: folder with collar.csv and intervals.csv, cptb: binary bundle file, sqlite: CPTStore database')
+    convert_parser.add_argument('--out', '-o', required=True, help='output folder (csv) or file')
+    convert_parser.set_defaults(func=_convert)
+    return(parser)
+
+
+def main(argv: list[str]|None = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        progress = args.func(args)
+    except FileNotFoundError as e:
+        print(f'gef-reader: {e}', file=sys.stderr)
+        return(2)
+    for file_path, error in progress.failures.items():
+        print(f'FAILED {file_path}: {error}', file=sys.stderr)
+    if(progress.stats is not None):
+        print(json.dumps(progress.stats.as_dict(), indent=2))
+    print(progress.summary())
+    return(1 if progress.failures else 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
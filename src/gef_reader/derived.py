@@ -0,0 +1,310 @@
+"""
+Derived CPT parameters, computed column-wise for one or many soundings.
+
+From qc, fs, u2 and depth the following columns are derived (Robertson 2009/2010):
+
+    qt = qc + u2 (1 - a)                                  corrected cone resistance, unit of qc
+    Rf = fs / qt * 100                                    friction ratio [%]
+    sigma_v, u0, sigma_v_eff                              total / hydrostatic / effective vertical stress [kPa]
+    Qtn = (qt - sigma_v) / pa * (pa / sigma_v_eff)^n      normalized cone resistance, n iterated with Ic
+    Fr = fs / (qt - sigma_v) * 100                        normalized friction ratio [%]
+    ic = sqrt((3.47 - log10 Qtn)^2 + (log10 Fr + 1.22)^2) soil behaviour type index
+    sbt_zone                                              soil behaviour type zone (2..7) from ic
+    Su_min, Su_max = (qt - sigma_v) / Nkt                 undrained shear strength [kPa] for ic >= su_ic_min
+
+The stresses use the unit weights above and below the groundwater level (gw_stand of the header, a depth below
+the start of the sounding). Columns that already exist in a file are kept and used as input (e.g. a vendor qt).
+With numpy the whole batch is computed as one set of arrays, otherwise with loops over array('d') columns.
+"""
+from array import array
+from dataclasses import dataclass
+from math import log10, sqrt
+
+from .binary import _to_columns
+from .gef_reader import _import_numpy, NAN
+from .profile import depth_column
+
+ENGINES = ('auto', 'numpy', 'python')
+ATMOSPHERIC_PRESSURE = 100.0 # kPa
+# upper Ic bounds of the soil behaviour type zones 7 (gravelly sand) to 3 (clay), above is zone 2 (organic soil)
+SBT_ZONE_BOUNDS = ((1.31, 7), (2.05, 6), (2.60, 5), (2.95, 4), (3.60, 3))
+MAX_STRESS_EXPONENT_ITERATIONS = 20
+# pressure units -> factor to kPa
+PRESSURE_UNITS = {'mpa': 1000.0, 'kpa': 1.0, 'pa': 0.001, 'bar': 100.0}
+DERIVED_COLUMNS = ('qt', 'Rf', 'sigma_v', 'u0', 'sigma_v_eff', 'Qtn', 'Fr', 'ic', 'sbt_zone', 'Su_min', 'Su_max')
+
+
+@dataclass
+class SiteParameters:
+    """ Cone and soil parameters of the derivation, unit weights in kN/m³, depths in m."""
+    area_ratio: float = 0.8 # net area ratio a of the cone
+    unit_weight: float = 18.0 # above the groundwater level
+    unit_weight_saturated: float = 20.0 # below the groundwater level
+    unit_weight_water: float = 9.81
+    groundwater_depth: float|None = None # None uses gw_stand of the header, no groundwater if there is none
+    nkt_min: float = 14.0 # cone factor range for Su_max and Su_min
+    nkt_max: float = 20.0
+    su_ic_min: float = 2.6 # Su is only derived for fine grained soils
+
+
+def _kpa_factor(unit: str|None) -> float:
+    """ Returns the factor from a pressure unit (e.g. '[MPa]' or 'kPa') to kPa.
+        MPa is assumed only if the unit is missing (None, '' or the placeholder '[-]'), other units raise a ValueError.
+    """
+    name = (unit or '').strip(' []').casefold()
+    if(name in ('', '-')):
+        return(1000.0)
+    if(name not in PRESSURE_UNITS):
+        raise ValueError(f'unknown pressure unit {unit!r}, expected one of {list(PRESSURE_UNITS)}')
+    return(PRESSURE_UNITS[name])
+
+
+def _unit_like(template: str|None, unit: str) -> str:
+    """ Writes a unit with brackets if the units of the file have them (.gef.txt files)."""
+    return(f'[{unit}]' if template and template.startswith('[') else unit)
+
+
+def _groundwater_depth(cpt_header: dict, parameters: SiteParameters) -> float:
+    if(parameters.groundwater_depth is not None):
+        return(parameters.groundwater_depth)
+    value = cpt_header.get('gw_stand', cpt_header.get('water_level'))
+    if(isinstance(value, str)):
+        value = value.replace(',', '.')
+    try:
+        return(float(value))
+    except (TypeError, ValueError):
+        return(NAN)
+
+
+def sbt_zone(ic: float) -> float:
+    """ Returns the soil behaviour type zone (Robertson 2010) of an Ic value, NaN for NaN."""
+    if(ic != ic):
+        return(NAN)
+    for bound, zone in SBT_ZONE_BOUNDS:
+        if(ic < bound):
+            return(float(zone))
+    return(2.0)
+
+
+def _numpy_for_engine(engine: str):
+    """ Returns numpy for engine 'numpy' and for 'auto' if it is installed, None for the python engine."""
+    if(engine == 'python'):
+        return(None)
+    try:
+        return(_import_numpy())
+    except ImportError:
+        if(engine == 'numpy'):
+            raise
+        return(None)
+
+
+def _prepare(cpt_header: dict, header_units, measurements) -> tuple[dict, dict, str]:
+    """ Returns the columns, units and the name of the depth column of a parse result (both layouts)."""
+    if(isinstance(measurements, dict)):
+        columns = dict(measurements)
+        names = list(columns)
+        units = dict(header_units) if isinstance(header_units, dict) else dict(zip(names, header_units or []))
+    else:
+        columns, units = _to_columns(header_units, measurements)
+    for name in ('qc', 'fs'):
+        if(name not in columns):
+            raise KeyError(f'column {name!r} is required to derive parameters, columns: {list(columns)}')
+    return(columns, units, depth_column(columns))
+
+
+# python engine
+
+def _derive_python(columns: dict, units: dict, depth_name: str, gw_depth: float, parameters: SiteParameters) -> dict[str, array]:
+    depths = columns[depth_name]
+    n = len(depths)
+    qc_factor = _kpa_factor(units.get('qc'))
+    fs_factor = _kpa_factor(units.get('fs'))
+    u2_factor = _kpa_factor(units.get('u2'))
+    qc, fs = columns['qc'], columns['fs']
+    u2 = columns.get('u2')
+    given_qt = columns.get('qt')
+    qt_factor = _kpa_factor(units.get('qt'))
+    p = parameters
+    pa = ATMOSPHERIC_PRESSURE
+    out = {name: array('d', [NAN]) * n for name in DERIVED_COLUMNS}
+    sigma_v = 0.0
+    previous_depth = 0.0
+    for i in range(n):
+        if(given_qt is not None):
+            qt = given_qt[i] * qt_factor
+        else:
+            qt = qc[i] * qc_factor + (0.0 if u2 is None else u2[i] * u2_factor) * (1 - p.area_ratio)
+        f = fs[i] * fs_factor
+        out['qt'][i] = qt / qc_factor
+        if(qt > 0):
+            out['Rf'][i] = f / qt * 100
+        z = depths[i]
+        if(z != z):
+            continue
+        gamma = p.unit_weight_saturated if gw_depth == gw_depth and z > gw_depth else p.unit_weight
+        sigma_v += gamma * (z - previous_depth)
+        previous_depth = z
+        u0 = p.unit_weight_water * (z - gw_depth) if gw_depth == gw_depth and z > gw_depth else 0.0
+        sigma_v_eff = sigma_v - u0
+        out['sigma_v'][i], out['u0'][i], out['sigma_v_eff'][i] = sigma_v, u0, sigma_v_eff
+        net = qt - sigma_v
+        if(not (net > 0 and f > 0 and sigma_v_eff > 0)):
+            continue
+        fr = f / net * 100
+        exponent = 1.0
+        for _ in range(MAX_STRESS_EXPONENT_ITERATIONS):
+            qtn = net / pa * (pa / sigma_v_eff) ** exponent
+            ic = sqrt((3.47 - log10(qtn)) ** 2 + (log10(fr) + 1.22) ** 2)
+            new_exponent = min(1.0, 0.381 * ic + 0.05 * sigma_v_eff / pa - 0.15)
+            converged = abs(new_exponent - exponent) < 0.01
+            exponent = new_exponent
+            if(converged):
+                break
+        out['Qtn'][i], out['Fr'][i], out['ic'][i] = qtn, fr, ic
+        out['sbt_zone'][i] = sbt_zone(ic)
+        if(ic >= p.su_ic_min):
+            out['Su_min'][i] = net / p.nkt_max
+            out['Su_max'][i] = net / p.nkt_min
+    return(out)
+
+
+# numpy engine
+
+def _stresses_numpy(np, depths, gw_depth: float, parameters: SiteParameters):
+    """ Returns sigma_v and u0 of one CPT, rows without depth are NaN and do not add stress."""
+    valid = ~np.isnan(depths)
+    z = depths[valid]
+    below_water = z > gw_depth if gw_depth == gw_depth else np.zeros(len(z), dtype=bool)
+    gamma = np.where(below_water, parameters.unit_weight_saturated, parameters.unit_weight)
+    sigma_v = np.full(len(depths), np.nan)
+    u0 = np.full(len(depths), np.nan)
+    sigma_v[valid] = np.cumsum(gamma * np.diff(z, prepend=0.0))
+    u0[valid] = np.where(below_water, parameters.unit_weight_water * (z - gw_depth), 0.0)
+    return(sigma_v, u0)
+
+
+def _derive_numpy(np, prepared: list[tuple[dict, dict, str, float]], parameters: SiteParameters) -> list[dict]:
+    """ Derives the columns of all CPTs at once on the concatenated columns, only the stresses are cumulated per CPT."""
+    lengths = [len(columns[depth_name]) for columns, _, depth_name, _ in prepared]
+    starts = [0]
+    for length in lengths[:-1]:
+        starts.append(starts[-1] + length)
+    p = parameters
+    pa = ATMOSPHERIC_PRESSURE
+
+    def concat(parts):
+        return(np.concatenate(parts) if parts else np.empty(0))
+
+    qc_factor, qc, fs, qt, sigma_v, u0 = [], [], [], [], [], []
+    for columns, units, depth_name, gw_depth in prepared:
+        n = len(columns[depth_name])
+        factor = _kpa_factor(units.get('qc'))
+        qc_factor.append(np.full(n, factor))
+        qc_kpa = np.asarray(columns['qc'], dtype=np.float64) * factor
+        qc.append(qc_kpa)
+        fs.append(np.asarray(columns['fs'], dtype=np.float64) * _kpa_factor(units.get('fs')))
+        if('qt' in columns):
+            qt.append(np.asarray(columns['qt'], dtype=np.float64) * _kpa_factor(units.get('qt')))
+        elif('u2' in columns):
+            qt.append(qc_kpa + np.asarray(columns['u2'], dtype=np.float64) * _kpa_factor(units.get('u2')) * (1 - p.area_ratio))
+        else:
+            qt.append(qc_kpa)
+        stresses = _stresses_numpy(np, np.asarray(columns[depth_name], dtype=np.float64), gw_depth, p)
+        sigma_v.append(stresses[0])
+        u0.append(stresses[1])
+    qc_factor, fs, qt, sigma_v, u0 = concat(qc_factor), concat(fs), concat(qt), concat(sigma_v), concat(u0)
+    sigma_v_eff = sigma_v - u0
+    total = len(qt)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rf = np.where(qt > 0, fs / qt * 100, np.nan)
+        net = qt - sigma_v
+        valid = (net > 0) & (fs > 0) & (sigma_v_eff > 0)
+        net = np.where(valid, net, np.nan)
+        fr = fs / net * 100
+        # the stress exponent n is iterated per row until it changes less than 0.01, as in the python engine
+        exponent = np.ones(total)
+        qtn = np.full(total, np.nan)
+        ic = np.full(total, np.nan)
+        done = ~valid
+        for _ in range(MAX_STRESS_EXPONENT_ITERATIONS):
+            if(done.all()):
+                break
+            active = ~done
+            qtn = np.where(active, net / pa * (pa / sigma_v_eff) ** exponent, qtn)
+            ic = np.where(active, np.sqrt((3.47 - np.log10(qtn)) ** 2 + (np.log10(fr) + 1.22) ** 2), ic)
+            new_exponent = np.minimum(1.0, 0.381 * ic + 0.05 * sigma_v_eff / pa - 0.15)
+            done = done | (np.abs(new_exponent - exponent) < 0.01)
+            exponent = np.where(active, new_exponent, exponent)
+        zone = np.full(total, 2.0)
+        for bound, zone_number in reversed(SBT_ZONE_BOUNDS):
+            zone = np.where(ic < bound, float(zone_number), zone)
+        zone = np.where(np.isnan(ic), np.nan, zone)
+        fine = ic >= p.su_ic_min
+        su_min = np.where(fine, net / p.nkt_max, np.nan)
+        su_max = np.where(fine, net / p.nkt_min, np.nan)
+
+    derived = {'qt': qt / qc_factor, 'Rf': rf, 'sigma_v': sigma_v, 'u0': u0, 'sigma_v_eff': sigma_v_eff, 'Qtn': qtn, 'Fr': fr,
+               'ic': ic, 'sbt_zone': zone, 'Su_min': su_min, 'Su_max': su_max}
+    return([{name: values[start:start + length].copy() for name, values in derived.items()} for start, length in zip(starts, lengths)])
+
+
+def _output_units(units: dict) -> dict[str, str]:
+    template = units.get('qc')
+    result = {'qt': template or 'MPa', 'Rf': _unit_like(template, '%'), 'Fr': _unit_like(template, '%')}
+    for name in ('sigma_v', 'u0', 'sigma_v_eff', 'Su_min', 'Su_max'):
+        result[name] = _unit_like(template, 'kPa')
+    for name in ('Qtn', 'ic', 'sbt_zone'):
+        result[name] = _unit_like(template, '-')
+    return(result)
+
+
+def derive_batch(cpts, parameters: SiteParameters|None = None, engine: str = 'auto', overwrite: bool = False) -> list[tuple]:
+    """
+    Derives qt, Rf, stresses, Qtn, Fr, Ic, soil behaviour type zone and Su for many parse results in one call.
+
+    Parameters
+    ----------
+    cpts : iterable of (cpt_header, header_units, measurements)
+        as returned by read_gef_file / read_alt_gef_file, rows or columns layout
+    parameters : SiteParameters|None
+        cone area ratio, unit weights, groundwater depth (default: gw_stand of each header) and Nkt range
+    engine : str
+        'auto' (numpy if installed), 'numpy' (the batch is computed as one set of arrays) or 'python'
+    overwrite : bool
+        False keeps columns of the files with the same name (e.g. a vendor qt, ic or Rf), True replaces them
+    Returns
+    -------
+    list of (cpt_header, units, columns) with the derived columns added, columns are array('d') or numpy arrays
+    """
+    if(engine not in ENGINES):
+        raise ValueError(f'unknown engine {engine!r}, expected one of {ENGINES}')
+    parameters = SiteParameters() if parameters is None else parameters
+    cpts = list(cpts)
+    prepared = []
+    for cpt_header, header_units, measurements in cpts:
+        columns, units, depth_name = _prepare(cpt_header, header_units, measurements)
+        prepared.append((columns, units, depth_name, _groundwater_depth(cpt_header, parameters)))
+    np = _numpy_for_engine(engine)
+    if(np is not None):
+        derived = _derive_numpy(np, prepared, parameters)
+    else:
+        derived = [_derive_python(columns, units, depth_name, gw_depth, parameters) for columns, units, depth_name, gw_depth in prepared]
+    result = []
+    for (cpt_header, _, _), (columns, units, _, _), new_columns in zip(cpts, prepared, derived):
+        new_units = _output_units(units)
+        for name, values in new_columns.items():
+            if(overwrite or name not in columns):
+                columns[name] = values
+                units[name] = new_units[name]
+        result.append((cpt_header, units, columns))
+    return(result)
+
+
+def derive_parameters(cpt_header: dict, header_units, measurements, parameters: SiteParameters|None = None,
+                      engine: str = 'auto', overwrite: bool = False) -> tuple[dict, dict, dict]:
+    """ Derives the parameters of a single parse result, see derive_batch.
+
+        e.g. cpt_header, units, columns = derive_parameters(*read_alt_gef_file(file_path, layout='columns'))
+    """
+    return(derive_batch([(cpt_header, header_units, measurements)], parameters, engine=engine, overwrite=overwrite)[0])
@@ -4,50 +4,96 @@ Creation date: 07.05.2023
 Last edit: 24.01.2025
 License: MIT
 """
+from array import array
+from collections.abc import Iterable
+from contextlib import nullcontext
+from itertools import chain, islice, repeat
 from pathlib import Path
+import codecs
+import os
+import io
+import logging
+import mmap as mmap_lib
+import time
 
+from .mapping import get_mapper
+from .stats import ParseStats, _stats_for_call
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+# increase when the parsed output changes, e.g. to invalidate cached results (see cache.py)
+PARSER_VERSION = 1
+
+
+DIALECTS = ('auto', 'gef_txt', 'columninfo')
+DEFAULT_ENCODINGS = ['windows-1252','utf-8', 'windows-1250']
+# number of bytes at the beginning of a file that are fully decoded to detect the encoding,
+# the rest of the file only has to pass a fast ASCII check
+ENCODING_PREFIX_SIZE = 64 * 1024
+# chunk size for scanning large (memory-mapped) buffers without copying them at once
+SCAN_CHUNK_SIZE = 1024 * 1024
+HEADER_CHUNK_SIZE = 8 * 1024
+
+def _is_ascii(data, start: int = 0) -> bool:
+    """ Checks if the bytes-like data (e.g. an mmap) is plain ASCII from the offset start, in chunks to keep the memory bounded."""
+    for offset in range(start, len(data), SCAN_CHUNK_SIZE):
+        if(not data[offset:offset + SCAN_CHUNK_SIZE].isascii()):
+            return(False)
+    return(True)
+
+def detect_encoding(data: bytes, encodings: list[str] = DEFAULT_ENCODINGS, prefix_size: int = ENCODING_PREFIX_SIZE) -> str:
+    """ Returns the first of the encodings that can decode the data.
+        Only a bounded prefix (the header part) is decoded, if the rest of the data is plain ASCII
+        (as the numeric rows of GEF files are) it is valid in all supported encodings and does not need to be decoded.
+    """
+    prefix = data[:prefix_size]
+    rest_is_ascii = _is_ascii(data, prefix_size)
+    for enc in encodings:
+        try:
+            if(rest_is_ascii):
+                codecs.getincrementaldecoder(enc)().decode(prefix, final=len(data) <= prefix_size)
+            else:
+                codecs.decode(data, enc)
+            return(enc)
+        except UnicodeDecodeError:
+            logger.debug(f'got unicode error with {enc} , trying different encoding')
+    raise UnicodeDecodeError(encodings[-1], bytes(prefix), 0, len(prefix), f'none of the encodings {encodings} matches')
+
+def read_source_bytes(file_path: str|Path = None, file_bytes: bytes = None) -> bytes:
+    """ Returns the content of a file as bytes, the file is read exactly once."""
+    if(file_path is not None):
+        with open(file_path, 'rb') as f:
+            return(f.read())
+    return(bytes(file_bytes))
 
 def read_txt_file(file_path: str|Path, encodings: list[str] = ['windows-1252','utf-8', 'windows-1250']) -> tuple[list[str], str]:
     """ This helper functions reads the file content from a .gef.txt file.
         By default 3 encodings are tried: windows-1252, utf-8, windows-1250
+        The file is read once, the encoding is detected with detect_encoding.
     
         Returns:
             - list of lines
             - encoding used to read
     """
-    
-    # try to read the file with the provided encodings
-    encoding = None
-    for enc in encodings:
-        try:    
-            with open(file_path, encoding=enc) as f:
-                lines = f.readlines()
-                encoding = enc
-                return(lines,encoding)
-        except UnicodeDecodeError:
-            print(f'got unicode error with {enc} , trying different encoding')
+    data = read_source_bytes(file_path=file_path)
+    encoding = detect_encoding(data, encodings)
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding=encoding).readlines()
+    return(lines,encoding)
 
-def read_byte_file(io_bytes):
+def read_byte_file(io_bytes, encodings: list[str] = DEFAULT_ENCODINGS):
     """This helper functions reads the file content from a ioBytes files, that comes from e.g. a fastapi endpoint.
 
     Args:
         io_bytes (ioBytes): the uploaded file
     """
-    # 1) check encoding
-    encoding = None
-    for enc in ['windows-1252','utf-8', 'windows-1250']:
-        try:
-            text_content_str = io_bytes.decode(enc)
-            encoding = enc
-            if ('\r\n' in text_content_str):
-                lines = text_content_str.split('\r\n')
-                return(lines,encoding)
-            else:
-                lines = text_content_str.split('\n')
-                return(lines,encoding)
-
-        except UnicodeDecodeError:
-            print(f'got unicode error with {enc} , trying different encoding')
+    encoding = detect_encoding(io_bytes, encodings)
+    text_content_str = codecs.decode(io_bytes, encoding)
+    if ('\r\n' in text_content_str):
+        lines = text_content_str.split('\r\n')
+    else:
+        lines = text_content_str.split('\n')
+    return(lines,encoding)
 
 def extract_header_part(lines: list[str], header_sep: str = ':'):
     header = {}
@@ -72,9 +118,12 @@ def extract_header_part(lines: list[str], header_sep: str = ':'):
 
 def extract_alternative_header_part(lines: list[str]):
     data_dict = {}
-    
+    # count the header lines in the same pass
+    header_lines = 0
+
     for line in lines:
         if line.startswith('#'):
+            header_lines += 1
             # Remove the leading '#' and split the line by '='
             key, value = line.lstrip('#').split('=', 1)
             key = key.strip()
@@ -88,6 +137,9 @@ def extract_alternative_header_part(lines: list[str]):
                     data_dict[key] = [data_dict[key], value]
             else:
                 data_dict[key] = value
+            if key == 'EOH':
+                # the data lines follow the end of the header
+                break
     
     # Further split values for each key where appropriate
     for key, value in data_dict.items():
@@ -95,9 +147,6 @@ def extract_alternative_header_part(lines: list[str]):
             data_dict[key] = [parse_value(val) for val in value]
         else:
             data_dict[key] = parse_value(value)
-    
-    # Count header lines:
-    header_lines = sum(1 for line in lines if line.startswith('#'))
 
     return data_dict, header_lines
 
@@ -129,128 +178,553 @@ def map_to_default_header_names(header, additional_mapping_dict={}):
             with key as header name read from the header file, maybe project specific
             value is the target value to be mapped to
             e.g. {"X":"RW", "Y": "HW", "Z":"ansatz_hoehe"}
+            A HeaderMapper can be passed instead, the keys are matched ignoring case and whitespace.
     """
-    default_mapping_dict = {
-        # key: value read from header file; value: target value after mapping
-        #TODO: check GEF Help Document for more!
-        'Projekt-Nummer':'projekt_id',
-        'Projektname':'projekt_name',
-        'Versuchs-Nummer':'aufschluss_name',
-        'Kundenname':'kunde',
-        'Ort':'ort',
-        'Datum':'datum',
-        'Konus-Nummer':'konus_nummer',
-        'Geländekante':'ansatz_hoehe',
-        'Wasserspiegel':'gw_stand',
-        'Vorbohrwerte':'vorbohrwerte',
-        'E Coordinate':'RW',
-        'N Coordinate':'HW',
-
-        "Sondeerlengte":"depth",
-        "Conusweerstand qc":"qc",
-        "Wrijvingsweerstand fs":"fs",
-        "Wrijvingsgetal Rf":"Rf",
-        "Waterspanning u2":"u2",
-        "Helling X":"inclination_x",
-        "Helling Y":"inclination_y",
-        "Gecorrigeerde diepte":"depth_corr",
-        "Tijd":"time",
-        "TESTID":"hole_id",
-        "penetration length":"depth",
-        "qc":"qc",
-        "fs":"fs",
-        "SampleTime":"time",
-        "Rf":"Rf",
-    }
-    # extend the dict by additional and alternative dicts (existing keys will be overwritten!)
-    mapping_dict = {**default_mapping_dict, **additional_mapping_dict}
-    header_renamed = {}
-    if isinstance(header, dict):
-        for k in header.keys():
-            try:
-                header_renamed[mapping_dict[k]] = header[k]
-            except KeyError:
-                header_renamed[k] = header[k]
+    return(get_mapper(additional_mapping_dict).map(header))
 
-    elif isinstance(header, list):
-        for k in header:
-            try:
-                header_renamed[mapping_dict[k]] = k
-            except KeyError:
-                header_renamed[k] = k
+# header keys that contain the hole id, per dialect
+HOLE_ID_HEADER_KEYS = {'gef_txt': 'aufschluss_name', 'columninfo': 'TESTID'}
+# further hole id keys of headers whose dialect is not known: the unmapped .gef.txt key and a mapped TESTID
+OTHER_HOLE_ID_HEADER_KEYS = ('Versuchs-Nummer', 'hole_id')
 
-    return(header_renamed)
+def _hole_id(cpt_header: dict, dialect: str|None = None):
+    """ Returns the hole id of a parsed header (None if it has none), the dialect selects the key if it is known."""
+    if(dialect is not None):
+        return(cpt_header.get(HOLE_ID_HEADER_KEYS[dialect]))
+    for key in (*HOLE_ID_HEADER_KEYS.values(), *OTHER_HOLE_ID_HEADER_KEYS):
+        if(key in cpt_header):
+            return(cpt_header[key])
+    return(None)
 
-def read_measurement_headers(lines: list[str], skip_lines=0):
+UNDEF_VALUES = ('UNDEF', '-99999.000')
+UNDEF_RAW_VALUES = (b'UNDEF', b'-99999.000')
+# void value of the vectorized (numpy) conversion, only cells spelled exactly like UNDEF_VALUES[1] are undefined
+VOID_VALUE = -99999.0
+MEASUREMENT_LAYOUTS = ('rows', 'columns')
+PARSING_ENGINES = ('python', 'numpy')
+
+def _convert_cell(value: str) -> float|str|None:
+    """ Converts a single measurement value, UNDEF values are returned as None and non numeric values are kept as string."""
+    if(value in UNDEF_VALUES):
+        return None
+    try:
+        return float(value.replace(',','.'))
+    except ValueError:
+        return value
+
+def _convert_cell_to_float(value: str) -> float:
+    """ Converts a single measurement value for the columnar layout, UNDEF and non numeric values are returned as NaN."""
+    if(value in UNDEF_VALUES):
+        return NAN
+    try:
+        return float(value.replace(',','.'))
+    except ValueError:
+        return NAN
+
+def _convert_raw_cell(value: bytes, encoding: str) -> float|str|None:
+    """ Same as _convert_cell for values that are read directly from the file bytes."""
+    if(value in UNDEF_RAW_VALUES):
+        return None
+    try:
+        return float(value.replace(b',',b'.'))
+    except ValueError:
+        return value.decode(encoding)
+
+def _convert_raw_cell_to_float(value: bytes) -> float:
+    """ Same as _convert_cell_to_float for values that are read directly from the file bytes."""
+    if(value in UNDEF_RAW_VALUES):
+        return NAN
+    try:
+        return float(value.replace(b',',b'.'))
+    except ValueError:
+        return NAN
+
+def _append_column_values(columns: list[array], values: list[str]|list[bytes], converter=_convert_cell_to_float):
+    """ Appends one data row to the column arrays, missing trailing values are filled with NaN."""
+    for col_i, value in enumerate(values):
+        columns[col_i].append(converter(value))
+    for col_i in range(len(values), len(columns)):
+        columns[col_i].append(NAN)
+
+ROW_PLAN_SAMPLE_ROWS = 100
+COLUMN_BUFFER_ROWS = 4096
+# kinds of measurement columns from narrow to general, a column gets the most general kind of its sampled values
+COLUMN_KINDS = ('int', 'float_dot', 'float_comma', 'string')
+
+def _cell_kind(value: str|bytes) -> str:
+    text = value.decode('latin-1') if isinstance(value, bytes) else value
+    if(text.lstrip('+-').isdigit()):
+        return('int')
+    try:
+        float(text)
+        return('float_dot')
+    except ValueError:
+        pass
+    try:
+        float(text.replace(',', '.'))
+        return('float_comma')
+    except ValueError:
+        return('string')
+
+def infer_column_kinds(sample: list[list[str]]|list[list[bytes]]) -> list[str]:
+    """ Infers the kind of each column from the split values of sample rows, UNDEF values are skipped:
+        'int' (e.g. soil classes), 'float_dot', 'float_comma' (decimal commas) or 'string'.
+    """
+    kinds = []
+    for values in sample:
+        for col_i, value in enumerate(values):
+            if(col_i == len(kinds)):
+                kinds.append('int')
+            if(value in UNDEF_RAW_VALUES or value in UNDEF_VALUES):
+                continue
+            kind = _cell_kind(value)
+            if(COLUMN_KINDS.index(kind) > COLUMN_KINDS.index(kinds[col_i])):
+                kinds[col_i] = kind
+    return(kinds)
+
+class _RowPlan:
+    """ Conversion plan of the data rows, inferred from the first rows of a measurement block.
+        If all columns are numeric, the decimal commas of a row are replaced in the whole line at once
+        and the values are converted with float(), otherwise one converter per column is used.
+        Rows that break the plan (other number of values, unexpected text) fall back to the per-cell converters,
+        so the result is the same as converting every cell on its own.
+    """
+
+    def __init__(self, kinds: list[str], raw: bool, as_rows: bool, encoding: str = 'utf-8'):
+        self.kinds = kinds
+        self.n_columns = len(kinds)
+        self.numeric = 'string' not in kinds
+        self.comma = 'float_comma' in kinds
+        self.undef = None if as_rows else NAN
+        self.undef_values = UNDEF_RAW_VALUES if raw else UNDEF_VALUES
+        self.comma_token, self.dot_token = (b',', b'.') if raw else (',', '.')
+        if(raw):
+            self.convert_cell = (lambda value: _convert_raw_cell(value, encoding)) if as_rows else _convert_raw_cell_to_float
+        else:
+            self.convert_cell = _convert_cell if as_rows else _convert_cell_to_float
+        self.converters = [self.convert_cell if kind == 'string' else self._convert_number for kind in kinds]
+
+    def _convert_number(self, value):
+        if(value in self.undef_values):
+            return(self.undef)
+        return(float(value.replace(self.comma_token, self.dot_token) if self.comma else value))
+
+    def convert(self, line) -> list|None:
+        """ Converts a data line following the plan, returns None if the line is empty or does not match the plan."""
+        if(self.numeric and self.comma):
+            line = line.replace(self.comma_token, self.dot_token)
+        values = line.split()
+        if(not values or len(values) != self.n_columns):
+            return(None)
+        try:
+            if(not self.numeric):
+                return([convert(value) for convert, value in zip(self.converters, values)])
+            if(self.undef_values[0] in line or self.undef_values[1] in line):
+                undef, undef_values = self.undef, self.undef_values
+                return([undef if value in undef_values else float(value) for value in values])
+            return(list(map(float, values)))
+        except ValueError:
+            return(None)
+
+    def convert_slow(self, values: list) -> list:
+        return([self.convert_cell(value) for value in values])
+
+def _plan_rows(lines: Iterable, n_columns: int, raw: bool, as_rows: bool, encoding: str = 'utf-8') -> tuple[_RowPlan, Iterable]:
+    """ Infers the row plan from the first ROW_PLAN_SAMPLE_ROWS lines.
+        Returns the plan and an iterable of all lines (including the sampled ones).
+    """
+    lines = iter(lines)
+    sample = list(islice(lines, ROW_PLAN_SAMPLE_ROWS))
+    kinds = infer_column_kinds([line.split() for line in sample])[:n_columns]
+    return(_RowPlan(kinds, raw, as_rows, encoding), chain(sample, lines))
+
+def _iter_converted_rows(lines: Iterable, plan: _RowPlan, n_columns: int):
+    """ Yields the converted values of each non-empty line, a line with more values than columns raises an IndexError.
+        Without a data line in the sample of the plan (n_columns == 0) every line is converted cell by cell.
+    """
+    convert, convert_slow = plan.convert, plan.convert_slow
+    if(not plan.n_columns):
+        convert = lambda line: None
+    for line in lines:
+        values = convert(line)
+        if(values is None):
+            values = line.split()
+            if(not values):
+                continue
+            if(len(values) > n_columns):
+                raise IndexError(f'data row with {len(values)} values, but only {n_columns} columns')
+            values = convert_slow(values)
+        yield values
+
+def _append_row(columns: list[array], values: list[float]):
+    """ Appends converted values to the column arrays, missing trailing values are filled with NaN."""
+    for column, value in zip(columns, values):
+        column.append(value)
+    for col_i in range(len(values), len(columns)):
+        columns[col_i].append(NAN)
+
+def _convert_lines(lines: Iterable, column_names: list[str], layout: str, raw: bool, encoding: str = 'utf-8') -> list[dict]|dict:
+    """ Converts data lines (str or bytes) to row dicts or column arrays with a row plan."""
+    plan, lines = _plan_rows(lines, len(column_names), raw, as_rows=layout == 'rows', encoding=encoding)
+    if(layout == 'columns'):
+        return(dict(zip(column_names, _convert_lines_to_columns(lines, plan, len(column_names)))))
+    return([dict(zip(column_names, values)) for values in _iter_converted_rows(lines, plan, len(column_names))])
+
+def _convert_lines_to_columns(lines: Iterable, plan: _RowPlan, n_columns: int) -> list[array]:
+    """ The rows are collected in a flat buffer that is split into the columns every COLUMN_BUFFER_ROWS rows,
+        one extend per row and one slice per column is cheaper than appending every value to its column.
+    """
+    columns = [array('d') for _ in range(n_columns)]
+    padding = array('d', [NAN]) * n_columns
+    buffer = array('d')
+    limit = COLUMN_BUFFER_ROWS * n_columns
+    for values in _iter_converted_rows(lines, plan, n_columns):
+        buffer.extend(values)
+        if(len(values) < n_columns):
+            buffer.extend(padding[len(values):])
+        if(len(buffer) >= limit):
+            for col_i, column in enumerate(columns):
+                column.extend(buffer[col_i::n_columns])
+            del buffer[:]
+    for col_i, column in enumerate(columns):
+        column.extend(buffer[col_i::n_columns])
+    return(columns)
+
+def _check_layout(layout: str):
+    if(layout not in MEASUREMENT_LAYOUTS):
+        raise ValueError(f'unknown layout {layout!r}, expected one of {MEASUREMENT_LAYOUTS}')
+
+def _check_dialect(dialect: str):
+    if(dialect not in DIALECTS):
+        raise ValueError(f'unknown dialect {dialect!r}, expected one of {DIALECTS}')
+
+def _check_engine(engine: str):
+    if(engine not in PARSING_ENGINES):
+        raise ValueError(f'unknown engine {engine!r}, expected one of {PARSING_ENGINES}')
+
+def _import_numpy(feature: str = "engine='numpy'"):
+    """ numpy is an optional dependency, it is only imported by the features that need it (engine='numpy', the adapters, ...)."""
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(f"{feature} requires numpy, install it with `pip install gef-reader[numpy]`") from e
+    return(numpy)
+
+def _block_to_array(np, data_lines: list[str]|list[bytes], n_cols: int, strict: bool):
+    """ Converts the non-blank data lines with one np.loadtxt call, returns None if the result could differ from the
+        per-cell converters: other spellings of the void value (e.g. -99999 is a value, only -99999.000 is UNDEF),
+        text cells or ragged rows, with strict=True also literal nan cells (the rows layout keeps them as float nan).
+        The UNDEF tokens are counted with str.count, the void cells are checked against that count after the parse.
+    """
+    text = b'\n'.join(data_lines).decode('latin-1') if isinstance(data_lines[0], bytes) else '\n'.join(data_lines)
+    undef, void = UNDEF_VALUES
+    n_undef = text.count(undef)
+    n_void = text.count(void)
+    # longer spellings with the same value (-99999.0000, -99999.000e0) are values for the python engine
+    if(n_void and any(void + suffix in text for suffix in ('0', 'e', 'E', '_'))):
+        return(None)
+    if(n_undef):
+        text = text.replace(undef, 'nan')
+    if(',' in text):
+        text = text.replace(',', '.')
+    try:
+        values = np.loadtxt(text.splitlines(), dtype=np.float64, comments=None, ndmin=2)
+    except ValueError:
+        return(None)
+    if(values.shape != (len(data_lines), n_cols)):
+        return(None)
+    if(n_void):
+        void_cells = values == VOID_VALUE
+        if(np.count_nonzero(void_cells) != n_void):
+            return(None)
+        values[void_cells] = np.nan
+    if(strict and np.count_nonzero(np.isnan(values)) != n_undef + n_void):
+        return(None)
+    return(values)
+
+def _lines_to_array(lines: list[str]|list[bytes], column_names: list[str], strict: bool = False):
+    """ Converts the data lines (str or bytes) of a measurement block to a 2-D float64 array in one vectorized step.
+        UNDEF / -99999.000 cells, non numeric values and values of missing cells are set to NaN, as by the python engine.
+        With strict=True None is returned instead if the block has ragged rows, non numeric or literal nan values,
+        i.e. if the rows layout of the python engine could not be rebuilt from the array.
+    """
+    np = _import_numpy()
+    n_cols = len(column_names)
+    data_lines = [line for line in lines if line and not line.isspace()]
+    if(not data_lines):
+        return(np.empty((0, n_cols)))
+    values = _block_to_array(np, data_lines, n_cols, strict)
+    if(values is not None or strict):
+        return(values)
+    # ragged rows or non numeric values, use the pure python converter row by row
+    converter = _convert_raw_cell_to_float if isinstance(data_lines[0], bytes) else _convert_cell_to_float
+    columns = [array('d') for _ in column_names]
+    for line in data_lines:
+        _append_column_values(columns, line.split(), converter)
+    return(np.array(columns, dtype=np.float64).T)
+
+def _array_to_columns(values, column_names: list[str]) -> dict:
+    """ Splits a 2-D array into a dict of contiguous 1-D column arrays (views of one transposed copy)."""
+    return(dict(zip(column_names, values.T.copy())))
+
+def _array_to_rows(values, column_names: list[str]) -> list[dict]:
+    """ Builds the row dicts of a 2-D array, NaN cells (UNDEF, see _lines_to_array(strict=True)) are None."""
+    np = _import_numpy()
+    cells = np.where(np.isnan(values), None, values).tolist()
+    return(list(map(dict, map(zip, repeat(column_names), cells))))
+
+def _locate_measurement_header(lines: list[str], skip_lines=0) -> tuple[list[str], dict, int]:
+    """ Finds the line with the column names and the (optional) line with the units of the measurement block.
+
+        Returns:
+            - list of column names
+            - dict of column name and unit, missing units are set to '[-]'
+            - index of the first line after the column header
+    """
     _header = None
     _header_line_uncleaned = None
     _header_units = {}
-    _measurements = []
-    for line in lines[skip_lines:]:
-        line_cleaned = ' '.join(line.strip().rstrip().split()) # remove additional whitespaces        
-        if(line_cleaned != '' and _header == None and '[' not in line_cleaned):
-            _header = line_cleaned.split(' ')
+    data_start = len(lines)
+    for index in range(skip_lines, len(lines)):
+        line = lines[index]
+        line_cleaned = line.strip()
+        if(line_cleaned == ''):
+            continue
+        if(_header is None and '[' not in line_cleaned):
+            _header = line_cleaned.split()
             _header_line_uncleaned = line
-        elif(line_cleaned != '' and '[' in line_cleaned and _header_units == {}):
+        elif(_header is not None and '[' in line_cleaned):
             start_indeces = [i for i,c in enumerate(line) if c == '[']
             for start_index in start_indeces:
                 _header_col_name = _header_line_uncleaned[start_index:].split(' ',maxsplit=1)[0].strip()
                 _header_col_unit = line[start_index:].split(' ',maxsplit=1)[0].strip()
                 _header_units[_header_col_name] = _header_col_unit
-        elif(line_cleaned != ''):
-            cleaned_values = {}
-            for col_i, value in enumerate(line_cleaned.split(' ')):
-                if(value == 'UNDEF' or value == '-99999.000'):
-                    value = None
-                else:
-                    try:
-                        value = float(value.replace(',','.'))
-                    except:
-                        value = value
-                cleaned_values[_header[col_i]] = value
-            _measurements.append(cleaned_values)
+            data_start = index + 1
+            break
+        else:
+            # first data row, the file does not contain a unit line
+            data_start = index
+            break
 
     # add missing keys in unit dict
     [_header_units.update({h:'[-]'}) for h in _header if _header_units.get(h) == None] # caution: will update the dict inplace!
+    return(_header, _header_units, data_start)
+
+def read_measurement_headers(lines: list[str], skip_lines=0):
+    _header, _header_units, data_start = _locate_measurement_header(lines, skip_lines=skip_lines)
+    _measurements = _convert_lines(lines[data_start:], _header, 'rows', raw=False)
     return(_header, _header_units, _measurements)
 
+def read_measurement_columns(lines: list[str], skip_lines=0) -> tuple[list[str], dict, dict[str, array]]:
+    """ Columnar variant of read_measurement_headers.
+        Instead of one dict per data row, one array.array('d') per column is returned.
+        UNDEF / -99999.000 and non numeric values are stored as NaN, use `value != value` or math.isnan() to mask them.
+    """
+    _header, _header_units, data_start = _locate_measurement_header(lines, skip_lines=skip_lines)
+    return(_header, _header_units, _convert_lines(lines[data_start:], _header, 'columns', raw=False))
+
+def read_measurement_array(lines: list[str], skip_lines=0):
+    """ Vectorized variant of read_measurement_headers, requires numpy.
+        The data block is located once and converted to a 2-D float64 array (rows x columns),
+        UNDEF / -99999.000 and non numeric values are set to NaN.
+    """
+    _header, _header_units, data_start = _locate_measurement_header(lines, skip_lines=skip_lines)
+    return(_header, _header_units, _lines_to_array(lines[data_start:], _header))
+
 def read_alt_measurements(txt_lines, column_names, skip_lines):
     _measurements = []
-
-    for line in txt_lines[skip_lines:]:
-        dict_per_row = {}
-        line_cleaned = ' '.join(line.strip().rstrip().split())
-        for col_i, value in enumerate(line_cleaned.split(' ')):
-            if(value == 'UNDEF' or value == '-99999.000'):
-                value = None
-            else:
-                try:
-                    value = float(value.replace(',','.'))
-                except:
-                    value = value
-            dict_per_row[column_names[col_i]] = value
-        _measurements.append(dict_per_row)
+    plan, lines = _plan_rows(txt_lines[skip_lines:], len(column_names), raw=False, as_rows=True)
+    for line in lines:
+        values = plan.convert(line)
+        if(values is not None):
+            _measurements.append(dict(zip(column_names, values)))
+            continue
+        line_cleaned = ' '.join(line.split())
+        _measurements.append({column_names[col_i]: _convert_cell(value) for col_i, value in enumerate(line_cleaned.split(' '))})
     return(_measurements)
 
-def read_alt_gef_file(file_path : None|str = None,  file_bytes : None|bytes = None, header_mapping_dict={}):
-    if(file_path is not None):
-        txt_lines, encoding = read_txt_file(file_path)
-    elif(file_bytes is not None):
-        txt_lines, encoding = read_byte_file(file_bytes)
-
-    # 1) Extract header
-    header_dict, header_lines = extract_alternative_header_part(txt_lines)
-    column_names = [c[2] for c in header_dict.get("COLUMNINFO")]
-    header_units = [c[1] for c in header_dict.get("COLUMNINFO")]
-    renamed_header = map_to_default_header_names(column_names)
-    renamed_cols = [k for k in renamed_header.keys()]
-    measurements = read_alt_measurements(txt_lines=txt_lines, column_names=renamed_cols, skip_lines=header_lines)
-    if("SampleTime" in measurements[0].keys()):
-        print("ok")
-        pass
-    return(header_dict, header_units, measurements)
+def read_alt_measurement_columns(txt_lines, column_names, skip_lines) -> dict[str, array]:
+    """ Columnar variant of read_alt_measurements, see read_measurement_columns."""
+    return(_convert_lines(txt_lines[skip_lines:], column_names, 'columns', raw=False))
+
+def read_alt_measurement_array(txt_lines, column_names, skip_lines):
+    """ Vectorized variant of read_alt_measurements, see read_measurement_array."""
+    return(_lines_to_array(txt_lines[skip_lines:], column_names))
+
+def _alt_column_names(header_dict: dict, header_mapping_dict={}) -> tuple[list[str], list[str]]:
+    """ Returns the (default) column names and the units defined by the #COLUMNINFO lines of a GEF header,
+        the names are mapped with header_mapping_dict (a dict or a HeaderMapper) on top of the default mapping.
+    """
+    columninfo = header_dict.get("COLUMNINFO")
+    header_units = [c[1] for c in columninfo]
+    return(get_mapper(header_mapping_dict).column_names(columninfo), header_units)
+
+def _iter_buffer_lines(buf, start: int = 0):
+    """ Yields the lines (including the line ending) of a bytes-like buffer, beginning at the byte offset start."""
+    end = len(buf)
+    while(start < end):
+        stop = buf.find(b'\n', start)
+        stop = end if stop == -1 else stop + 1
+        yield buf[start:stop]
+        start = stop
+
+def _scan_header_lines(raw_lines, dialect: str) -> tuple[list[bytes], str]:
+    """ Collects the raw header lines of a GEF file, the iterator of raw lines is consumed up to the end of the header.
+        For the .gef.txt dialect the column line and the unit line (or the first data line) are included,
+        for the #COLUMNINFO dialect all lines up to #EOH (or the first data line).
+
+        Returns:
+            - list of raw header lines
+            - dialect of the file ('gef_txt' or 'columninfo')
+    """
+    header_lines = []
+    column_line_found = False
+    for raw_line in raw_lines:
+        line_cleaned = raw_line.strip()
+        if(dialect == 'auto' and line_cleaned):
+            dialect = 'columninfo' if line_cleaned.startswith(b'#') else 'gef_txt'
+        header_lines.append(raw_line)
+        if(dialect == 'columninfo'):
+            if(raw_line.startswith(b'#EOH') or (line_cleaned and not raw_line.startswith(b'#'))):
+                break
+        elif(not line_cleaned or (b':' in raw_line and not column_line_found)):
+            continue
+        elif(not column_line_found):
+            column_line_found = True
+        else:
+            # unit line or first data line
+            break
+    return(header_lines, dialect)
+
+def _parse_header_values(header_lines: list[str], dialect: str, header_mapping_dict={}) -> tuple[dict, int]:
+    """ Extracts the header values of the decoded header lines.
+
+        Returns:
+            - cpt header, for the .gef.txt dialect mapped to the default names
+            - number of header lines, for the #COLUMNINFO dialect the index of the first data line
+    """
+    if(dialect == 'columninfo'):
+        return(extract_alternative_header_part(header_lines))
+    cpt_header = map_to_default_header_names(header=extract_header_part(header_lines, header_sep=":"), additional_mapping_dict=header_mapping_dict)
+    return(cpt_header, len(cpt_header))
+
+def _parse_column_header(header_lines: list[str], cpt_header: dict, header_end: int, dialect: str, header_mapping_dict={}) -> tuple[list[str], dict|list, int]:
+    """ Detects the column names and units after the header values.
+
+        Returns:
+            - column names
+            - header units
+            - index of the first data line within header_lines (all lines, if the header does not contain data lines)
+    """
+    if(dialect == 'columninfo'):
+        column_names, header_units = _alt_column_names(cpt_header, header_mapping_dict)
+        return(column_names, header_units, header_end)
+    return(_locate_measurement_header(header_lines, skip_lines=header_end))
+
+def _parse_header_lines(header_lines: list[str], dialect: str, header_mapping_dict={}) -> tuple[dict, dict|list, list[str], int]:
+    """ Parses the decoded header lines of a GEF file.
+
+        Returns:
+            - cpt header, for the .gef.txt dialect mapped to the default names
+            - header units
+            - column names
+            - index of the first data line within header_lines (all lines, if the header does not contain data lines)
+    """
+    cpt_header, header_end = _parse_header_values(header_lines, dialect, header_mapping_dict)
+    column_names, header_units, data_start = _parse_column_header(header_lines, cpt_header, header_end, dialect, header_mapping_dict)
+    return(cpt_header, header_units, column_names, data_start)
+
+def _parse_data_lines(lines: Iterable[bytes], column_names: list[str], layout: str, engine: str, encoding: str) -> list[dict]|dict:
+    """ Parses the raw data lines of a measurement block, the numeric values are converted straight from bytes."""
+    if(engine == 'numpy'):
+        lines = lines if isinstance(lines, list) else list(lines)
+        values = _lines_to_array(lines, column_names, strict=layout == 'rows')
+        if(values is not None):
+            return(_array_to_columns(values, column_names) if layout == 'columns' else _array_to_rows(values, column_names))
+        # text cells, ragged rows or literal nan values, the python engine keeps them as they are in the rows layout
+    return(_convert_lines(lines, column_names, layout, raw=True, encoding=encoding))
 
-def read_gef_file(file_path : str = None,  file_bytes : bytes = None, header_mapping_dict={}):
+def _stage(stats: ParseStats|None, stage: str, **numbers):
+    """ Times a parser stage with stats.stage, without stats the with block only gets the dict of numbers."""
+    return(nullcontext(numbers) if stats is None else stats.stage(stage, **numbers))
+
+def _parse_gef_buffer(buf, dialect: str = 'auto', header_mapping_dict={}, layout: str = 'rows', engine: str = 'python',
+                      encodings: list[str] = DEFAULT_ENCODINGS, stats: ParseStats|None = None) -> tuple[dict, dict|list, list[dict]|dict]:
+    """ Shared bytes-in parser behind read_gef_file and read_alt_gef_file.
+        Only the header lines are decoded to text, the numeric rows are parsed straight from the bytes.
+        buf can be bytes or an mmap, for an mmap the data lines are sliced one by one instead of splitting the whole block.
+        With stats every stage is timed and recorded.
+    """
+    with _stage(stats, 'total', bytes=len(buf)) as total:
+        with _stage(stats, 'detect_encoding', bytes=min(len(buf), ENCODING_PREFIX_SIZE)):
+            encoding = detect_encoding(buf, encodings)
+        if(stats is not None):
+            stats.record_encoding(encoding, fallbacks=encodings.index(encoding))
+        with _stage(stats, 'header') as header:
+            raw_header, dialect = _scan_header_lines(_iter_buffer_lines(buf), dialect)
+            header_lines = [line.decode(encoding) for line in raw_header]
+            cpt_header, header_end = _parse_header_values(header_lines, dialect, header_mapping_dict)
+            header.update(bytes=sum(map(len, raw_header)), lines=len(raw_header))
+        with _stage(stats, 'units'):
+            column_names, header_units, data_start = _parse_column_header(header_lines, cpt_header, header_end, dialect, header_mapping_dict)
+        data_offset = sum(len(line) for line in raw_header[:data_start])
+        with _stage(stats, 'rows', bytes=len(buf) - data_offset) as rows:
+            data_lines = _data_lines(buf, data_offset)
+            measurements = _parse_data_lines(data_lines, column_names, layout, engine, encoding)
+            n_rows = len(next(iter(measurements.values()), ())) if isinstance(measurements, dict) else len(measurements)
+            n_lines = len(data_lines) if isinstance(data_lines, list) else n_rows
+            # counted after the stage is timed
+            rows.update(lines=n_lines, rows=n_rows, undef=lambda: _count_undef(measurements))
+        total.update(lines=data_start + n_lines, rows=n_rows)
+    return(cpt_header, header_units, measurements)
+
+def _data_lines(buf, data_offset: int) -> Iterable[bytes]:
+    if(isinstance(buf, mmap_lib.mmap)):
+        return(_iter_buffer_lines(buf, data_offset))
+    return(buf[data_offset:].splitlines())
+
+def _count_undef(measurements: list[dict]|dict) -> int:
+    """ Counts the UNDEF values of parsed measurements (None in the rows layout, NaN in the columns layout)."""
+    if(isinstance(measurements, dict)):
+        return(sum(sum(1 for v in values if v != v) for values in measurements.values()))
+    return(sum(1 for row in measurements for v in row.values() if v is None or v != v))
+
+def _parse_gef_file_mapped(file_path: str|Path, **kwargs) -> tuple[dict, dict|list, list[dict]|dict]:
+    """ Parses a file with _parse_gef_buffer from a read-only memory map, so the pages are shared via the page cache
+        (e.g. between worker processes parsing the same archive) instead of being copied into the process.
+    """
+    stats = kwargs.get('stats')
+    t = time.perf_counter() if stats is not None else 0.0
+    with open(file_path, 'rb') as f:
+        if(os.fstat(f.fileno()).st_size == 0):
+            # empty files can not be mapped
+            return(_parse_gef_buffer(b'', **kwargs))
+        with mmap_lib.mmap(f.fileno(), 0, access=mmap_lib.ACCESS_READ) as buf:
+            if(stats is not None):
+                stats.record('read', time.perf_counter() - t, bytes=len(buf))
+            return(_parse_gef_buffer(buf, **kwargs))
+
+def _read_gef_source(file_path: str|Path|None, file_bytes: bytes|None, mmap: bool, stats: ParseStats|None, **kwargs):
+    """ Reads (or maps) the source and parses it with _parse_gef_buffer, the 'read' stage is recorded in stats."""
+    stats = _stats_for_call(stats)
+    if(mmap and file_path is not None):
+        return(_parse_gef_file_mapped(file_path, stats=stats, **kwargs))
+    if(stats is None):
+        return(_parse_gef_buffer(read_source_bytes(file_path=file_path, file_bytes=file_bytes), **kwargs))
+    with stats.stage('read') as read:
+        buf = read_source_bytes(file_path=file_path, file_bytes=file_bytes)
+        read['bytes'] = len(buf)
+    return(_parse_gef_buffer(buf, stats=stats, **kwargs))
+
+def read_alt_gef_file(file_path : None|str = None,  file_bytes : None|bytes = None, header_mapping_dict={}, layout: str = 'rows', engine: str = 'python',
+                      mmap: bool = False, stats: ParseStats|None = None):
+    _check_layout(layout)
+    _check_engine(engine)
+    return(_read_gef_source(file_path, file_bytes, mmap, stats, dialect='columninfo', header_mapping_dict=header_mapping_dict,
+                             layout=layout, engine=engine))
+
+def read_gef_file(file_path : str = None,  file_bytes : bytes = None, header_mapping_dict={}, layout: str = 'rows', engine: str = 'python',
+                  mmap: bool = False, stats: ParseStats|None = None):
     """
     This function reads a .gef.txt file, checks encoding and maps it do a default column schema.
     It returns a list of dictionary values for each data row, that can easily imported into pandas/numpy.
@@ -265,6 +739,20 @@ def read_gef_file(file_path : str = None,  file_bytes : bytes = None, header_map
         Define the dict key as header name read from the header file --> maybe project specific
         Define the dict value as the target value to be mapped to
         e.g. {"X":"RW", "Y": "HW", "Z":"ansatz_hoehe"}
+    layout : str
+        'rows' (default) returns one dictionary per data row,
+        'columns' returns one array.array('d') per column with NaN for UNDEF values,
+        which needs only a fraction of the memory for large files or whole campaigns.
+    engine : str
+        'python' (default) pure python parser without any dependencies,
+        'numpy' converts the whole data block in one vectorized step (requires numpy).
+        With layout='columns' the columns are returned as 1-D numpy float64 arrays.
+    mmap : bool
+        memory-map the file instead of reading it, the rows are parsed line by line from the mapped pages.
+        Together with layout='columns' the memory usage stays near the size of the output arrays.
+    stats : ParseStats|None
+        records wall time, bytes, lines, rows and UNDEF values of each parse stage (see gef_reader.stats),
+        one ParseStats object can be passed to many calls to aggregate the numbers.
     Returns
     -------
     cpt_header_data: {}
@@ -276,13 +764,136 @@ def read_gef_file(file_path : str = None,  file_bytes : bytes = None, header_map
     measurements: [{},{},...]
         An array of dictionaries of all cpt measurements, e.g. qc, fs, etc.
         one dictionary for one data row (usually 1cm in depth).
+        With layout='columns' a dictionary of column name and array.array('d') is returned instead.
+
+    """
+    _check_layout(layout)
+    _check_engine(engine)
+    return(_read_gef_source(file_path, file_bytes, mmap, stats, dialect='gef_txt', header_mapping_dict=header_mapping_dict,
+                            layout=layout, engine=engine))
 
+def detect_dialect(file_path: str|Path = None, file_bytes: bytes = None) -> str:
+    """ Detects the dialect of a GEF file from its first characters:
+        'columninfo' for files with #-header lines (see read_alt_gef_file), otherwise 'gef_txt' (see read_gef_file).
     """
     if(file_path is not None):
-        txt_lines, encoding = read_txt_file(file_path)
-    elif(file_bytes is not None):
-        txt_lines, encoding = read_byte_file(file_bytes)
-    cpt_header_data = extract_header_part(txt_lines, header_sep=":")
-    cpt_renamed_header = map_to_default_header_names(header=cpt_header_data, additional_mapping_dict=header_mapping_dict)
-    column_names, header_units, measurements = read_measurement_headers(txt_lines, skip_lines=len(cpt_renamed_header))
-    return(cpt_renamed_header, header_units, measurements)
\ No newline at end of file
+        with open(file_path, 'rb') as f:
+            prefix = f.read(1024)
+    else:
+        prefix = file_bytes[:1024]
+    return('columninfo' if prefix.lstrip().startswith(b'#') else 'gef_txt')
+
+def read_any_gef_file(file_path: str|Path = None, file_bytes: bytes = None, dialect: str = 'auto', **kwargs) -> tuple[str, dict, dict|list, list|dict]:
+    """ Reads a .gef.txt or a #COLUMNINFO file with read_gef_file or read_alt_gef_file, keyword arguments are passed to the reader.
+
+        Returns:
+            - the dialect of the file ('gef_txt' or 'columninfo')
+            - cpt header, header units and measurements as returned by the reader
+    """
+    _check_dialect(dialect)
+    if(dialect == 'auto'):
+        dialect = detect_dialect(file_path=file_path, file_bytes=file_bytes)
+    reader = read_alt_gef_file if dialect == 'columninfo' else read_gef_file
+    return(dialect, *reader(file_path=file_path, file_bytes=file_bytes, **kwargs))
+
+def _iter_stream_rows(f, first_lines: list[bytes], encoding: str, column_names: list[str], chunk_size: int|None, layout: str):
+    """ Yields the parsed rows (or chunks of rows) from the remaining lines of a binary file handle and closes it."""
+    try:
+        lines = chain(first_lines, f) if first_lines else f
+        plan, lines = _plan_rows(lines, len(column_names), raw=True, as_rows=layout == 'rows', encoding=encoding)
+        if(chunk_size is None):
+            for values in _iter_converted_rows(lines, plan, len(column_names)):
+                yield dict(zip(column_names, values))
+            return
+        chunk = None
+        n_rows = 0
+        for values in _iter_converted_rows(lines, plan, len(column_names)):
+            if(chunk is None):
+                chunk = [array('d') for _ in column_names] if layout == 'columns' else []
+            if(layout == 'columns'):
+                _append_row(chunk, values)
+            else:
+                chunk.append(dict(zip(column_names, values)))
+            n_rows += 1
+            if(n_rows == chunk_size):
+                yield dict(zip(column_names, chunk)) if layout == 'columns' else chunk
+                chunk = None
+                n_rows = 0
+        if(chunk is not None):
+            yield dict(zip(column_names, chunk)) if layout == 'columns' else chunk
+    finally:
+        f.close()
+
+def iter_gef_measurements(file_path: str|Path, chunk_size: int|None = None, dialect: str = 'auto', layout: str = 'rows',
+                          header_mapping_dict={}, encodings: list[str] = DEFAULT_ENCODINGS):
+    """
+    Streaming variant of read_gef_file / read_alt_gef_file for very long soundings.
+    Only the header is read when calling the function, the measurements are parsed lazily
+    from the file handle, so the memory usage stays flat whatever the file length.
+
+    Parameters
+    ----------
+    file_path : str|Path
+        path to the .gef.txt or .gef file
+    chunk_size : int|None
+        None (default) yields one row dictionary at a time,
+        otherwise lists of up to chunk_size rows (layout='rows')
+        or dictionaries of column arrays of up to chunk_size rows (layout='columns') are yielded.
+    dialect : str
+        'auto' (default) detects the dialect from the first line,
+        'gef_txt' for .gef.txt files (see read_gef_file), 'columninfo' for #COLUMNINFO files (see read_alt_gef_file)
+    layout : str
+        'rows' or 'columns', the columnar layout requires a chunk_size
+
+    Returns
+    -------
+    cpt_header_data, header_units, rows
+        the header and units as returned by read_gef_file / read_alt_gef_file and a generator of the measurements.
+        The file is closed when the generator is exhausted or closed.
+    """
+    _check_dialect(dialect)
+    _check_layout(layout)
+    if(layout == 'columns' and chunk_size is None):
+        raise ValueError("layout='columns' requires a chunk_size")
+    f = open(file_path, 'rb')
+    try:
+        _, cpt_header, header_units, column_names, raw_header, data_start, encoding = _read_stream_header(f, dialect, header_mapping_dict, encodings)
+    except BaseException:
+        f.close()
+        raise
+    return(cpt_header, header_units, _iter_stream_rows(f, raw_header[data_start:], encoding, column_names, chunk_size, layout))
+
+def _read_stream_header(f, dialect: str, header_mapping_dict, encodings: list[str]) -> tuple:
+    """ Reads the header lines from a binary file object, the file is read only up to the end of the header
+        (plus the read-ahead of its buffer).
+
+        Returns:
+            dialect, cpt header, header units, column names, raw header lines, index of the first data line, encoding
+    """
+    raw_header, dialect = _scan_header_lines(f, dialect)
+    encoding = detect_encoding(b''.join(raw_header), encodings)
+    header_lines = [line.decode(encoding) for line in raw_header]
+    cpt_header, header_units, column_names, data_start = _parse_header_lines(header_lines, dialect, header_mapping_dict)
+    return(dialect, cpt_header, header_units, column_names, raw_header, data_start, encoding)
+
+def read_gef_header(file_path: str|Path = None, file_bytes: bytes = None, dialect: str = 'auto', header_mapping_dict={},
+                    encodings: list[str] = DEFAULT_ENCODINGS, chunk_size: int = HEADER_CHUNK_SIZE) -> tuple[str, dict, dict|list, int]:
+    """
+    Reads only the header of a .gef.txt or #COLUMNINFO file, e.g. to list, filter or map soundings.
+    The file is read in chunks of chunk_size bytes and reading stops at the first data line (or #EOH).
+
+    Returns
+    -------
+    dialect, cpt_header_data, header_units, data_offset
+        the dialect ('gef_txt' or 'columninfo'), the header and units as returned by read_gef_file / read_alt_gef_file
+        and the byte offset where the data block starts (it may begin with blank lines).
+    """
+    _check_dialect(dialect)
+    if(file_path is not None):
+        f = open(file_path, 'rb', buffering=chunk_size)
+    else:
+        f = io.BytesIO(file_bytes)
+    with f:
+        dialect, cpt_header, header_units, _, raw_header, data_start, _ = _read_stream_header(f, dialect, header_mapping_dict, encodings)
+    data_offset = sum(len(line) for line in raw_header[:data_start])
+    return(dialect, cpt_header, header_units, data_offset)
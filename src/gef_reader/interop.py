@@ -0,0 +1,184 @@
+"""
+pandas and Apache Arrow adapters for parsed CPTs.
+
+The float64 column buffers of layout='columns' (array('d'), numpy arrays or memoryviews of a .cptb bundle)
+are handed over without a per-row loop: numpy views them with np.frombuffer, pandas keeps one block per column
+(no consolidation copy) and Arrow wraps the same memory with pa.py_buffer. The units are attached as column metadata
+(DataFrame.attrs['units'] for pandas, field metadata b'unit' for Arrow).
+Concatenating many CPTs allocates each output column once and copies every file's values into its slice.
+
+pandas, pyarrow and numpy are optional dependencies, they are only imported by these functions.
+"""
+import json
+from array import array
+
+from .binary import _as_float_array
+from .gef_reader import _hole_id, _import_numpy
+
+HOLE_ID_COLUMN = 'hole_id'
+NUMPY_FEATURE = 'the pandas / Arrow adapters'
+
+
+def _import_pandas():
+    try:
+        import pandas
+    except ImportError as e:
+        raise ImportError("to_pandas requires pandas, install it with `pip install gef-reader[pandas]`") from e
+    return(pandas)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("to_arrow requires pyarrow, install it with `pip install gef-reader[arrow]`") from e
+    return(pyarrow)
+
+
+def _is_float_buffer(values) -> bool:
+    if(isinstance(values, array)):
+        return(values.typecode == 'd')
+    if(isinstance(values, memoryview)):
+        return(values.format == 'd' and values.c_contiguous)
+    return(type(values).__name__ == 'ndarray' and values.dtype == 'float64' and values.ndim == 1)
+
+
+def _as_ndarray(values):
+    """ Returns a column as float64 numpy array, array('d') and memoryviews are viewed without copying."""
+    np = _import_numpy(NUMPY_FEATURE)
+    if(type(values).__name__ == 'ndarray'):
+        return(np.ascontiguousarray(values, dtype=np.float64))
+    if(_is_float_buffer(values)):
+        return(np.frombuffer(values, dtype=np.float64))
+    return(np.frombuffer(_as_float_array(values), dtype=np.float64))
+
+
+def _normalize(header_units, measurements) -> tuple[dict, dict[str, str]]:
+    """ Returns the columns and the units of a parse result, the columns of layout='columns' are not copied.
+        Rows (layout='rows') are converted to float columns once.
+    """
+    if(not isinstance(measurements, dict)):
+        names = list(dict.fromkeys(name for row in measurements for name in row))
+        measurements = {name: [row.get(name) for row in measurements] for name in names}
+        # text columns (e.g. the hole id column of read_gef_folder) stay lists
+        measurements = {name: values if any(isinstance(v, str) for v in values) else _as_float_array(values)
+                        for name, values in measurements.items()}
+    if(isinstance(header_units, dict)):
+        units = {name: header_units.get(name, '') for name in measurements}
+    else:
+        units = dict(zip(measurements, header_units or []))
+    return(dict(measurements), units)
+
+
+def to_pandas(cpt_header: dict, header_units, measurements, copy: bool = False):
+    """
+    Returns a pandas DataFrame of a parse result (read_gef_file / read_alt_gef_file, both layouts).
+    With layout='columns' the DataFrame uses the parsed column buffers without copying (copy=True copies them).
+    Units are in df.attrs['units'], the header in df.attrs['header'], UNDEF values are NaN.
+    """
+    pd = _import_pandas()
+    columns, units = _normalize(header_units, measurements)
+    data = {name: _as_ndarray(values) if _is_float_buffer(values) else values for name, values in columns.items()}
+    df = pd.DataFrame(data, copy=copy)
+    df.attrs['units'] = units
+    df.attrs['header'] = cpt_header
+    return(df)
+
+
+def _arrow_array(values, nan_as_null: bool):
+    pa = _import_pyarrow()
+    if(not _is_float_buffer(values)):
+        # e.g. the hole id column of read_gef_folder
+        return(pa.array(values).dictionary_encode() if values and isinstance(values[0], str) else pa.array(values))
+    np = _import_numpy(NUMPY_FEATURE)
+    values = _as_ndarray(values)
+    validity = None
+    if(nan_as_null):
+        valid = ~np.isnan(values)
+        if(not valid.all()):
+            validity = pa.py_buffer(np.packbits(valid, bitorder='little'))
+    return(pa.Array.from_buffers(pa.float64(), len(values), [validity, pa.py_buffer(values)]))
+
+
+def to_arrow(cpt_header: dict, header_units, measurements, nan_as_null: bool = True):
+    """
+    Returns a pyarrow Table of a parse result (read_gef_file / read_alt_gef_file, both layouts).
+    The float64 data buffers are shared with the parsed columns, with nan_as_null=True (default) UNDEF values
+    are nulls (a validity bitmap is added, the data is not copied). The unit of a column is in its field metadata
+    (b'unit'), the header as JSON in the schema metadata (b'gef_header').
+    """
+    pa = _import_pyarrow()
+    columns, units = _normalize(header_units, measurements)
+    arrays, fields = [], []
+    for name, values in columns.items():
+        arrow_array = _arrow_array(values, nan_as_null)
+        arrays.append(arrow_array)
+        fields.append(pa.field(name, arrow_array.type, metadata={'unit': units.get(name) or ''}))
+    metadata = {'gef_header': json.dumps(cpt_header, ensure_ascii=False, default=str)}
+    return(pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata)))
+
+
+def _concat_columns(cpts) -> tuple[dict, dict[str, str], list, list[int]]:
+    """ Concatenates the columns of many parse results into one float64 numpy array per column, allocated once.
+        Columns missing in a file are NaN. Returns columns, units (first unit per column), headers and rows per file.
+    """
+    np = _import_numpy(NUMPY_FEATURE)
+    parsed = [(cpt_header, *_normalize(header_units, measurements)) for cpt_header, header_units, measurements in cpts]
+    n_rows = [len(next(iter(columns.values()), ())) for _, columns, _ in parsed]
+    offsets = [0]
+    for n in n_rows:
+        offsets.append(offsets[-1] + n)
+    units = {}
+    for _, columns, file_units in parsed:
+        for name in columns:
+            units.setdefault(name, file_units.get(name, ''))
+    result = {name: np.full(offsets[-1], np.nan) for name in units}
+    for i, (_, columns, _) in enumerate(parsed):
+        for name, values in columns.items():
+            result[name][offsets[i]:offsets[i + 1]] = _as_ndarray(values)
+    return(result, units, [cpt_header for cpt_header, _, _ in parsed], n_rows)
+
+
+def _hole_id_codes(headers: list[dict], hole_ids: list|None, n_rows: list[int]):
+    """ Returns the unique hole ids and the code of each row (-1 for CPTs without hole id)."""
+    np = _import_numpy(NUMPY_FEATURE)
+    if(hole_ids is None):
+        hole_ids = [_hole_id(cpt_header) for cpt_header in headers]
+    categories = list(dict.fromkeys(str(h) for h in hole_ids if h is not None))
+    positions = {category: i for i, category in enumerate(categories)}
+    cpt_codes = np.array([-1 if h is None else positions[str(h)] for h in hole_ids], dtype=np.int32)
+    return(categories, np.repeat(cpt_codes, n_rows))
+
+
+def concat_to_pandas(cpts, hole_ids: list|None = None, hole_id_column: str|None = HOLE_ID_COLUMN):
+    """
+    Returns one DataFrame of many parse results, an iterable of (cpt_header, header_units, measurements) tuples.
+    Every column is allocated once for all rows. hole_id_column is a categorical column with the hole id of each row
+    (from the headers, or hole_ids with one id per CPT), None leaves it out. The headers are in df.attrs['headers'].
+    """
+    pd = _import_pandas()
+    columns, units, headers, n_rows = _concat_columns(cpts)
+    if(hole_id_column is not None):
+        categories, codes = _hole_id_codes(headers, hole_ids, n_rows)
+        columns = {hole_id_column: pd.Categorical.from_codes(codes, categories=categories), **columns}
+    df = pd.DataFrame(columns, copy=False)
+    df.attrs['units'] = units
+    df.attrs['headers'] = headers
+    return(df)
+
+
+def concat_to_arrow(cpts, hole_ids: list|None = None, hole_id_column: str|None = HOLE_ID_COLUMN, nan_as_null: bool = True):
+    """ Returns one pyarrow Table of many parse results, see concat_to_pandas, hole_id_column is dictionary encoded."""
+    pa = _import_pyarrow()
+    columns, units, headers, n_rows = _concat_columns(cpts)
+    arrays, fields = [], []
+    if(hole_id_column is not None):
+        categories, codes = _hole_id_codes(headers, hole_ids, n_rows)
+        hole_id_array = pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), pa.array(categories, type=pa.string()))
+        arrays.append(hole_id_array)
+        fields.append(pa.field(hole_id_column, hole_id_array.type))
+    for name, values in columns.items():
+        arrays.append(_arrow_array(values, nan_as_null))
+        fields.append(pa.field(name, pa.float64(), metadata={'unit': units[name] or ''}))
+    metadata = {'gef_headers': json.dumps(headers, ensure_ascii=False, default=str)}
+    return(pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata)))
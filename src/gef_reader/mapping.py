@@ -0,0 +1,151 @@
+"""
+Mapping of header keys and column names to the default names of the parser.
+"""
+from functools import lru_cache
+
+DEFAULT_HEADER_MAPPING = {
+    # key: value read from header file; value: target value after mapping
+    #TODO: check GEF Help Document for more!
+    'Projekt-Nummer':'projekt_id',
+    'Projektname':'projekt_name',
+    'Versuchs-Nummer':'aufschluss_name',
+    'Kundenname':'kunde',
+    'Ort':'ort',
+    'Datum':'datum',
+    'Konus-Nummer':'konus_nummer',
+    'Geländekante':'ansatz_hoehe',
+    'Wasserspiegel':'gw_stand',
+    'Vorbohrwerte':'vorbohrwerte',
+    'E Coordinate':'RW',
+    'N Coordinate':'HW',
+
+    "Sondeerlengte":"depth",
+    "Conusweerstand qc":"qc",
+    "Wrijvingsweerstand fs":"fs",
+    "Wrijvingsgetal Rf":"Rf",
+    "Waterspanning u2":"u2",
+    "Helling X":"inclination_x",
+    "Helling Y":"inclination_y",
+    "Gecorrigeerde diepte":"depth_corr",
+    "Tijd":"time",
+    "TESTID":"hole_id",
+    "penetration length":"depth",
+    "qc":"qc",
+    "fs":"fs",
+    "SampleTime":"time",
+    "Rf":"Rf",
+}
+
+# quantity numbers of the GEF-CPT standard (4th value of a #COLUMNINFO line) -> default column names
+GEF_QUANTITY_NUMBERS = {
+    1: 'depth', # penetration length
+    2: 'qc', # cone resistance
+    3: 'fs', # friction resistance
+    4: 'Rf', # friction number
+    5: 'u1', # pore pressure u1
+    6: 'u2', # pore pressure u2
+    7: 'u3', # pore pressure u3
+    8: 'inclination', # resultant inclination
+    9: 'inclination_ns', # inclination N-S
+    10: 'inclination_ew', # inclination E-W
+    11: 'depth_corr', # corrected depth
+    12: 'time',
+    13: 'qt', # corrected cone resistance
+    14: 'qn', # net cone resistance
+    15: 'Bq', # pore ratio
+    16: 'Nm', # cone resistance number
+    17: 'gamma', # weight per unit volume
+    18: 'u0', # in-situ, initial pore pressure
+    19: 'sigma_v', # total vertical soil pressure
+    20: 'sigma_v_eff', # effective vertical soil pressure
+    21: 'inclination_x',
+    22: 'inclination_y',
+    23: 'conductivity', # electric conductivity
+}
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+def normalize_key(key: str) -> str:
+    """ Returns the key in lower case (casefold) with single spaces, e.g. 'conusweerstand  QC' -> 'conusweerstand qc'."""
+    return(' '.join(key.casefold().split()))
+
+
+class HeaderMapper:
+    """
+    Maps header keys and column names to default names, build it once per project mapping and reuse it for all files.
+    Keys are matched after normalizing case and whitespace, the resolved names are memoized in a bounded cache.
+
+    e.g. mapper = HeaderMapper({"X":"RW", "Y": "HW", "Z":"ansatz_hoehe"})
+         read_gef_file(file_path, header_mapping_dict=mapper)
+    """
+
+    def __init__(self, additional_mapping_dict: dict = {}, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.additional_mapping_dict = dict(additional_mapping_dict)
+        self.cache_size = cache_size
+        # existing keys are overwritten by the additional mapping
+        mapping_dict = {**DEFAULT_HEADER_MAPPING, **self.additional_mapping_dict}
+        self._mapping = mapping = {normalize_key(k): v for k, v in mapping_dict.items()}
+        # the memoized function does not reference the mapper, so the mapper is not part of a reference cycle
+        self._cached_resolve = lru_cache(maxsize=cache_size)(lambda key: mapping.get(normalize_key(key), key))
+
+    def resolve(self, key: str) -> str:
+        """ Returns the default name of a header key or column name, unknown keys are returned unchanged."""
+        return(self._cached_resolve(key))
+
+    def map(self, header: dict|list) -> dict:
+        """ Renames the keys of a header dict, a list of names is returned as dict of default name: original name."""
+        resolve = self._cached_resolve
+        if isinstance(header, dict):
+            return({resolve(k): v for k, v in header.items()})
+        if isinstance(header, list):
+            return({resolve(k): k for k in header})
+        return({})
+
+    def column_names(self, columninfo: list[list]) -> list[str]:
+        """ Returns the default column names of the #COLUMNINFO entries (number, unit, name, quantity number).
+            The name is mapped first, unknown names fall back to the GEF quantity number.
+            Names that would occur twice keep their original name.
+        """
+        names = []
+        for info in columninfo:
+            name = str(info[2])
+            target = self.resolve(name)
+            if(target == name and len(info) > 3):
+                target = GEF_QUANTITY_NUMBERS.get(info[3], name)
+            names.append(name if target in names else target)
+        return(names)
+
+    def cache_info(self):
+        return(self._cached_resolve.cache_info())
+
+    def __getstate__(self):
+        # the memoized function can not be pickled (e.g. for worker processes), it is rebuilt on load
+        return({'additional_mapping_dict': self.additional_mapping_dict, 'cache_size': self.cache_size})
+
+    def __setstate__(self, state):
+        self.__init__(state['additional_mapping_dict'], state['cache_size'])
+
+    def __repr__(self):
+        return(f'HeaderMapper({self.additional_mapping_dict!r})')
+
+
+DEFAULT_MAPPER = HeaderMapper()
+
+
+@lru_cache(maxsize=32)
+def _mapper_for(additional_items: tuple) -> HeaderMapper:
+    return(HeaderMapper(dict(additional_items)))
+
+
+def get_mapper(additional_mapping_dict: dict|HeaderMapper = {}) -> HeaderMapper:
+    """ Returns a HeaderMapper for a mapping dict, the mappers of the last used dicts are reused."""
+    if(isinstance(additional_mapping_dict, HeaderMapper)):
+        return(additional_mapping_dict)
+    if(not additional_mapping_dict):
+        return(DEFAULT_MAPPER)
+    try:
+        return(_mapper_for(tuple(additional_mapping_dict.items())))
+    except TypeError:
+        # unhashable values
+        return(HeaderMapper(additional_mapping_dict))
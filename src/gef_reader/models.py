@@ -1,6 +1,11 @@
-from dataclasses import dataclass
+from array import array
+from dataclasses import asdict, dataclass, field, fields
+from math import isnan
 
-@dataclass
+from . import profile
+from .binary import _as_float_array
+
+@dataclass(slots=True)
 class CPTMeasurement:
     #penetration_length: float|None = None
     measured_depth: float|None = None # measured depth, downwards along the metal rod
@@ -21,7 +26,7 @@ class CPTMeasurement:
     soilavg: int|None = None
     inner_friction_angle: float|None = None
 
-@dataclass
+@dataclass(slots=True)
 class CPTHeader:
     project_number: str|None = None
     project_name: str|None = None
@@ -35,8 +40,206 @@ class CPTHeader:
     northing: float|None = None
     easting: float|None = None
     elevation: float|None = None
+    extra: dict = field(default_factory=dict) # header values without a field, with the names of the parser
+
+MEASUREMENT_FIELDS = tuple(f.name for f in fields(CPTMeasurement))
+HEADER_FIELDS = tuple(f.name for f in fields(CPTHeader) if f.name != 'extra')
+
+# column names of read_gef_file / read_alt_gef_file (after map_to_default_header_names) -> CPTMeasurement fields
+COLUMN_FIELD_MAPPING = {
+    'Tiefe': 'measured_depth',
+    'depth': 'measured_depth',
+    'qc': 'qc',
+    'qt': 'qt',
+    'fs': 'fs',
+    'u1': 'u1',
+    'u2': 'u2',
+    'u3': 'u3',
+    'I': 'inclination',
+    'inclination': 'inclination',
+    'ic': 'ic',
+    'Rf': 'friction_ratio_rf',
+    'Su_min': 'su_min',
+    'Su_max': 'su_max',
+    'soilfr': 'soilfr',
+    'soilbq': 'soilbq',
+    'soilavg': 'soilavg',
+    'IFA': 'inner_friction_angle',
+}
+
+# header keys of read_gef_file / read_alt_gef_file (after map_to_default_header_names) -> CPTHeader fields
+HEADER_FIELD_MAPPING = {
+    'projekt_id': 'project_number',
+    'projekt_name': 'project_name',
+    'aufschluss_name': 'hole_id',
+    'TESTID': 'hole_id',
+    'kunde': 'client_name',
+    'ort': 'location',
+    'datum': 'date',
+    'konus_nummer': 'cone_number',
+    'gw_stand': 'water_level',
+    'vorbohrwerte': 'pre_excavation',
+    'HW': 'northing',
+    'RW': 'easting',
+    'ansatz_hoehe': 'elevation',
+}
+
+
+def _header_from_gef(cpt_header: dict) -> CPTHeader:
+    header = CPTHeader()
+    for key, value in cpt_header.items():
+        name = HEADER_FIELD_MAPPING.get(key)
+        if(name is not None):
+            setattr(header, name, value)
+        else:
+            header.extra[key] = value
+    # #COLUMNINFO files: XYID= crs, x, y, dx, dy and ZID= crs, z, dz
+    xyid = cpt_header.get('XYID')
+    if(isinstance(xyid, list) and len(xyid) >= 3):
+        header.easting, header.northing = xyid[1], xyid[2]
+    zid = cpt_header.get('ZID')
+    if(isinstance(zid, list) and len(zid) >= 2):
+        header.elevation = zid[1]
+    return(header)
+
 
-@dataclass
+def _to_typed_array(values) -> array:
+    """ Returns the values as array('d') with NaN for None and non-numeric values, numpy arrays and array('d') are used without copying."""
+    if(type(values).__name__ == 'ndarray' and values.dtype == 'float64' and values.ndim == 1):
+        return(values)
+    return(_as_float_array(values))
+
+
+@dataclass(slots=True)
 class CPT:
+    """ One sounding as struct of arrays: the measurements are stored as one typed array per column
+        (8 bytes per value instead of one object per value), CPTMeasurement rows are only created on demand.
+        columns are keyed by the CPTMeasurement field names, other columns of the file keep their name.
+        Missing values are NaN.
+    """
     cpt_header: CPTHeader
-    cpt_measurements: list[CPTMeasurement]
+    columns: dict[str, array] = field(default_factory=dict)
+    units: dict[str, str] = field(default_factory=dict)
+    _depth_indexes: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_gef(cls, cpt_header: dict, header_units: dict|list, measurements: list[dict]|dict,
+                 column_mapping: dict = COLUMN_FIELD_MAPPING) -> 'CPT':
+        """
+        Builds a CPT from the output of read_gef_file / read_alt_gef_file, both layouts are supported.
+        With layout='columns' the column arrays are used as they are, without copying the values.
+
+        e.g. CPT.from_gef(*read_gef_file(file_path, layout='columns'))
+        """
+        if(isinstance(measurements, dict)):
+            names = list(measurements)
+            raw_columns = measurements
+        else:
+            names = list(measurements[0]) if measurements else []
+            raw_columns = {name: [row.get(name) for row in measurements] for name in names}
+        if(isinstance(header_units, list)):
+            # #COLUMNINFO files return the units in column order
+            header_units = dict(zip(names, header_units))
+        columns = {}
+        units = {}
+        for name in names:
+            target = column_mapping.get(name, name)
+            columns[target] = _to_typed_array(raw_columns[name])
+            if(name in header_units):
+                units[target] = header_units[name]
+        return(cls(_header_from_gef(cpt_header), columns, units))
+
+    @classmethod
+    def from_measurements(cls, cpt_header: CPTHeader, cpt_measurements: list[CPTMeasurement]) -> 'CPT':
+        """ Builds a CPT from a list of CPTMeasurement rows, only the fields that are set in any row become columns."""
+        columns = {}
+        for name in MEASUREMENT_FIELDS:
+            values = [getattr(row, name) for row in cpt_measurements]
+            if(any(v is not None for v in values)):
+                columns[name] = _to_typed_array(values)
+        return(cls(cpt_header, columns))
+
+    def __len__(self) -> int:
+        return(len(next(iter(self.columns.values()), ())))
+
+    def row(self, index: int) -> CPTMeasurement:
+        """ Returns a CPTMeasurement view of one depth step, NaN values are returned as None."""
+        row = CPTMeasurement()
+        for name, values in self.columns.items():
+            if(name in MEASUREMENT_FIELDS):
+                value = float(values[index])
+                setattr(row, name, None if isnan(value) else value)
+        return(row)
+
+    def iter_rows(self):
+        for index in range(len(self)):
+            yield self.row(index)
+
+    @property
+    def cpt_measurements(self) -> list[CPTMeasurement]:
+        """ All depth steps as CPTMeasurement objects, created on every access, use columns for large data."""
+        return(list(self.iter_rows()))
+
+    def depth_index(self, column: str|None = None) -> profile.DepthIndex:
+        """ Returns the sorted depth index of a depth column (default: the first of profile.DEPTH_COLUMNS), built on first use."""
+        column = profile.depth_column(self.columns, column)
+        index = self._depth_indexes.get(column)
+        if(index is None):
+            index = self._depth_indexes[column] = profile.DepthIndex(self.columns[column])
+        return(index)
+
+    def slice(self, top: float|None = None, bottom: float|None = None, depth_column: str|None = None) -> 'CPT':
+        """ Returns the depth steps with top <= depth < bottom as new CPT, found by bisection on the depth index."""
+        columns = profile.slice_columns(self.columns, self.depth_index(depth_column), top, bottom)
+        return(CPT(self.cpt_header, columns, dict(self.units)))
+
+    def resample(self, step: float, agg: str = 'mean', top: float|None = None, bottom: float|None = None,
+                 depth_column: str|None = None) -> 'CPT':
+        """
+        Aggregates all columns over depth bins of size step (e.g. 0.1, 0.25 or 0.5 m), UNDEF values are ignored.
+        agg is one of 'mean', 'median', 'min' or 'max'. The depth column of the result holds the top of each bin,
+        the column 'depth_bottom' its bottom.
+        """
+        name = profile.depth_column(self.columns, depth_column)
+        columns = profile.resample_columns(self.columns, self.depth_index(name), name, step, agg=agg, top=top, bottom=bottom)
+        return(CPT(self.cpt_header, columns, {**self.units, 'depth_bottom': self.units.get(name)}))
+
+    def decimate(self, n_points: int, method: str = 'minmax', columns: list[str]|None = None, top: float|None = None,
+                 bottom: float|None = None, depth_column: str|None = None, depth_range: tuple[float, float]|None = None) -> 'CPT':
+        """
+        Returns at most n_points depth steps for plotting, peaks and thin layers are kept (see profile.decimate_columns).
+        method is 'minmax' (smallest and largest value of each of columns per depth bucket) or 'lttb' (largest triangle three buckets),
+        columns defaults to all columns. All columns of the result share the selected depth steps.
+        """
+        name = profile.depth_column(self.columns, depth_column)
+        decimated = profile.decimate_columns(self.columns, self.depth_index(name), name, n_points, method=method, names=columns,
+                                             top=top, bottom=bottom, depth_range=depth_range)
+        return(CPT(self.cpt_header, decimated, dict(self.units)))
+
+    def to_pandas(self, copy: bool = False):
+        """ Returns the columns as pandas DataFrame without copying them, units and header in df.attrs (see interop.to_pandas)."""
+        from .interop import to_pandas
+        return(to_pandas(asdict(self.cpt_header), self.units, self.columns, copy=copy))
+
+    def to_arrow(self, nan_as_null: bool = True):
+        """ Returns the columns as pyarrow Table sharing the column buffers (see interop.to_arrow)."""
+        from .interop import to_arrow
+        return(to_arrow(asdict(self.cpt_header), self.units, self.columns, nan_as_null=nan_as_null))
+
+    def nbytes(self) -> int:
+        """ Size of the column data in bytes."""
+        return(sum(len(values) * values.itemsize for values in self.columns.values()))
+
+
+def decimate_cpts(cpts: list[CPT], n_points: int, method: str = 'minmax', columns: list[str]|None = None,
+                  depth_column: str|None = None) -> list[CPT]:
+    """
+    Decimates the CPTs of a cross-section to at most n_points depth steps each (see CPT.decimate).
+    The depth buckets are spread over the common depth range of all CPTs, so every CPT is drawn with the same depth resolution.
+    """
+    depths = [cpt.depth_index(depth_column).depths for cpt in cpts]
+    depths = [d for d in depths if len(d)]
+    if(not depths):
+        return([cpt.decimate(n_points, method, columns, depth_column=depth_column) for cpt in cpts])
+    depth_range = (min(d[0] for d in depths), max(d[-1] for d in depths))
+    return([cpt.decimate(n_points, method, columns, depth_column=depth_column, depth_range=depth_range) for cpt in cpts])
@@ -0,0 +1,307 @@
+"""
+Depth index, depth range slicing and interval resampling of CPT profiles.
+
+The index is built once per CPT (a sorted copy of the depth column), slices are found with bisect.
+resample aggregates all columns over fixed depth bins (e.g. 0.1/0.25/0.5 m) in one pass per column,
+UNDEF values (NaN) are ignored. numpy columns (engine='numpy') are aggregated vectorized.
+decimate keeps a subset of the measured rows for plotting (min/max per depth bucket or largest triangle three buckets),
+all columns share the selected rows so they can still be drawn against one depth axis.
+"""
+from array import array
+from bisect import bisect_left
+from math import ceil, floor, isnan
+from statistics import median
+
+DEPTH_COLUMNS = ('measured_depth', 'depth_corr', 'Tiefe', 'depth')
+AGGREGATIONS = ('mean', 'median', 'min', 'max')
+DECIMATIONS = ('minmax', 'lttb')
+NAN = float('nan')
+
+
+def _is_numpy(values) -> bool:
+    return(type(values).__name__ == 'ndarray')
+
+
+def _take(values, order: list[int]|None, start: int, stop: int):
+    """ Returns values[start:stop] in index order, for numpy arrays without copying if the depths are sorted."""
+    if(order is None):
+        return(values[start:stop])
+    positions = order[start:stop]
+    if(_is_numpy(values)):
+        return(values[positions])
+    return(array('d', [values[i] for i in positions]))
+
+
+class DepthIndex:
+    """ Sorted depths of a CPT, NaN depths are left out. order maps the sorted positions to the rows (None if the rows are sorted)."""
+
+    def __init__(self, depths):
+        if(_is_numpy(depths)):
+            import numpy as np
+            if(not np.isnan(depths).any() and (depths[1:] >= depths[:-1]).all()):
+                self.order, self.depths = None, depths
+                return
+        n = len(depths)
+        valid = [i for i in range(n) if not isnan(depths[i])]
+        if(len(valid) == n and all(depths[i] <= depths[i + 1] for i in range(n - 1))):
+            self.order = None
+            self.depths = depths if isinstance(depths, array) or _is_numpy(depths) else array('d', depths)
+        else:
+            self.order = sorted(valid, key=depths.__getitem__)
+            self.depths = array('d', [depths[i] for i in self.order])
+
+    def __len__(self) -> int:
+        return(len(self.depths))
+
+    def bounds(self, top: float|None = None, bottom: float|None = None) -> tuple[int, int]:
+        """ Returns the positions of the depths top <= depth < bottom in the sorted depths."""
+        start = 0 if top is None else bisect_left(self.depths, top)
+        stop = len(self.depths) if bottom is None else bisect_left(self.depths, bottom)
+        return(start, max(start, stop))
+
+
+def depth_column(columns: dict, column: str|None = None) -> str:
+    """ Returns the name of the depth column, the first of DEPTH_COLUMNS if column is None."""
+    if(column is not None):
+        if(column not in columns):
+            raise KeyError(f'depth column {column!r} not found, columns: {list(columns)}')
+        return(column)
+    for name in DEPTH_COLUMNS:
+        if(name in columns):
+            return(name)
+    raise KeyError(f'no depth column found, expected one of {DEPTH_COLUMNS}')
+
+
+def slice_columns(columns: dict, index: DepthIndex, top: float|None, bottom: float|None) -> dict:
+    start, stop = index.bounds(top, bottom)
+    return({name: _take(values, index.order, start, stop) for name, values in columns.items()})
+
+
+def _bin_edges(index: DepthIndex, step: float, top: float|None, bottom: float|None) -> list[float]:
+    """ Returns the bin edges in multiples of step from top (or the first depth) to bottom (or past the last depth)."""
+    if(len(index) == 0):
+        return([])
+    first = floor((index.depths[0] if top is None else top) / step + 1e-9)
+    last_depth = index.depths[-1] if bottom is None else bottom
+    if(bottom is None):
+        n_bins = floor(last_depth / step + 1e-9) + 1 - first
+    else:
+        n_bins = max(1, ceil(last_depth / step - 1e-9) - first)
+    return([round((first + i) * step, 10) for i in range(n_bins + 1)])
+
+
+def _aggregate_python(values, bounds: list[tuple[int, int]], agg: str) -> array:
+    out = array('d')
+    for start, stop in bounds:
+        cell = [v for v in values[start:stop] if v == v]
+        if(not cell):
+            out.append(NAN)
+        elif(agg == 'mean'):
+            out.append(sum(cell) / len(cell))
+        elif(agg == 'median'):
+            out.append(median(cell))
+        elif(agg == 'min'):
+            out.append(min(cell))
+        else:
+            out.append(max(cell))
+    return(out)
+
+
+def _aggregate_numpy(values, bounds: list[tuple[int, int]], agg: str):
+    import numpy as np
+    starts = np.array([start for start, _ in bounds], dtype=np.intp)
+    stops = np.array([stop for _, stop in bounds], dtype=np.intp)
+    result = np.full(len(bounds), np.nan)
+    filled = stops > starts
+    if(len(values) == 0 or not filled.any()):
+        return(result)
+    valid = ~np.isnan(values)
+    if(agg == 'median'):
+        # sort the valid values by bin and value, the median is taken from the middle of each bin's run
+        bin_ids = np.repeat(np.arange(len(bounds)), stops - starts)[valid[starts[0]:]]
+        sorted_values = values[starts[0]:][valid[starts[0]:]]
+        sorted_values = sorted_values[np.lexsort((sorted_values, bin_ids))]
+        counts = np.bincount(bin_ids, minlength=len(bounds))
+        offsets = np.cumsum(counts) - counts
+        has_values = counts > 0
+        lower = sorted_values[(offsets + (counts - 1) // 2)[has_values]]
+        upper = sorted_values[(offsets + counts // 2)[has_values]]
+        result[has_values] = (lower + upper) / 2
+        return(result)
+    # reduceat reduces from each start to the next start, values are cut at the end of the last bin by the caller
+    reduce_starts = starts[filled]
+    counts = np.add.reduceat(valid, reduce_starts)
+    if(agg == 'mean'):
+        reduced = np.add.reduceat(np.where(valid, values, 0.0), reduce_starts) / np.where(counts > 0, counts, 1)
+    elif(agg == 'min'):
+        reduced = np.fmin.reduceat(values, reduce_starts)
+    else:
+        reduced = np.fmax.reduceat(values, reduce_starts)
+    result[filled] = np.where(counts > 0, reduced, np.nan)
+    return(result)
+
+
+def resample_columns(columns: dict, index: DepthIndex, depth_name: str, step: float, agg: str = 'mean',
+                     top: float|None = None, bottom: float|None = None) -> dict:
+    """
+    Aggregates all columns over depth bins of size step, bins are aligned to multiples of step.
+    Returns the columns of the bins: depth_name is the top of the bin, 'depth_bottom' its bottom,
+    empty bins and bins with only UNDEF values are NaN.
+    """
+    if(agg not in AGGREGATIONS):
+        raise ValueError(f'unknown aggregation {agg!r}, use one of {AGGREGATIONS}')
+    if(step <= 0):
+        raise ValueError(f'step must be positive, got {step}')
+    edges = _bin_edges(index, step, top, bottom)
+    positions = [bisect_left(index.depths, edge) for edge in edges]
+    bounds = list(zip(positions[:-1], positions[1:]))
+    stop = positions[-1] if positions else 0
+    resampled = {depth_name: array('d', edges[:-1]), 'depth_bottom': array('d', edges[1:])}
+    for name, values in columns.items():
+        if(name == depth_name):
+            continue
+        values = _take(values, index.order, 0, len(index)) if index.order is not None else values
+        if(_is_numpy(values)):
+            resampled[name] = _aggregate_numpy(values[:stop], bounds, agg)
+        else:
+            resampled[name] = _aggregate_python(values, bounds, agg)
+    return(resampled)
+
+
+def _take_rows(values, rows: list[int]):
+    if(_is_numpy(values)):
+        import numpy as np
+        return(values[np.array(rows, dtype=np.intp)])
+    return(array('d', [values[i] for i in rows]))
+
+
+def _bucket_bounds(depths, start: int, stop: int, n_buckets: int, top: float, bottom: float) -> list[tuple[int, int]]:
+    """ Splits the sorted depths[start:stop] into n_buckets buckets of equal depth between top and bottom, empty buckets are left out."""
+    positions = [start]
+    for i in range(1, n_buckets):
+        positions.append(bisect_left(depths, top + (bottom - top) * i / n_buckets, start, stop))
+    positions.append(stop)
+    return([(a, b) for a, b in zip(positions[:-1], positions[1:]) if b > a])
+
+
+def _scales(values: list[list[float]]) -> list[float]:
+    """ Returns 1 / value range of each column (0 for constant or empty columns), UNDEF values are ignored."""
+    scales = []
+    for column in values:
+        valid = [v for v in column if v == v]
+        spread = max(valid) - min(valid) if valid else 0.0
+        scales.append(1.0 / spread if spread > 0 else 0.0)
+    return(scales)
+
+
+def _minmax_rows(values: list[list[float]], bounds: list[tuple[int, int]], max_rows: int) -> list[int]:
+    """ Returns the rows of the smallest and the largest value of every column in every bucket, UNDEF values are ignored.
+        If the extremes of a bucket are on more than max_rows rows, the extremes of the columns that vary most
+        in the bucket (relative to their value range) are kept.
+    """
+    scales = _scales(values) if max_rows < 2 * len(values) else None
+    rows = []
+    for start, stop in bounds:
+        extremes = []
+        for column_index, column in enumerate(values):
+            low = high = None
+            for i in range(start, stop):
+                v = column[i]
+                if(v != v):
+                    continue
+                if(low is None or v < column[low]):
+                    low = i
+                if(high is None or v > column[high]):
+                    high = i
+            if(low is not None):
+                span = 0.0 if scales is None else (column[high] - column[low]) * scales[column_index]
+                extremes += [(span, low), (span, high)]
+        bucket_rows = set()
+        for _, row in sorted(extremes, key=lambda extreme: -extreme[0]):
+            if(len(bucket_rows) == max_rows and row not in bucket_rows):
+                continue
+            bucket_rows.add(row)
+        rows += sorted(bucket_rows)
+    return(rows)
+
+
+def _lttb_rows(depths: list[float], values: list[list[float]], bounds: list[tuple[int, int]], first: int, last: int) -> list[int]:
+    """
+    Largest triangle three buckets: picks one row per bucket, the one that spans the largest triangle with the row
+    picked in the bucket before and the mean of the bucket after. With several columns the areas of all columns are added,
+    each column scaled by its value range, so one shared row is picked. UNDEF values add no area.
+    """
+    scales = _scales(values)
+    means = []
+    for start, stop in bounds:
+        column_means = []
+        for column in values:
+            valid = [v for v in column[start:stop] if v == v]
+            column_means.append(sum(valid) / len(valid) if valid else NAN)
+        means.append((sum(depths[start:stop]) / (stop - start), column_means))
+    means.append((depths[last], [column[last] for column in values]))
+    rows = []
+    previous = first
+    for b, (start, stop) in enumerate(bounds):
+        x_a = depths[previous]
+        x_n, next_means = means[b + 1]
+        best, best_area = (start + stop - 1) // 2, -1.0
+        for j in range(start, stop):
+            x_j = depths[j]
+            area = 0.0
+            for column, scale, y_n in zip(values, scales, next_means):
+                y_a, y_j = column[previous], column[j]
+                if(y_a == y_a and y_j == y_j and y_n == y_n):
+                    area += abs((x_a - x_n) * (y_j - y_a) - (x_a - x_j) * (y_n - y_a)) * scale
+            if(area > best_area):
+                best, best_area = j, area
+        rows.append(best)
+        previous = best
+    return(rows)
+
+
+def decimate_columns(columns: dict, index: DepthIndex, depth_name: str, n_points: int, method: str = 'minmax',
+                     names: list[str]|None = None, top: float|None = None, bottom: float|None = None,
+                     depth_range: tuple[float, float]|None = None) -> dict:
+    """
+    Reduces a profile to at most n_points rows for plotting, in one pass over the rows.
+    The depth range (top to bottom, default the first and last depth) is split into buckets of equal depth:
+    'minmax' keeps the rows of the smallest and the largest value of each column of names (default all columns) per bucket,
+    'lttb' keeps one row per bucket with the largest triangle three buckets algorithm.
+    Peaks and thin layers are kept by both, the first and last row always. The selected rows are returned for all columns,
+    profiles with up to n_points rows are returned sorted but complete. top <= depth < bottom limits the rows,
+    depth_range (top, bottom) spreads the buckets over another range, e.g. the same range for all CPTs of a cross-section.
+    """
+    if(method not in DECIMATIONS):
+        raise ValueError(f'unknown decimation {method!r}, use one of {DECIMATIONS}')
+    if(n_points < 3):
+        raise ValueError(f'n_points must be at least 3, got {n_points}')
+    start, stop = index.bounds(top, bottom)
+    if(index.order is None and start == 0 and stop == len(columns[depth_name])):
+        sorted_columns = columns
+    else:
+        sorted_columns = {name: _take(values, index.order, start, stop) for name, values in columns.items()}
+    n_rows = stop - start
+    if(n_rows <= n_points):
+        return({name: values[:] for name, values in sorted_columns.items()})
+    names = [name for name in (names or sorted_columns) if name != depth_name]
+    for name in names:
+        if(name not in sorted_columns):
+            raise KeyError(f'column {name!r} not found, columns: {list(sorted_columns)}')
+    # plain float lists are the fastest to index in the loops below
+    depths = sorted_columns[depth_name].tolist()
+    values = [sorted_columns[name].tolist() for name in names]
+    first, last = 0, n_rows - 1
+    if(depth_range is None):
+        depth_range = (depths[first] if top is None else top, depths[last] if bottom is None else bottom)
+    top, bottom = depth_range
+    if(method == 'minmax'):
+        # every bucket adds at most two rows per column, with many columns the buckets keep the extremes of the columns that vary most
+        n_buckets = max(1, (n_points - 2) // (2 * max(1, len(names))) or (n_points - 2) // 2)
+        bounds = _bucket_bounds(depths, first + 1, last, n_buckets, top, bottom)
+        rows = _minmax_rows(values, bounds, max_rows=(n_points - 2) // n_buckets)
+    else:
+        bounds = _bucket_bounds(depths, first + 1, last, n_points - 2, top, bottom)
+        rows = _lttb_rows(depths, values, bounds, first, last)
+    rows = [first, *rows, last]
+    return({name: _take_rows(values, rows) for name, values in sorted_columns.items()})
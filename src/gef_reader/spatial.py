@@ -0,0 +1,276 @@
+"""
+Spatial index over CPT collars.
+
+CPTCatalog is a static KD-tree (pure python, stored as flat arrays like kdbush) over the x/y coordinates
+of the CPT headers. It answers bounding box, radius, polygon and k-nearest-neighbour queries
+without scanning all soundings and can be saved to and loaded from a JSON file.
+"""
+import heapq
+import json
+from array import array
+from math import sqrt
+from pathlib import Path
+
+from .gef_reader import _hole_id
+
+DEFAULT_NODE_SIZE = 64
+CATALOG_FORMAT_VERSION = 1
+
+# header keys with the collar coordinates, per dialect
+COORDINATE_HEADER_KEYS = (('RW', 'HW'), ('E Coordinate', 'N Coordinate'))
+
+
+def _to_float(value) -> float|None:
+    if(isinstance(value, str)):
+        value = value.replace(',', '.')
+    try:
+        return(float(value))
+    except (TypeError, ValueError):
+        return(None)
+
+
+def collar_from_header(cpt_header: dict) -> tuple[float, float]|None:
+    """ Returns the (x, y) coordinates of a header of read_gef_file / extract_header_part (RW/HW)
+        or read_alt_gef_file / extract_alternative_header_part (XYID= crs, x, y, ...), None if there are none.
+    """
+    xyid = cpt_header.get('XYID')
+    if(isinstance(xyid, list) and len(xyid) >= 3):
+        x, y = _to_float(xyid[1]), _to_float(xyid[2])
+        if(x is not None and y is not None):
+            return(x, y)
+    for x_key, y_key in COORDINATE_HEADER_KEYS:
+        if(x_key in cpt_header and y_key in cpt_header):
+            x, y = _to_float(cpt_header[x_key]), _to_float(cpt_header[y_key])
+            if(x is not None and y is not None):
+                return(x, y)
+    return(None)
+
+
+def _point_in_polygon(x: float, y: float, polygon: list[tuple[float, float]]) -> bool:
+    inside = False
+    x1, y1 = polygon[-1]
+    for x2, y2 in polygon:
+        if((y2 > y) != (y1 > y) and x < (x1 - x2) * (y - y2) / (y1 - y2) + x2):
+            inside = not inside
+        x1, y1 = x2, y2
+    return(inside)
+
+
+class CPTCatalog:
+    """
+    Static KD-tree over CPT collars.
+
+    ids are the keys returned by the queries (e.g. hole ids or file paths), coordinates are in the
+    (projected) coordinate system of the headers, distances in its units.
+
+    e.g. catalog = CPTCatalog.from_headers(result.headers, ids=result.file_paths)
+         catalog.within(31000.0, 432810.0, radius=500.0)
+         catalog.nearest(31000.0, 432810.0, k=5)
+    """
+
+    def __init__(self, ids: list, xs: list[float], ys: list[float], node_size: int = DEFAULT_NODE_SIZE, _sorted: bool = False):
+        if(not (len(ids) == len(xs) == len(ys))):
+            raise ValueError('ids, xs and ys must have the same length')
+        self.node_size = node_size
+        self.ids = list(ids)
+        self.coords = array('d')
+        for x, y in zip(xs, ys):
+            self.coords.append(x)
+            self.coords.append(y)
+        if(not _sorted):
+            self._sort(0, len(self.ids) - 1, 0)
+
+    @classmethod
+    def from_headers(cls, headers: list[dict], ids: list|None = None, node_size: int = DEFAULT_NODE_SIZE) -> 'CPTCatalog':
+        """ Builds the catalog from CPT headers, headers without coordinates are skipped.
+            ids default to the hole ids of the headers.
+        """
+        catalog_ids, xs, ys = [], [], []
+        for i, cpt_header in enumerate(headers):
+            collar = collar_from_header(cpt_header)
+            if(collar is None):
+                continue
+            catalog_ids.append(ids[i] if ids is not None else _hole_id(cpt_header))
+            xs.append(collar[0])
+            ys.append(collar[1])
+        return(cls(catalog_ids, xs, ys, node_size=node_size))
+
+    def __len__(self) -> int:
+        return(len(self.ids))
+
+    def __iter__(self):
+        """ Yields (id, x, y) of all collars."""
+        for i, id_ in enumerate(self.ids):
+            yield(id_, self.coords[2 * i], self.coords[2 * i + 1])
+
+    # building
+
+    def _swap(self, i: int, j: int):
+        ids, coords = self.ids, self.coords
+        ids[i], ids[j] = ids[j], ids[i]
+        coords[2 * i], coords[2 * j] = coords[2 * j], coords[2 * i]
+        coords[2 * i + 1], coords[2 * j + 1] = coords[2 * j + 1], coords[2 * i + 1]
+
+    def _select(self, k: int, left: int, right: int, axis: int):
+        """ Partially sorts the points between left and right so that the k-th point is at its sorted position (quickselect)."""
+        coords = self.coords
+        while(right > left):
+            t = coords[2 * k + axis]
+            i, j = left, right
+            self._swap(left, k)
+            if(coords[2 * right + axis] > t):
+                self._swap(left, right)
+            while(i < j):
+                self._swap(i, j)
+                i += 1
+                j -= 1
+                while(coords[2 * i + axis] < t):
+                    i += 1
+                while(coords[2 * j + axis] > t):
+                    j -= 1
+            if(coords[2 * left + axis] == t):
+                self._swap(left, j)
+            else:
+                j += 1
+                self._swap(j, right)
+            if(j <= k):
+                left = j + 1
+            if(k <= j):
+                right = j - 1
+
+    def _sort(self, left: int, right: int, axis: int):
+        stack = [(left, right, axis)]
+        while(stack):
+            left, right, axis = stack.pop()
+            if(right - left <= self.node_size):
+                continue
+            m = (left + right) >> 1
+            self._select(m, left, right, axis)
+            stack.append((left, m - 1, 1 - axis))
+            stack.append((m + 1, right, 1 - axis))
+
+    # queries
+
+    def _range_indexes(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[int]:
+        coords, node_size = self.coords, self.node_size
+        result = []
+        stack = [(0, len(self.ids) - 1, 0)]
+        while(stack):
+            left, right, axis = stack.pop()
+            if(right - left <= node_size):
+                for i in range(left, right + 1):
+                    x, y = coords[2 * i], coords[2 * i + 1]
+                    if(min_x <= x <= max_x and min_y <= y <= max_y):
+                        result.append(i)
+                continue
+            m = (left + right) >> 1
+            x, y = coords[2 * m], coords[2 * m + 1]
+            if(min_x <= x <= max_x and min_y <= y <= max_y):
+                result.append(m)
+            low, high = (min_x, max_x) if axis == 0 else (min_y, max_y)
+            value = x if axis == 0 else y
+            if(low <= value):
+                stack.append((left, m - 1, 1 - axis))
+            if(high >= value):
+                stack.append((m + 1, right, 1 - axis))
+        return(result)
+
+    def bbox(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list:
+        """ Returns the ids of all collars within the bounding box (borders included)."""
+        return([self.ids[i] for i in self._range_indexes(min_x, min_y, max_x, max_y)])
+
+    def within(self, x: float, y: float, radius: float) -> list:
+        """ Returns the ids of all collars within radius of (x, y), ordered by distance."""
+        r2 = radius * radius
+        coords = self.coords
+        hits = []
+        for i in self._range_indexes(x - radius, y - radius, x + radius, y + radius):
+            d2 = (coords[2 * i] - x) ** 2 + (coords[2 * i + 1] - y) ** 2
+            if(d2 <= r2):
+                hits.append((d2, i))
+        hits.sort()
+        return([self.ids[i] for _, i in hits])
+
+    def within_polygon(self, polygon: list[tuple[float, float]], buffer: float = 0.0) -> list:
+        """ Returns the ids of all collars inside a polygon (list of (x, y) vertices, closed or open).
+            With buffer > 0 collars within that distance of a vertex are included as well.
+        """
+        xs = [p[0] for p in polygon]
+        ys = [p[1] for p in polygon]
+        candidates = self._range_indexes(min(xs) - buffer, min(ys) - buffer, max(xs) + buffer, max(ys) + buffer)
+        coords = self.coords
+        result = []
+        for i in candidates:
+            x, y = coords[2 * i], coords[2 * i + 1]
+            if(_point_in_polygon(x, y, polygon) or (buffer > 0 and any((x - px) ** 2 + (y - py) ** 2 <= buffer * buffer for px, py in polygon))):
+                result.append(self.ids[i])
+        return(result)
+
+    def nearest(self, x: float, y: float, k: int = 1, max_distance: float|None = None) -> list[tuple]:
+        """ Returns the k nearest collars to (x, y) as list of (id, distance), ordered by distance."""
+        if(not self.ids or k <= 0):
+            return([])
+        coords, node_size = self.coords, self.node_size
+        max_d2 = float('inf') if max_distance is None else max_distance * max_distance
+        result = []
+        # queue of (squared distance to the node box or point, tiebreak, node or point)
+        # a node is (left, right, axis, min_x, min_y, max_x, max_y), a point is its index
+        inf = float('inf')
+        queue = [(0.0, 0, (0, len(self.ids) - 1, 0, -inf, -inf, inf, inf))]
+        counter = 1
+        while(queue):
+            d2, _, item = heapq.heappop(queue)
+            if(d2 > max_d2):
+                break
+            if(isinstance(item, int)):
+                result.append((self.ids[item], sqrt(d2)))
+                if(len(result) == k):
+                    break
+                continue
+            left, right, axis, min_x, min_y, max_x, max_y = item
+            if(right - left <= node_size):
+                for i in range(left, right + 1):
+                    point_d2 = (coords[2 * i] - x) ** 2 + (coords[2 * i + 1] - y) ** 2
+                    heapq.heappush(queue, (point_d2, counter, i))
+                    counter += 1
+                continue
+            m = (left + right) >> 1
+            mx, my = coords[2 * m], coords[2 * m + 1]
+            heapq.heappush(queue, ((mx - x) ** 2 + (my - y) ** 2, counter, m))
+            counter += 1
+            if(axis == 0):
+                children = ((left, m - 1, 1, min_x, min_y, mx, max_y), (m + 1, right, 1, mx, min_y, max_x, max_y))
+            else:
+                children = ((left, m - 1, 0, min_x, min_y, max_x, my), (m + 1, right, 0, min_x, my, max_x, max_y))
+            for child in children:
+                if(child[0] > child[1]):
+                    continue
+                dx = max(child[3] - x, 0.0, x - child[5])
+                dy = max(child[4] - y, 0.0, y - child[6])
+                heapq.heappush(queue, (dx * dx + dy * dy, counter, child))
+                counter += 1
+        return(result)
+
+    # persistence
+
+    def save(self, path: str|Path):
+        """ Saves the index (ids, sorted coordinates and node size) as JSON, the ids must be JSON serializable."""
+        data = {
+            'version': CATALOG_FORMAT_VERSION,
+            'node_size': self.node_size,
+            'ids': self.ids,
+            'coords': self.coords.tolist(),
+        }
+        Path(path).write_text(json.dumps(data))
+
+    @classmethod
+    def load(cls, path: str|Path) -> 'CPTCatalog':
+        """ Loads an index saved with save, the tree is not rebuilt."""
+        data = json.loads(Path(path).read_text())
+        if(data.get('version') != CATALOG_FORMAT_VERSION):
+            raise ValueError(f"unsupported catalog format version {data.get('version')}")
+        coords = data['coords']
+        return(cls(data['ids'], coords[0::2], coords[1::2], node_size=data['node_size'], _sorted=True))
+
+    def __repr__(self):
+        return(f'CPTCatalog({len(self)} collars)')
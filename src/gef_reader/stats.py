@@ -0,0 +1,124 @@
+"""
+Per-stage parse instrumentation.
+
+Pass a ParseStats object to read_gef_file / read_alt_gef_file (or read_gef_folder) to record
+wall time, bytes, lines, rows and UNDEF values per stage:
+
+    - 'read': reading (or mapping) the file
+    - 'detect_encoding': encoding detection, fallbacks to the next encoding are counted separately
+    - 'header': finding and decoding the header lines and extracting the header values
+    - 'units': detecting the column names and units
+    - 'rows': converting the data rows
+    - 'total': the whole file
+
+Hooks are callables `hook(stage: str, record: dict)` that are called for every recorded stage,
+e.g. to forward the numbers to a metrics system. Hooks can be passed to a ParseStats object
+or registered globally with register_parse_hook, then they are called for every parsed file.
+Without stats and hooks the stages are not timed and nothing is counted.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+
+STAGES = ('read', 'detect_encoding', 'header', 'units', 'rows', 'total')
+
+_global_hooks = []
+
+
+def register_parse_hook(hook):
+    """ Registers a hook `hook(stage: str, record: dict)` that is called for every stage of every parsed file."""
+    _global_hooks.append(hook)
+
+
+def unregister_parse_hook(hook):
+    _global_hooks.remove(hook)
+
+
+def _stats_for_call(stats: 'ParseStats|None') -> 'ParseStats|None':
+    """ Returns the stats object to record into, a temporary one if only global hooks are registered."""
+    if(stats is None and _global_hooks):
+        return(ParseStats())
+    return(stats)
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    bytes: int = 0
+    lines: int = 0
+    rows: int = 0
+    undef: int = 0
+
+
+class ParseStats:
+    """ Aggregated parse statistics, can be merged across files, batches and worker processes."""
+
+    def __init__(self, hooks: list|None = None):
+        self.stages: dict[str, StageStats] = {}
+        self.files = 0
+        self.encoding_fallbacks = 0
+        self.encodings = Counter()
+        self.hooks = list(hooks or [])
+
+    def record(self, stage: str, seconds: float, bytes: int = 0, lines: int = 0, rows: int = 0, undef: int = 0):
+        """ Adds the numbers of one stage of one file and calls the hooks."""
+        stage_stats = self.stages.get(stage)
+        if(stage_stats is None):
+            stage_stats = self.stages[stage] = StageStats()
+        stage_stats.calls += 1
+        stage_stats.seconds += seconds
+        stage_stats.bytes += bytes
+        stage_stats.lines += lines
+        stage_stats.rows += rows
+        stage_stats.undef += undef
+        if(stage == 'total'):
+            self.files += 1
+        if(self.hooks or _global_hooks):
+            record = {'seconds': seconds, 'bytes': bytes, 'lines': lines, 'rows': rows, 'undef': undef}
+            for hook in self.hooks + _global_hooks:
+                hook(stage, record)
+
+    @contextmanager
+    def stage(self, stage: str, **numbers):
+        """ Times the with block and records it on exit, the yielded dict holds the numbers (bytes, lines, rows, undef)
+            and can be filled in the block. Callables are called after the block is timed, e.g. for expensive counts.
+        """
+        start = time.perf_counter()
+        yield numbers
+        seconds = time.perf_counter() - start
+        self.record(stage, seconds, **{key: value() if callable(value) else value for key, value in numbers.items()})
+
+    def record_encoding(self, encoding: str, fallbacks: int):
+        self.encodings[encoding] += 1
+        self.encoding_fallbacks += fallbacks
+
+    def merge(self, other: 'ParseStats'):
+        """ Adds the numbers of another ParseStats object (e.g. of a worker process), hooks are not called."""
+        for stage, other_stats in other.stages.items():
+            stage_stats = self.stages.setdefault(stage, StageStats())
+            for key, value in asdict(other_stats).items():
+                setattr(stage_stats, key, getattr(stage_stats, key) + value)
+        self.files += other.files
+        self.encoding_fallbacks += other.encoding_fallbacks
+        self.encodings.update(other.encodings)
+        return(self)
+
+    def as_dict(self) -> dict:
+        """ Returns all numbers as plain dict, e.g. to export them as JSON."""
+        return({
+            'files': self.files,
+            'encoding_fallbacks': self.encoding_fallbacks,
+            'encodings': dict(self.encodings),
+            'stages': {stage: asdict(stage_stats) for stage, stage_stats in self.stages.items()},
+        })
+
+    def __getstate__(self):
+        # hooks are usually not picklable, they stay in the process that created them
+        state = self.__dict__.copy()
+        state['hooks'] = []
+        return(state)
+
+    def __repr__(self):
+        return(f'ParseStats({self.as_dict()!r})')
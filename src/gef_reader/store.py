@@ -0,0 +1,339 @@
+"""
+Local SQLite store for parsed CPTs.
+
+Schema:
+
+    cpts(id, hole_id, project, source, dialect, depth_column, x, y, n_rows, header)   header as JSON
+    units(cpt_id, name, unit)
+    measurements(cpt_id, depth, <one REAL column per measured quantity>)
+
+The measurements table is wide: one row per depth step, a column that is seen for the first time
+is added with ALTER TABLE. The depth column of each file is stored as depth, its original name in
+cpts.depth_column. UNDEF values (None/NaN) are stored as NULL.
+Rows are inserted with executemany in large transactions, the connection uses WAL and
+pragmas tuned for bulk ingest. Indexes on cpts(hole_id), cpts(project) and measurements(cpt_id, depth)
+serve the queries by hole and depth range.
+"""
+import json
+import sqlite3
+from array import array
+from pathlib import Path
+
+from .binary import _to_columns
+from .gef_reader import read_any_gef_file, _hole_id, NAN
+from .profile import DEPTH_COLUMNS
+from .spatial import collar_from_header
+
+# header keys with the project number, per dialect
+PROJECT_HEADER_KEYS = ('projekt_id', 'Projekt-Nummer', 'PROJECTID', 'project_number')
+# rows per transaction when ingesting many files
+DEFAULT_COMMIT_ROWS = 1_000_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cpts (
+    id INTEGER PRIMARY KEY,
+    hole_id TEXT,
+    project TEXT,
+    source TEXT,
+    dialect TEXT,
+    depth_column TEXT,
+    x REAL,
+    y REAL,
+    n_rows INTEGER NOT NULL,
+    header TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS units (
+    cpt_id INTEGER NOT NULL REFERENCES cpts(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    unit TEXT,
+    PRIMARY KEY (cpt_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS measurements (
+    cpt_id INTEGER NOT NULL REFERENCES cpts(id) ON DELETE CASCADE,
+    depth REAL
+);
+CREATE INDEX IF NOT EXISTS cpts_hole_id ON cpts(hole_id);
+CREATE INDEX IF NOT EXISTS cpts_project ON cpts(project);
+CREATE INDEX IF NOT EXISTS measurements_cpt_depth ON measurements(cpt_id, depth);
+"""
+
+_INGEST_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL', # with WAL a crash can lose the last transactions, but never corrupts the database
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536', # 64 MiB page cache
+    'PRAGMA foreign_keys = ON',
+)
+
+_FIXED_COLUMNS = ('cpt_id', 'depth')
+
+
+def _quote(name: str) -> str:
+    return('"' + name.replace('"', '""') + '"')
+
+
+def _first_header_value(cpt_header: dict, keys: tuple):
+    for key in keys:
+        if(cpt_header.get(key) not in (None, '')):
+            return(str(cpt_header[key]))
+    return(None)
+
+
+def _float_column(values) -> array:
+    return(array('d', [NAN if v is None else v for v in values]))
+
+
+class CPTIngest:
+    """
+    Bulk insert session of a CPTStore, commits every commit_rows measurement rows.
+    If the store is empty, the measurement index is dropped and built once on close instead of updated per row.
+
+    e.g. with store.ingest() as ingest:
+             for cpt_header, header_units, columns in parsed_cpts:
+                 ingest.add(cpt_header, header_units, columns)
+    """
+
+    def __init__(self, store: 'CPTStore', commit_rows: int = DEFAULT_COMMIT_ROWS):
+        self.store = store
+        self.commit_rows = commit_rows
+        self.pending_rows = 0
+        self.deferred_index = store.connection.execute('SELECT NOT EXISTS (SELECT 1 FROM measurements)').fetchone()[0]
+        if(self.deferred_index):
+            store.drop_indexes()
+
+    def add(self, cpt_header: dict, header_units, measurements, source: str|None = None, dialect: str|None = None) -> int:
+        """ Inserts a CPT (rows or columns layout) into the open transaction, returns its id."""
+        cpt_id = self.store.add(cpt_header, header_units, measurements, source=source, dialect=dialect, commit=False)
+        self.pending_rows += len(measurements) if isinstance(measurements, list) else len(next(iter(measurements.values()), ()))
+        if(self.pending_rows >= self.commit_rows):
+            self.store.commit()
+            self.pending_rows = 0
+        return(cpt_id)
+
+    def close(self):
+        """ Commits the pending CPTs and builds the deferred index."""
+        self.store.commit()
+        self.pending_rows = 0
+        if(self.deferred_index):
+            self.store.create_indexes()
+
+    def abort(self):
+        """ Rolls back the CPTs that are not committed yet, the committed batches stay and the deferred index is built."""
+        self.store.rollback()
+        self.pending_rows = 0
+        if(self.deferred_index):
+            self.store.create_indexes()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *exc_info):
+        if(exc_info[0] is not None):
+            self.abort()
+        else:
+            self.close()
+
+
+class CPTStore:
+    """
+    SQLite database of CPT headers, units and measurements.
+
+    e.g. with CPTStore('campaign.sqlite') as store:
+             store.ingest_files(glob('./GEF_SAMPLES/**/*.GEF.txt', recursive=True))
+             columns = store.query('CPT 01', top=2.0, bottom=5.0, columns=['qc', 'fs'])
+    """
+
+    def __init__(self, path: str|Path = ':memory:'):
+        self.path = path
+        self.connection = sqlite3.connect(str(path), isolation_level=None)
+        for pragma in _INGEST_PRAGMAS:
+            self.connection.execute(pragma)
+        self.connection.executescript(_SCHEMA)
+        self._insert_statements = {}
+        self._in_transaction = False
+        self._load_columns()
+
+    def _load_columns(self):
+        # sqlite column names are case insensitive, known columns by their casefolded name
+        self._columns = {row[1].casefold(): row[1] for row in self.connection.execute('PRAGMA table_info(measurements)')}
+
+    # ingest
+
+    def _begin(self):
+        if(not self._in_transaction):
+            self.connection.execute('BEGIN')
+            self._in_transaction = True
+
+    def commit(self):
+        if(self._in_transaction):
+            self.connection.execute('COMMIT')
+            self._in_transaction = False
+
+    def _column_name(self, name: str) -> str:
+        """ Returns the table column of a measured quantity, adds the column if it is new."""
+        known = self._columns.get(name.casefold())
+        if(known is None):
+            self.connection.execute(f'ALTER TABLE measurements ADD COLUMN {_quote(name)} REAL')
+            known = self._columns[name.casefold()] = name
+        return(known)
+
+    def _insert_statement(self, names: tuple[str, ...]) -> str:
+        statement = self._insert_statements.get(names)
+        if(statement is None):
+            statement = self._insert_statements[names] = (
+                f"INSERT INTO measurements (cpt_id, depth{''.join(', ' + _quote(name) for name in names)}) "
+                f"VALUES (?, ?{', ?' * len(names)})")
+        return(statement)
+
+    def add(self, cpt_header: dict, header_units, measurements, source: str|None = None, dialect: str|None = None,
+            commit: bool = True) -> int:
+        """
+        Inserts a CPT as returned by read_gef_file / read_alt_gef_file (rows or columns layout), returns its id.
+        With commit=False the CPT is added to the open transaction, ingest_files uses this to commit in large batches.
+        """
+        columns, units = _to_columns(header_units, measurements)
+        depth_name = next((name for name in DEPTH_COLUMNS if name in columns), None)
+        n_rows = len(next(iter(columns.values()), ()))
+        value_names = [name for name in columns if name != depth_name]
+        reserved = [name for name in value_names if name.casefold() in _FIXED_COLUMNS]
+        if(reserved):
+            raise ValueError(f'column names {reserved} are reserved by the store')
+        if(len(set(name.casefold() for name in value_names)) != len(value_names)):
+            raise ValueError(f'column names differ only in case: {value_names}')
+        hole_id = _hole_id(cpt_header)
+        collar = collar_from_header(cpt_header) or (None, None)
+        self._begin()
+        try:
+            cpt_id = self.connection.execute(
+                'INSERT INTO cpts (hole_id, project, source, dialect, depth_column, x, y, n_rows, header) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (None if hole_id is None else str(hole_id), _first_header_value(cpt_header, PROJECT_HEADER_KEYS),
+                 None if source is None else str(source), dialect, depth_name, *collar, n_rows,
+                 json.dumps(cpt_header, ensure_ascii=False, default=str))).lastrowid
+            table_names = tuple(self._column_name(name) for name in value_names)
+            unit_rows = [(cpt_id, 'depth', units.get(depth_name))] if depth_name is not None else []
+            unit_rows.extend((cpt_id, table_name, units.get(name)) for name, table_name in zip(value_names, table_names))
+            self.connection.executemany('INSERT INTO units (cpt_id, name, unit) VALUES (?, ?, ?)', unit_rows)
+            # NaN is bound as NULL by sqlite
+            depths = columns[depth_name] if depth_name is not None else [None] * n_rows
+            self.connection.executemany(self._insert_statement(table_names),
+                                        zip([cpt_id] * n_rows, depths, *(columns[name] for name in value_names)))
+        except BaseException:
+            self.rollback()
+            raise
+        if(commit):
+            self.commit()
+        return(cpt_id)
+
+    def rollback(self):
+        if(self._in_transaction):
+            self.connection.execute('ROLLBACK')
+            self._in_transaction = False
+            # columns added in the transaction are gone
+            self._load_columns()
+
+    def ingest(self, commit_rows: int = DEFAULT_COMMIT_ROWS) -> 'CPTIngest':
+        """ Returns a bulk insert session for CPTs that are parsed elsewhere (e.g. in worker processes), see CPTIngest."""
+        return(CPTIngest(self, commit_rows))
+
+    def ingest_files(self, file_paths, dialect: str = 'auto', header_mapping_dict={},
+                     commit_rows: int = DEFAULT_COMMIT_ROWS) -> dict[str, str]:
+        """ Parses and inserts files, committing every commit_rows measurement rows.
+            If the store is empty, the measurement index is built once after the ingest instead of updated per row.
+            Returns the error messages of the files that could not be parsed, keyed by path.
+        """
+        errors = {}
+        with self.ingest(commit_rows) as ingest:
+            for file_path in file_paths:
+                try:
+                    file_dialect, cpt_header, header_units, columns = read_any_gef_file(
+                        file_path=file_path, dialect=dialect, layout='columns', header_mapping_dict=header_mapping_dict)
+                except Exception as e:
+                    errors[str(file_path)] = f'{type(e).__name__}: {e}'
+                    continue
+                ingest.add(cpt_header, header_units, columns, source=file_path, dialect=file_dialect)
+        return(errors)
+
+    # queries
+
+    def cpts(self, hole_id: str|None = None, project: str|None = None) -> list[dict]:
+        """ Returns id, hole id, project, source, dialect, coordinates, number of rows and header of the matching CPTs."""
+        conditions, params = [], []
+        if(hole_id is not None):
+            conditions.append('hole_id = ?')
+            params.append(hole_id)
+        if(project is not None):
+            conditions.append('project = ?')
+            params.append(project)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        cursor = self.connection.execute(
+            f'SELECT id, hole_id, project, source, dialect, depth_column, x, y, n_rows, header FROM cpts{where} ORDER BY id', params)
+        result = []
+        for row in cursor:
+            cpt = dict(zip([d[0] for d in cursor.description], row))
+            cpt['header'] = json.loads(cpt['header'])
+            result.append(cpt)
+        return(result)
+
+    def columns(self) -> list[str]:
+        """ Returns the names of the measured quantities, without cpt_id and depth."""
+        return([name for name in self._columns.values() if name not in _FIXED_COLUMNS])
+
+    def units(self, cpt_id: int) -> dict[str, str]:
+        return(dict(self.connection.execute('SELECT name, unit FROM units WHERE cpt_id = ?', (cpt_id,))))
+
+    def query(self, hole_id: str|None = None, top: float|None = None, bottom: float|None = None,
+              columns: list[str]|None = None, cpt_id: int|None = None) -> dict[str, array]:
+        """
+        Returns the measurements with top <= depth < bottom of a hole (or of one CPT by cpt_id), ordered by CPT and depth.
+        The result maps 'cpt_id', 'depth' and the requested columns (default: all) to array('d'), NULL is NaN.
+        """
+        if(hole_id is None and cpt_id is None):
+            raise ValueError('hole_id or cpt_id is required')
+        names = self.columns() if columns is None else [self._columns.get(name.casefold(), name) for name in columns
+                                                         if name.casefold() not in _FIXED_COLUMNS]
+        missing = [name for name in names if name.casefold() not in self._columns]
+        if(missing):
+            raise KeyError(f'unknown columns {missing}, columns: {self.columns()}')
+        if(cpt_id is not None):
+            conditions, params = ['m.cpt_id = ?'], [cpt_id]
+        else:
+            conditions = ['m.cpt_id IN (SELECT id FROM cpts WHERE hole_id = ?)']
+            params = [hole_id]
+        if(top is not None):
+            conditions.append('m.depth >= ?')
+            params.append(top)
+        if(bottom is not None):
+            conditions.append('m.depth < ?')
+            params.append(bottom)
+        selected = ', '.join(f'm.{_quote(name)}' for name in names)
+        rows = self.connection.execute(
+            f"SELECT m.cpt_id, m.depth{', ' + selected if names else ''} FROM measurements m "
+            f"WHERE {' AND '.join(conditions)} ORDER BY m.cpt_id, m.depth", params).fetchall()
+        values = list(zip(*rows)) if rows else [()] * (len(names) + 2)
+        return({name: _float_column(column) for name, column in zip(['cpt_id', 'depth'] + names, values)})
+
+    def create_indexes(self):
+        """ Recreates the indexes (e.g. after drop_indexes for a very large first ingest) and updates the query planner statistics."""
+        self.commit()
+        self.connection.executescript(_SCHEMA)
+        self.connection.execute('ANALYZE')
+
+    def drop_indexes(self):
+        """ Drops the measurement index, bulk loads into an empty store are faster when the index is built afterwards."""
+        self.commit()
+        self.connection.execute('DROP INDEX IF EXISTS measurements_cpt_depth')
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *exc_info):
+        if(exc_info[0] is not None):
+            self.rollback()
+        self.close()
+
+    def __repr__(self):
+        return(f'CPTStore({str(self.path)!r})')
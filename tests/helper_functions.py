@@ -125,3 +125,28 @@ def create_example_file() -> tuple[str, dict, list, dict, list]:
                             {'Tiefe': 0.18, 'qc': 1.69, 'fs': 0.021, 'u2': 0.002, 'I': 1.3, 'Rf': 1.22, 'ic': 1.45, 'Su_min': None, 'Su_max': None, 'soilfr': 6.0, 'soilbq': 7.0, 'soilavg': 6.0, 'IFA': 49.48}]
 
     return(example_file_content, expected_header_output, expected_col_names, expected_header_units, expected_measurements)
+
+def create_alt_example_file() -> tuple[str, list, list]:
+    """ This function creates a small GEF file with #COLUMNINFO header lines (see read_alt_gef_file) together with its expected parsed output.
+        Returns:
+        (example_file_content, expected_header_units, expected_measurements)
+    """
+    example_file_content = """#GEFID= 1, 1, 0
+#COLUMN= 3
+#COLUMNINFO= 1, m, Sondeerlengte, 1
+#COLUMNINFO= 2, MPa, Conusweerstand qc, 2
+#COLUMNINFO= 3, MPa, Wrijvingsweerstand fs, 3
+#TESTID= CPT-A
+#XYID= 31000, 108920.00, 432810.00, 0.01, 0.01
+#EOH=
+0.00 0.5 0.010
+0.02 0.7 UNDEF
+0.04 -99999.000 0.030
+0.06 1.2 0.041
+"""
+    expected_header_units = ['m', 'MPa', 'MPa']
+    expected_measurements = [{'depth': 0.0, 'qc': 0.5, 'fs': 0.01},
+                             {'depth': 0.02, 'qc': 0.7, 'fs': None},
+                             {'depth': 0.04, 'qc': None, 'fs': 0.03},
+                             {'depth': 0.06, 'qc': 1.2, 'fs': 0.041}]
+    return(example_file_content, expected_header_units, expected_measurements)
@@ -0,0 +1,93 @@
+import math
+import pickle
+import random
+import statistics
+import tempfile
+from pathlib import Path
+
+import pytest
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file, DepthBinAggregator, aggregate_files
+from gef_reader.aggregate import QuantileSketch, RunningStats
+
+
+def test_running_stats_and_sketch_merge():
+    random.seed(3)
+    values = [random.gauss(10.0, 2.0) for _ in range(20000)]
+    stats, other_stats = RunningStats(), RunningStats()
+    sketch, other_sketch = QuantileSketch(), QuantileSketch()
+    for i in range(0, 10000, 100):
+        stats.update(values[i:i + 100])
+        sketch.update(values[i:i + 100])
+    other_stats.update(values[10000:])
+    other_sketch.update(values[10000:])
+    stats.merge(pickle.loads(pickle.dumps(other_stats)))
+    sketch.merge(pickle.loads(pickle.dumps(other_sketch)))
+    assert stats.count == sketch.count == 20000
+    assert stats.mean == pytest.approx(statistics.fmean(values))
+    assert stats.variance == pytest.approx(statistics.variance(values))
+    assert len(sketch.means) <= 100
+    ordered = sorted(values)
+    for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+        assert sketch.quantile(q) == pytest.approx(ordered[int(q * len(ordered))], abs=0.05)
+    assert (sketch.quantile(0.0), sketch.quantile(1.0)) == (ordered[0], ordered[-1])
+
+
+def test_depth_bin_aggregator():
+    example_file_content, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    _, _, rows = read_gef_file(file_path)
+    _, _, columns = read_gef_file(file_path, layout='columns')
+
+    aggregator = DepthBinAggregator(0.1, columns=['qc', 'Su_min'])
+    aggregator.add(rows)
+    aggregator.add(columns)
+    summary = aggregator.summary(quantiles=(0.5,))
+    assert list(summary) == ['depth_top', 'depth_bottom', 'qc_count', 'qc_mean', 'qc_std', 'qc_min', 'qc_max', 'qc_p50',
+                             'Su_min_count', 'Su_min_mean', 'Su_min_std', 'Su_min_min', 'Su_min_max', 'Su_min_p50']
+    for i, top in enumerate(summary['depth_top']):
+        expected = [row['qc'] for row in rows if top <= row['Tiefe'] < top + 0.1 - 1e-9] * 2
+        assert summary['qc_count'][i] == len(expected)
+        assert summary['qc_mean'][i] == pytest.approx(statistics.fmean(expected))
+        assert summary['qc_p50'][i] == pytest.approx(statistics.median(expected))
+    # UNDEF values are not counted
+    assert summary['Su_min_count'][0] == 2 and math.isnan(summary['Su_min_mean'][1])
+
+
+def test_aggregate_files():
+    folder = Path(tempfile.mkdtemp())
+    example_file_content, *_ = create_example_file()
+    alt_file_content, *_ = create_alt_example_file()
+    for i in range(3):
+        (folder / f'cpt_{i}.gef.txt').write_text(example_file_content, encoding='windows-1252')
+    (folder / 'cpt_alt.gef').write_text(alt_file_content, encoding='utf-8')
+    (folder / 'broken.gef').write_text('#COLUMNINFO= 1, m\n1 2 3\n', encoding='utf-8')
+    file_paths = sorted(folder.iterdir())
+
+    errors = {}
+    single = aggregate_files(file_paths, step=0.05, workers=1, errors=errors).summary()
+    parallel_aggregator = aggregate_files(file_paths, step=0.05, workers=2)
+    parallel = parallel_aggregator.summary()
+    assert list(errors) == [str(folder / 'broken.gef')]
+    assert parallel_aggregator.n_cpts == 4
+    assert list(single) == list(parallel)
+    for name in single:
+        assert all((math.isnan(a) and math.isnan(b)) or a == pytest.approx(b) for a, b in zip(single[name], parallel[name], strict=True)), name
+    # bin [0.0, 0.05) has the first 5 rows of 3 files and the first 3 rows of the #COLUMNINFO file
+    assert single['qc_count'][0] == 3 * 5 + 2
+    assert 'Tiefe_count' not in single and 'depth_count' not in single
+
+
+def test_add_file_is_merged_only_when_complete():
+    alt_file_content, *_ = create_alt_example_file()
+    file_path = create_dummy_test_file(alt_file_content, "utf-8")
+    # the last row has more values than columns, it fails after the first chunks were read
+    broken_path = create_dummy_test_file(alt_file_content + '0.08 1.3 0.05 7\n', "utf-8")
+    aggregator = DepthBinAggregator(0.05)
+    aggregator.add_file(file_path)
+    expected = aggregator.summary()
+    with pytest.raises(IndexError):
+        aggregator.add_file(broken_path, chunk_size=2)
+    assert aggregator.n_cpts == 1
+    assert repr(aggregator.summary()) == repr(expected)
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file
+from gef_reader.aio import aread_gef_file, aread_gef_many
+
+
+class AsyncUpload:
+    """ Minimal async file-like object, like starlette's UploadFile."""
+    def __init__(self, content: bytes):
+        self.content = content
+        self.position = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        chunk = self.content[self.position:self.position + 7]
+        self.position += len(chunk)
+        return(chunk)
+
+
+def test_aread_gef_file():
+    example_file_content, *_ = create_example_file()
+    content = example_file_content.encode('windows-1252')
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    expected = read_gef_file(file_path)
+    assert asyncio.run(aread_gef_file(AsyncUpload(content))) == expected
+    assert asyncio.run(aread_gef_file(file_path=file_path)) == expected
+
+
+def test_aread_gef_many():
+    example_file_content, *_ = create_example_file()
+    alt_file_content, _, expected_alt_measurements = create_alt_example_file()
+    sources = [example_file_content.encode('windows-1252'), AsyncUpload(alt_file_content.encode('utf-8')), b'Datum: 01.01.2022\n']
+    results = asyncio.run(aread_gef_many(sources, concurrency=2, dialect='auto', return_exceptions=True))
+    assert results[0] == read_gef_file(file_bytes=sources[0])
+    assert results[1][2] == expected_alt_measurements
+    assert isinstance(results[2], Exception)
+    with pytest.raises(ValueError):
+        asyncio.run(aread_gef_file(b'', dialect='xml'))
+
+
+def test_aread_gef_file_reads_uploads_inside_the_limiter():
+    example_file_content, *_ = create_example_file()
+    content = example_file_content.encode('windows-1252')
+
+    class TrackedUpload(AsyncUpload):
+        reading = max_reading = 0
+
+        async def read(self, size: int = -1) -> bytes:
+            if(self.position == 0):
+                TrackedUpload.reading += 1
+                TrackedUpload.max_reading = max(TrackedUpload.max_reading, TrackedUpload.reading)
+            chunk = await super().read(size)
+            await asyncio.sleep(0)
+            if(not chunk):
+                TrackedUpload.reading -= 1
+            return(chunk)
+
+    results = asyncio.run(aread_gef_many([TrackedUpload(content) for _ in range(6)], concurrency=2))
+    assert len(results) == 6 and TrackedUpload.max_reading <= 2
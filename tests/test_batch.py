@@ -0,0 +1,105 @@
+import math
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path
+
+import pytest
+from .helper_functions import create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_folder, read_gef_archive, ParseStats
+
+
+def create_example_folder() -> Path:
+    """ Creates a folder with a .gef.txt file, a #COLUMNINFO file and a broken file."""
+    folder = Path(tempfile.mkdtemp())
+    example_file_content, *_ = create_example_file()
+    (folder / 'cpt_01.gef.txt').write_text(example_file_content, encoding='windows-1252')
+    alt_file_content, *_ = create_alt_example_file()
+    (folder / 'sub').mkdir()
+    (folder / 'sub' / 'cpt_02.gef.txt').write_text(alt_file_content, encoding='utf-8')
+    (folder / 'cpt_03.gef.txt').write_text('#COLUMNINFO= 1, m\n1 2 3\n', encoding='utf-8')
+    return(folder)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_read_gef_folder_rows(workers):
+    folder = create_example_folder()
+    result = read_gef_folder(str(folder / '**' / '*.gef.txt'), workers=workers)
+    assert [Path(p).name for p in result.file_paths] == ['cpt_01.gef.txt', 'cpt_02.gef.txt']
+    assert list(result.errors) == [str(folder / 'cpt_03.gef.txt')]
+    assert len(result.measurements) == 19 + 4
+    assert result.measurements[0]['hole_id'] == 'CPT 01'
+    assert result.measurements[-1]['hole_id'] == 'CPT-A'
+
+
+def test_read_gef_folder_columns():
+    folder = create_example_folder()
+    result = read_gef_folder(str(folder / '**' / '*.gef.txt'), workers=1, layout='columns')
+    columns = result.measurements
+    assert all(len(values) == 23 for values in columns.values())
+    assert columns['hole_id'][0] == 'CPT 01' and columns['hole_id'][-1] == 'CPT-A'
+    assert math.isnan(columns['Tiefe'][-1]) and columns['depth'][-1] == 0.06
+    assert math.isnan(columns['depth'][0]) and columns['qc'][-1] == 1.2
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_read_gef_folder_stats(workers):
+    folder = create_example_folder()
+    stats = ParseStats()
+    read_gef_folder(str(folder / '**' / '*.gef.txt'), workers=workers, stats=stats)
+    assert stats.files == 2
+    assert stats.stages['rows'].rows == 19 + 4
+    # the broken file fails after the encoding was detected
+    assert stats.encodings == {'windows-1252': 3}
+
+
+def create_example_archive(kind: str) -> Path:
+    """ Packs the example folder (and a file that is not a CPT) into a zip or a tar.gz archive."""
+    folder = create_example_folder()
+    (folder / 'readme.md').write_text('not a CPT', encoding='utf-8')
+    names = ['cpt_01.gef.txt', 'sub/cpt_02.gef.txt', 'cpt_03.gef.txt', 'readme.md']
+    if(kind == 'zip'):
+        archive_path = folder / 'campaign.zip'
+        with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('sub/', '')
+            for name in names:
+                zip_file.write(folder / name, name)
+    else:
+        archive_path = folder / 'campaign.tar.gz'
+        with tarfile.open(archive_path, 'w:gz') as tar_file:
+            for name in names:
+                tar_file.add(folder / name, name)
+    return(archive_path)
+
+
+@pytest.mark.parametrize("kind", ['zip', 'tar'])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_read_gef_archive(kind, workers):
+    archive_path = create_example_archive(kind)
+    stats = ParseStats()
+    parsed = list(read_gef_archive(archive_path, workers=workers, layout='columns', stats=stats))
+    assert [p[0] for p in parsed] == ['cpt_01.gef.txt', 'sub/cpt_02.gef.txt', 'cpt_03.gef.txt']
+    assert [p[1] for p in parsed] == ['gef_txt', 'columninfo', None]
+    assert [p[5] for p in parsed] == ['CPT 01', 'CPT-A', None]
+    assert parsed[2][6] is not None and parsed[0][6] is None
+    assert len(parsed[0][4]['qc']) == 19 and list(parsed[1][4]['depth']) == [0.0, 0.02, 0.04, 0.06]
+    assert stats.files == 2
+
+    names = [p[0] for p in read_gef_archive(archive_path, workers=workers, pattern='*.MD')]
+    assert names == ['readme.md']
+
+
+def test_read_gef_archive_checks_arguments_eagerly():
+    folder = create_example_folder()
+    with pytest.raises(ValueError):
+        read_gef_archive(folder / 'cpt_01.gef.txt')
+    with pytest.raises(FileNotFoundError):
+        read_gef_archive(folder / 'missing.zip')
+    with pytest.raises(ValueError):
+        read_gef_archive(create_example_archive('zip'), layout='table')
+
+
+def test_read_gef_archive_hole_id_column():
+    parsed = list(read_gef_archive(create_example_archive('zip'), workers=1))
+    assert parsed[0][4][0]['hole_id'] == 'CPT 01' and parsed[1][4][-1]['hole_id'] == 'CPT-A'
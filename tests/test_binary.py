@@ -0,0 +1,89 @@
+import math
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file, read_alt_gef_file, write_cpt_binary, read_cpt_binary, write_cpt_bundle, read_cpt_bundle, CPTBinaryWriter
+
+
+def assert_columns_equal(columns, expected_columns):
+    assert list(columns) == list(expected_columns)
+    for name, values in expected_columns.items():
+        assert all((math.isnan(a) and math.isnan(b)) or a == b for a, b in zip(columns[name], values, strict=True)), name
+
+
+def test_write_and_read_cpt_binary():
+    example_file_content, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    cpt_header, header_units, columns = read_gef_file(file_path, layout='columns')
+    out_path = Path(tempfile.mkdtemp()) / 'cpt.cptb'
+    write_cpt_binary(out_path, cpt_header, header_units, columns)
+
+    header, units, loaded, validity = read_cpt_binary(out_path, with_validity=True)
+    assert header == cpt_header
+    assert units == header_units
+    assert_columns_equal(loaded, columns)
+    assert validity['qc'] == b'\xff\xff\xff'
+    assert validity['IFA'] == bytes([0, 0, 0b111])
+
+    _, _, mapped = read_cpt_binary(out_path, mmap=True)
+    assert mapped['qc'].format == 'd'
+    assert_columns_equal(mapped, columns)
+
+
+def test_cpt_binary_validity_of_rows_layout():
+    # in the rows layout only UNDEF cells are nulls, a literal nan is a value
+    rows = [{'qc': 1.0, 'fs': None}, {'qc': float('nan'), 'fs': 2.0}]
+    out_path = Path(tempfile.mkdtemp()) / 'cpt.cptb'
+    write_cpt_binary(out_path, {}, {}, rows)
+    _, _, columns, validity = read_cpt_binary(out_path, with_validity=True)
+    assert math.isnan(columns['qc'][1]) and math.isnan(columns['fs'][0])
+    assert validity == {'qc': b'\x03', 'fs': b'\x02'}
+
+
+def test_cpt_bundle():
+    example_file_content, *_ = create_example_file()
+    alt_file_content, *_ = create_alt_example_file()
+    cpts = [read_gef_file(create_dummy_test_file(example_file_content, "windows-1252")),
+            read_alt_gef_file(create_dummy_test_file(alt_file_content, "utf-8"), layout='columns')]
+    out_path = Path(tempfile.mkdtemp()) / 'campaign.cptb'
+    write_cpt_bundle(out_path, cpts)
+
+    with read_cpt_bundle(out_path, mmap=False) as bundle:
+        assert len(bundle) == 2
+        assert bundle.headers[1]['TESTID'] == 'CPT-A'
+        header, units, columns = bundle[0]
+        assert [None if math.isnan(v) else v for v in columns['Su_min']] == [row['Su_min'] for row in cpts[0][2]]
+        header, units, columns = bundle[1]
+        assert units == {'depth': 'm', 'qc': 'MPa', 'fs': 'MPa'}
+        assert_columns_equal(columns, cpts[1][2])
+
+
+def test_read_cpt_binary_mmap_releases_the_file():
+    example_file_content, *_ = create_example_file()
+    out_path = Path(tempfile.mkdtemp()) / 'cpt.cptb'
+    write_cpt_binary(out_path, *read_gef_file(create_dummy_test_file(example_file_content, "windows-1252"), layout='columns'))
+    maps = Path('/proc/self/maps')
+    _, _, mapped = read_cpt_binary(out_path, mmap=True)
+    if(maps.exists()):
+        assert str(out_path) in maps.read_text()
+    assert mapped['qc'][0] > 0
+    for values in mapped.values():
+        values.release()
+    del mapped
+    if(maps.exists()):
+        assert str(out_path) not in maps.read_text()
+
+
+def test_cpt_binary_writer_removes_unfinished_file():
+    example_file_content, *_ = create_example_file()
+    cpt = read_gef_file(create_dummy_test_file(example_file_content, "windows-1252"), layout='columns')
+    out_path = Path(tempfile.mkdtemp()) / 'campaign.cptb'
+    with pytest.raises(RuntimeError):
+        with CPTBinaryWriter(out_path) as writer:
+            writer.add(*cpt)
+            raise RuntimeError('conversion failed')
+    assert not out_path.exists()
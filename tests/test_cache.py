@@ -0,0 +1,89 @@
+import math
+import tempfile
+
+import pytest
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file, read_alt_gef_file, read_any_gef_file, ParseCache
+from gef_reader.binary import MAGIC
+
+
+def test_parse_cache_hit_and_miss():
+    example_file_content, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    cache = ParseCache(tempfile.mkdtemp())
+    first = cache.read_gef_file(file_path)
+    second = cache.read_gef_file(file_path)
+    assert first == second == read_gef_file(file_path)
+    # different reader options are separate entries
+    cache.read_gef_file(file_path, layout='columns')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+
+    # a new cache on the same folder reuses the entries
+    cache = ParseCache(cache.cache_dir)
+    assert cache.read_gef_file(file_path) == first
+    assert cache.stats()['hits'] == 1
+
+
+def test_parse_cache_eviction():
+    example_file_content, *_ = create_example_file()
+    file_paths = [create_dummy_test_file(example_file_content.replace('CPT 01', f'CPT {i:02d}'), "windows-1252") for i in range(3)]
+    cache = ParseCache(tempfile.mkdtemp())
+    cache.read_gef_file(file_paths[0])
+    entry_size = cache.stats()['bytes']
+    cache.max_bytes = int(entry_size * 2.5)
+    cache.read_gef_file(file_paths[1])
+    cache.read_gef_file(file_paths[0])
+    cache.read_gef_file(file_paths[2])
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['entries'] == 2
+    assert stats['bytes'] <= cache.max_bytes
+
+
+def test_parse_cache_entries_are_binary_and_exact():
+    alt_file_content, *_ = create_alt_example_file()
+    # a text cell and a short row
+    alt_file_content = alt_file_content.replace('0.06 1.2 0.041', '0.06 1.2 weich\n0.08 1.3')
+    file_path = create_dummy_test_file(alt_file_content, "utf-8")
+    cache = ParseCache(tempfile.mkdtemp())
+    expected = read_alt_gef_file(file_path)
+    assert expected[2][3]['fs'] == 'weich' and 'fs' not in expected[2][4]
+    cache.read_alt_gef_file(file_path)
+    assert cache.read_alt_gef_file(file_path) == expected
+    assert cache.read_any_gef_file(file_path) == cache.read_any_gef_file(file_path) == read_any_gef_file(file_path)
+    for entry in cache.cache_dir.iterdir():
+        assert entry.read_bytes().startswith(MAGIC)
+
+    _, _, columns = cache.read_alt_gef_file(file_path, layout='columns')
+    _, _, cached_columns = cache.read_alt_gef_file(file_path, layout='columns')
+    assert math.isnan(cached_columns['fs'][3]) and cached_columns['qc'].tobytes() == columns['qc'].tobytes()
+
+    # mmap does not change the result, it shares the entry
+    misses = cache.stats()['misses']
+    assert cache.read_alt_gef_file(file_path, mmap=True) == expected
+    assert cache.stats()['misses'] == misses
+
+
+def test_parse_cache_numpy_entries():
+    np = pytest.importorskip("numpy")
+    example_file_content, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    cache = ParseCache(tempfile.mkdtemp())
+    _, _, columns = cache.read_gef_file(file_path, layout='columns', engine='numpy')
+    _, _, cached_columns = cache.read_gef_file(file_path, layout='columns', engine='numpy')
+    assert cache.stats()['hits'] == 1
+    assert isinstance(cached_columns['qc'], np.ndarray)
+    assert np.array_equal(cached_columns['qc'], columns['qc'], equal_nan=True)
+
+def test_parse_cache_keeps_literal_nan_cells():
+    alt_file_content, *_ = create_alt_example_file()
+    # a literal nan next to an UNDEF cell
+    alt_file_content = alt_file_content.replace('0.06 1.2 0.041', '0.06 nan -99999.000')
+    file_path = create_dummy_test_file(alt_file_content, "utf-8")
+    cache = ParseCache(tempfile.mkdtemp())
+    expected = read_alt_gef_file(file_path)
+    assert math.isnan(expected[2][3]['qc']) and expected[2][3]['fs'] is None
+    assert repr(cache.read_alt_gef_file(file_path)) == repr(expected)
+    assert repr(cache.read_alt_gef_file(file_path)) == repr(expected)
+    assert cache.stats()['hits'] == 1
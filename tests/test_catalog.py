@@ -0,0 +1,49 @@
+import os
+import tempfile
+from pathlib import Path
+
+from .helper_functions import create_example_file, create_alt_example_file
+
+from gef_reader import DirectoryCatalog
+
+
+def create_example_tree() -> Path:
+    folder = Path(tempfile.mkdtemp())
+    example_file_content, *_ = create_example_file()
+    (folder / 'cpt_01.gef.txt').write_text(example_file_content, encoding='windows-1252')
+    alt_file_content, *_ = create_alt_example_file()
+    (folder / 'sub').mkdir()
+    (folder / 'sub' / 'cpt_02.gef.txt').write_text(alt_file_content, encoding='utf-8')
+    return(folder)
+
+
+def test_directory_catalog_refresh():
+    folder = create_example_tree()
+    catalog = DirectoryCatalog(folder)
+    result = catalog.refresh()
+    assert sorted(result.added) == ['cpt_01.gef.txt', 'sub/cpt_02.gef.txt']
+    assert catalog.entries['sub/cpt_02.gef.txt'].header['TESTID'] == 'CPT-A'
+    assert catalog.entries['cpt_01.gef.txt'].n_rows == 19
+    assert (folder / '.gef_catalog.json').exists()
+
+    # a new catalog object loads the manifest, nothing is parsed again
+    catalog = DirectoryCatalog(folder)
+    assert catalog.refresh().unchanged == 2
+
+    # touched, modified, added and removed files
+    os.utime(folder / 'cpt_01.gef.txt', ns=(0, 0))
+    alt_file_content, *_ = create_alt_example_file()
+    (folder / 'sub' / 'cpt_02.gef.txt').write_text(alt_file_content.replace('CPT-A', 'CPT-B'), encoding='utf-8')
+    (folder / 'cpt_03.gef.txt').write_text(alt_file_content, encoding='utf-8')
+    (folder / 'cpt_04.gef.txt').write_text('#COLUMNINFO= 1, m\n1 2 3\n', encoding='utf-8')
+    result = catalog.refresh()
+    assert result.unchanged == 1
+    assert result.modified == ['sub/cpt_02.gef.txt']
+    assert sorted(result.added) == ['cpt_03.gef.txt', 'cpt_04.gef.txt']
+    assert list(catalog.errors()) == ['cpt_04.gef.txt']
+    assert catalog.entries['sub/cpt_02.gef.txt'].header['TESTID'] == 'CPT-B'
+
+    (folder / 'cpt_03.gef.txt').unlink()
+    result = catalog.refresh()
+    assert result.removed == ['cpt_03.gef.txt'] and len(catalog) == 3
+    assert len(catalog.to_spatial_catalog()) == 2
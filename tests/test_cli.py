@@ -0,0 +1,85 @@
+import csv
+import json
+import tempfile
+from pathlib import Path
+
+import pytest
+from .helper_functions import create_example_file, create_alt_example_file
+
+from gef_reader import read_cpt_bundle, CPTStore, CPTIngest, CPTBinaryWriter
+from gef_reader.cli import main
+
+
+def create_example_folder() -> Path:
+    folder = Path(tempfile.mkdtemp())
+    example_file_content, *_ = create_example_file()
+    (folder / 'cpt_01.GEF.txt').write_text(example_file_content, encoding='windows-1252')
+    alt_file_content, *_ = create_alt_example_file()
+    (folder / 'sub').mkdir()
+    (folder / 'sub' / 'cpt_02.gef.txt').write_text(alt_file_content, encoding='utf-8')
+    (folder / 'cpt_03.gef.txt').write_text('#COLUMNINFO= 1, m\n1 2 3\n', encoding='utf-8')
+    return(folder)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_cli_parse(jobs, capsys):
+    folder = create_example_folder()
+    assert main(['parse', str(folder), '--jobs', str(jobs), '--stats']) == 1
+    out, err = capsys.readouterr()
+    assert out.splitlines()[-1].startswith('3 files (1 failed), 23 rows in ')
+    assert json.loads(out[:out.rindex('}') + 1])['files'] == 2
+    assert f"FAILED {folder / 'cpt_03.gef.txt'}" in err
+    assert '3/3 files, 23 rows, 1 failed' in err
+
+    assert main(['validate', str(folder / 'sub'), '-q']) == 0
+    assert main(['parse', str(folder / 'missing')]) == 2
+
+
+def test_cli_convert(capsys):
+    folder = create_example_folder()
+    (folder / 'cpt_03.gef.txt').unlink()
+    out = folder / 'out'
+    assert main(['convert', str(folder), '--to', 'csv', '--out', str(out), '-q']) == 0
+    with open(out / 'collar.csv', newline='', encoding='utf-8') as f:
+        collars = list(csv.DictReader(f))
+    assert [(c['hole_id'], c['x'], c['y']) for c in collars] == [('CPT 01', '0.0', '0.0'), ('CPT-A', '108920.0', '432810.0')]
+    with open(out / 'intervals.csv', newline='', encoding='utf-8') as f:
+        intervals = list(csv.reader(f))
+    assert intervals[0][:5] == ['hole_id', 'from', 'to', 'qc', 'fs']
+    assert len(intervals) == 1 + 19 + 4
+    assert intervals[1][:4] == ['CPT 01', '0.0', '0.01', '0.01']
+    assert intervals[-1][:5] == ['CPT-A', '0.06', '0.08', '1.2', '0.041'] and intervals[-1][5] == ''
+
+    assert main(['convert', str(folder), '--to', 'cptb', '--out', str(folder / 'campaign.cptb'), '-q', '--jobs', '1']) == 0
+    with read_cpt_bundle(folder / 'campaign.cptb', mmap=False) as bundle:
+        assert len(bundle) == 2
+    assert main(['convert', str(folder), '--to', 'sqlite', '--out', str(folder / 'campaign.sqlite'), '-q']) == 0
+    with CPTStore(folder / 'campaign.sqlite') as store:
+        assert [c['hole_id'] for c in store.cpts()] == ['CPT 01', 'CPT-A']
+
+
+def test_cli_convert_interrupted(monkeypatch):
+    folder = create_example_folder()
+    (folder / 'cpt_03.gef.txt').unlink()
+    add = CPTIngest.add
+    calls = []
+    def interrupt_second_add(self, *args, **kwargs):
+        calls.append(args)
+        if(len(calls) == 2):
+            raise KeyboardInterrupt
+        return(add(self, *args, **kwargs))
+
+    monkeypatch.setattr(CPTIngest, 'add', interrupt_second_add)
+    with pytest.raises(KeyboardInterrupt):
+        main(['convert', str(folder), '--to', 'sqlite', '--out', str(folder / 'campaign.sqlite'), '-q', '--jobs', '1'])
+    # the uncommitted CPT is rolled back, the deferred index is built
+    with CPTStore(folder / 'campaign.sqlite') as store:
+        assert store.cpts() == []
+        assert store.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'measurements_cpt_depth'").fetchone()
+
+    def interrupt(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(CPTBinaryWriter, 'add', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        main(['convert', str(folder), '--to', 'cptb', '--out', str(folder / 'campaign.cptb'), '-q', '--jobs', '1'])
+    assert not (folder / 'campaign.cptb').exists()
@@ -0,0 +1,70 @@
+import math
+
+import pytest
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file, read_alt_gef_file, derive_parameters, derive_batch, SiteParameters, CPT
+
+
+def assert_columns_close(columns, expected_columns, names):
+    for name in names:
+        assert all((math.isnan(a) and math.isnan(b)) or a == pytest.approx(b, rel=1e-9)
+                   for a, b in zip(columns[name], expected_columns[name], strict=True)), name
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_derive_parameters(engine):
+    if(engine == 'numpy'):
+        pytest.importorskip("numpy")
+    alt_file_content, *_ = create_alt_example_file()
+    file_path = create_dummy_test_file(alt_file_content, "utf-8")
+    parameters = SiteParameters(groundwater_depth=0.03)
+    cpt_header, units, columns = derive_parameters(*read_alt_gef_file(file_path, layout='columns'), parameters=parameters, engine=engine)
+    assert units['qt'] == 'MPa' and units['sigma_v'] == 'kPa' and units['Rf'] == '%'
+    # without u2 qt is qc
+    assert list(columns['qt'])[:2] == [0.5, 0.7] and math.isnan(columns['qt'][2])
+    # 0.02 m at 18 kN/m³, then 0.02 m at 20 kN/m³ below the groundwater level
+    assert columns['sigma_v'][1] == pytest.approx(0.36) and columns['sigma_v'][2] == pytest.approx(0.76)
+    assert columns['u0'][2] == pytest.approx(0.01 * 9.81)
+    assert columns['Rf'][3] == pytest.approx(0.041 / 1.2 * 100)
+    # fs is UNDEF in row 1, depth 0 has no effective stress
+    assert math.isnan(columns['ic'][0]) and math.isnan(columns['ic'][1])
+    ic = columns['ic'][3]
+    assert 1.0 < ic < 4.0 and columns['sbt_zone'][3] in (2.0, 3.0, 4.0, 5.0, 6.0, 7.0)
+
+
+def test_derive_batch_engines():
+    np = pytest.importorskip("numpy")
+    example_file_content, *_ = create_example_file()
+    alt_file_content, *_ = create_alt_example_file()
+    cpt_header, header_units, columns = read_gef_file(create_dummy_test_file(example_file_content, "windows-1252"), layout='columns')
+    measured = {name: columns[name] for name in ('Tiefe', 'qc', 'fs', 'u2')}
+    cpts = [(cpt_header, header_units, measured), read_alt_gef_file(create_dummy_test_file(alt_file_content, "utf-8")),
+            (cpt_header, header_units, measured)]
+    python_result = derive_batch(cpts, engine='python')
+    numpy_result = derive_batch(cpts, engine='numpy')
+    for (_, _, python_columns), (_, _, numpy_columns) in zip(python_result, numpy_result, strict=True):
+        assert isinstance(numpy_columns['ic'], np.ndarray)
+        assert_columns_close(numpy_columns, python_columns, ['qt', 'Rf', 'sigma_v', 'sigma_v_eff', 'Qtn', 'ic', 'sbt_zone', 'Su_min', 'Su_max'])
+    # gw_stand of the header is 0.0, the vendor columns are kept unless overwrite=True
+    assert python_result[0][2]['u0'][5] == pytest.approx(0.05 * 9.81)
+    _, _, kept = derive_batch([(cpt_header, header_units, columns)], engine='python')[0]
+    assert kept['ic'] is columns['ic']
+    cpt = CPT.from_gef(*python_result[0])
+    assert cpt.row(10).qt == pytest.approx(python_result[0][2]['qt'][10])
+
+
+def test_derive_parameters_pressure_units():
+    alt_file_content, *_ = create_alt_example_file()
+    cpt_header, header_units, columns = read_alt_gef_file(create_dummy_test_file(alt_file_content, "utf-8"), layout='columns')
+    _, _, expected = derive_parameters(cpt_header, header_units, columns, engine='python')
+    # a missing unit (or the placeholder [-] of .gef.txt files) is taken as MPa
+    for units in (['m', '', ''], ['m', '[-]', '[-]']):
+        _, _, derived = derive_parameters(cpt_header, units, columns, engine='python')
+        assert_columns_close(derived, expected, ['qt', 'sigma_v', 'ic'])
+    kpa_columns = {**columns, 'qc': [v * 1000 for v in columns['qc']], 'fs': [v * 1000 for v in columns['fs']]}
+    _, _, derived = derive_parameters(cpt_header, ['m', 'kPa', 'kPa'], kpa_columns, engine='python')
+    assert_columns_close(derived, expected, ['ic'])
+    # an unknown unit is not guessed
+    with pytest.raises(ValueError, match='unknown pressure unit'):
+        derive_parameters(cpt_header, ['m', 'ksi', 'MPa'], columns, engine='python')
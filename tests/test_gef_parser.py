@@ -1,5 +1,6 @@
+import math
 import pytest
-from .helper_functions import create_dummy_test_file, create_example_file
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
 
 from gef_reader.gef_reader import (
     read_byte_file,
@@ -7,8 +8,11 @@ from gef_reader.gef_reader import (
     read_txt_file,
     extract_header_part,
     map_to_default_header_names,
-    read_measurement_headers
+    read_measurement_headers,
+    read_measurement_columns,
+    detect_encoding,
 )
+from gef_reader import read_gef_file, read_alt_gef_file, read_gef_header, iter_gef_measurements, ParseStats, register_parse_hook, unregister_parse_hook
 
 
 ### TEST FUNCTIONS
@@ -49,6 +53,17 @@ def test_read_txt_file():
     # assert lines == []
     # assert encoding is None
 
+@pytest.mark.parametrize("encoding, expected_encoding", [
+    ("windows-1252", "windows-1252"),
+    ("utf-8", "windows-1252"), # utf-8 umlauts are valid windows-1252 bytes as well
+    ("ascii", "windows-1252"),
+])
+def test_detect_encoding(encoding, expected_encoding):
+    example_file_content, *_ = create_example_file()
+    data = example_file_content.encode(encoding, errors='ignore')
+    assert detect_encoding(data) == expected_encoding
+    assert detect_encoding(data, encodings=['utf-8', 'windows-1252'], prefix_size=64) == ('windows-1252' if encoding == 'windows-1252' else 'utf-8')
+
 def test_extract_header_part():
     example_file_content, expected_header, expected_col_names, expected_header_units, expected_measurements = create_example_file()
     lines = example_file_content.split('\n')
@@ -82,3 +97,172 @@ def test_read_measurement_headers():
     assert column_names == expected_col_names, "Error in the column names"
     assert header_units == expected_header_units, "Error in the header units"
     assert measurements == expected_measurements, "Error in the measurements"
+
+def test_read_measurement_columns():
+    example_file_content, expected_header, expected_col_names, expected_header_units, expected_measurements = create_example_file()
+    lines = example_file_content.split('\n')
+    column_names, header_units, columns = read_measurement_columns(lines, skip_lines=len(expected_header))
+    assert column_names == expected_col_names, "Error in the column names"
+    assert header_units == expected_header_units, "Error in the header units"
+    assert list(columns.keys()) == expected_col_names
+    for col in expected_col_names:
+        assert columns[col].typecode == 'd'
+        expected = [math.nan if row[col] is None else row[col] for row in expected_measurements]
+        assert len(columns[col]) == len(expected)
+        assert all((math.isnan(a) and math.isnan(b)) or a == b for a, b in zip(columns[col], expected)), f"Error in column {col}"
+
+def test_read_gef_file_layouts():
+    example_file_content, expected_header, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    _, units_rows, rows = read_gef_file(file_path)
+    _, units_cols, columns = read_gef_file(file_path, layout='columns')
+    assert units_rows == units_cols
+    assert len(rows) == len(columns['qc'])
+    assert list(columns['qc']) == [row['qc'] for row in rows]
+    with pytest.raises(ValueError):
+        read_gef_file(file_path, layout='pandas')
+
+def test_read_gef_file_numpy_engine():
+    np = pytest.importorskip("numpy")
+    example_file_content, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    _, units, rows = read_gef_file(file_path)
+    _, units_np, rows_np = read_gef_file(file_path, engine='numpy')
+    assert units_np == units
+    assert rows_np == rows
+    _, _, columns = read_gef_file(file_path, layout='columns', engine='numpy')
+    assert columns['qc'].dtype == np.float64
+    assert columns['qc'].flags['C_CONTIGUOUS']
+    assert np.isnan(columns['IFA'][0]) and columns['IFA'][-1] == 49.48
+
+def test_iter_gef_measurements():
+    example_file_content, expected_header, expected_col_names, expected_header_units, expected_measurements = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    cpt_header, header_units, rows = iter_gef_measurements(file_path)
+    assert cpt_header == read_gef_file(file_path)[0]
+    assert header_units == expected_header_units
+    assert list(rows) == expected_measurements
+
+    _, _, chunks = iter_gef_measurements(file_path, chunk_size=5, layout='columns')
+    chunks = list(chunks)
+    assert [len(c['qc']) for c in chunks] == [5, 5, 5, 4]
+    assert list(chunks[-1]['qc']) == [row['qc'] for row in expected_measurements[-4:]]
+
+def test_iter_gef_measurements_columninfo():
+    example_file_content, expected_header_units, expected_measurements = create_alt_example_file()
+    file_path = create_dummy_test_file(example_file_content, "utf-8")
+    cpt_header, header_units, chunks = iter_gef_measurements(file_path, chunk_size=3)
+    assert cpt_header['TESTID'] == 'CPT-A'
+    assert header_units == expected_header_units
+    assert list(chunks) == [expected_measurements[:3], expected_measurements[3:]]
+    assert read_alt_gef_file(file_path)[2] == expected_measurements
+
+def test_blank_data_lines_are_skipped():
+    alt_file_content, _, expected_measurements = create_alt_example_file()
+    file_path = create_dummy_test_file(alt_file_content + '\n  \n\n', "utf-8")
+    assert read_alt_gef_file(file_path)[2] == expected_measurements
+    # no data line in the sample of the row plan
+    file_path = create_dummy_test_file(alt_file_content[:alt_file_content.index('#EOH=') + 6] + '\n  \n\n', "utf-8")
+    assert read_alt_gef_file(file_path)[2] == []
+    assert [len(values) for values in read_alt_gef_file(file_path, layout='columns')[2].values()] == [0, 0, 0]
+    assert list(iter_gef_measurements(file_path)[2]) == []
+
+def test_read_gef_file_from_bytes():
+    example_file_content, expected_header, expected_col_names, expected_header_units, expected_measurements = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    from_path = read_gef_file(file_path)
+    from_bytes = read_gef_file(file_bytes=example_file_content.replace('\n', '\r\n').encode('windows-1252'))
+    assert from_path == from_bytes
+    assert from_path[0]['ansatz_hoehe'] == -100.0
+    assert from_path[2] == expected_measurements
+
+    alt_file_content, expected_header_units, expected_measurements = create_alt_example_file()
+    _, header_units, measurements = read_alt_gef_file(file_bytes=(alt_file_content + '\n\n').encode('utf-8'))
+    assert header_units == expected_header_units
+    assert measurements == expected_measurements
+
+def test_read_gef_file_mmap():
+    example_file_content, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    assert read_gef_file(file_path, mmap=True) == read_gef_file(file_path)
+    assert read_gef_file(file_path, mmap=True, layout='columns')[2]['qc'] == read_gef_file(file_path, layout='columns')[2]['qc']
+
+    alt_file_content, expected_header_units, expected_measurements = create_alt_example_file()
+    file_path = create_dummy_test_file(alt_file_content, "utf-8")
+    assert read_alt_gef_file(file_path, mmap=True)[2] == expected_measurements
+
+def test_read_gef_file_stats():
+    example_file_content, expected_header, expected_col_names, expected_header_units, expected_measurements = create_example_file()
+    # 'Á' is encoded as C3 81 in utf-8, 0x81 is not defined in windows-1252
+    file_path = create_dummy_test_file(example_file_content.replace('Projektname: Testsite', 'Projektname: Ávila'), "utf-8")
+    records = []
+    stats = ParseStats(hooks=[lambda stage, record: records.append(stage)])
+    assert read_gef_file(file_path, stats=stats) == read_gef_file(file_path)
+    assert read_gef_file(file_path)[0]['projekt_name'] == 'Ávila'
+    read_gef_file(file_path, layout='columns', mmap=True, stats=stats)
+    assert records == ['read', 'detect_encoding', 'header', 'units', 'rows', 'total'] * 2
+    assert stats.files == 2
+    assert stats.stages['rows'].rows == 2 * len(expected_measurements)
+    expected_undef = sum(v is None for row in expected_measurements for v in row.values())
+    assert stats.stages['rows'].undef == 2 * expected_undef
+    # the file is utf-8, so one fallback from windows-1252 per file
+    assert stats.encodings == {'utf-8': 2} and stats.encoding_fallbacks == 2
+    assert stats.as_dict()['stages']['total']['bytes'] == 2 * file_path.stat().st_size
+
+    # numbers given as callables are counted after the stage is timed
+    stage_stats = ParseStats()
+    with stage_stats.stage('rows', rows=3) as numbers:
+        numbers['undef'] = lambda: 1
+    assert (stage_stats.stages['rows'].calls, stage_stats.stages['rows'].rows, stage_stats.stages['rows'].undef) == (1, 3, 1)
+
+    # global hooks are called without a stats object
+    hook = lambda stage, record: records.append(stage)
+    register_parse_hook(hook)
+    try:
+        records.clear()
+        read_gef_file(file_path)
+    finally:
+        unregister_parse_hook(hook)
+    assert records[-1] == 'total'
+
+def test_read_gef_header():
+    example_file_content, expected_header, expected_col_names, expected_header_units, expected_measurements = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    dialect, cpt_header, header_units, data_offset = read_gef_header(file_path, chunk_size=64)
+    assert dialect == 'gef_txt'
+    assert (cpt_header, header_units) == read_gef_file(file_path)[:2]
+    content = file_path.read_bytes()
+    assert content[data_offset:].split()[0] == b'0,00'
+
+    alt_file_content, expected_header_units, expected_measurements = create_alt_example_file()
+    dialect, cpt_header, header_units, data_offset = read_gef_header(file_bytes=alt_file_content.encode('utf-8'))
+    assert dialect == 'columninfo'
+    assert cpt_header['TESTID'] == 'CPT-A' and header_units == expected_header_units
+    assert alt_file_content.encode('utf-8')[data_offset:].startswith(b'0.00')
+
+@pytest.mark.parametrize("layout", ["rows", "columns"])
+def test_numpy_engine_matches_python_engine(layout):
+    np = pytest.importorskip("numpy")
+    alt_file_content, *_ = create_alt_example_file()
+    variants = [
+        # text cell
+        alt_file_content.replace('0.06 1.2 0.041', '0.06 1.2 weich'),
+        # -99999 is a value, only -99999.000 cells are UNDEF; decimal commas
+        alt_file_content.replace('0.06 1.2 0.041', '0.06 -99999 0,041'),
+        # short row and a literal nan
+        alt_file_content.replace('0.06 1.2 0.041', '0.06 nan\n0.08 1.3'),
+        # a longer spelling of the void value is a value as well
+        alt_file_content.replace('0.06 1.2 0.041', '0.06 -99999.0000 0.041'),
+    ]
+    for content in variants:
+        file_path = create_dummy_test_file(content, "utf-8")
+        _, _, python_result = read_alt_gef_file(file_path, layout=layout)
+        _, _, numpy_result = read_alt_gef_file(file_path, layout=layout, engine='numpy')
+        if(layout == 'rows'):
+            assert repr(numpy_result) == repr(python_result)
+        else:
+            assert list(numpy_result) == list(python_result)
+            for name, values in python_result.items():
+                assert np.array_equal(numpy_result[name], np.array(values), equal_nan=True), name
+    assert read_alt_gef_file(create_dummy_test_file(variants[1], "utf-8"), engine='numpy')[2][3]['qc'] == -99999.0
+    assert read_alt_gef_file(create_dummy_test_file(variants[3], "utf-8"), engine='numpy')[2][3]['qc'] == -99999.0
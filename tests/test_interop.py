@@ -0,0 +1,69 @@
+import math
+
+import pytest
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file, read_alt_gef_file
+from gef_reader.interop import _concat_columns, _as_ndarray, _normalize
+
+
+def example_cpts(layout: str = 'columns'):
+    example_file_content, *_ = create_example_file()
+    alt_file_content, *_ = create_alt_example_file()
+    return([read_gef_file(create_dummy_test_file(example_file_content, "windows-1252"), layout=layout),
+            read_alt_gef_file(create_dummy_test_file(alt_file_content, "utf-8"), layout=layout)])
+
+
+def test_column_buffers_are_not_copied():
+    np = pytest.importorskip("numpy")
+    _, header_units, columns = example_cpts()[0]
+    values = _as_ndarray(columns['qc'])
+    assert values.dtype == np.float64
+    columns['qc'][0] = 42.0
+    assert values[0] == 42.0
+
+    # rows are converted once, UNDEF is NaN
+    _, rows_units, rows = example_cpts('rows')[0]
+    rows_columns, units = _normalize(rows_units, rows)
+    assert units['qc'] == '[MPa]'
+    assert math.isnan(rows_columns['Su_min'][1]) and rows_columns['Su_min'][0] == columns['Su_min'][0]
+
+
+def test_concat_columns():
+    np = pytest.importorskip("numpy")
+    cpts = example_cpts()
+    columns, units, headers, n_rows = _concat_columns(cpts)
+    assert n_rows == [19, 4]
+    assert units['qc'] == '[MPa]' and units['depth'] == 'm'
+    assert headers[1]['TESTID'] == 'CPT-A'
+    assert all(len(values) == 23 for values in columns.values())
+    assert np.isnan(columns['depth'][:19]).all() and list(columns['depth'][19:]) == [0.0, 0.02, 0.04, 0.06]
+    assert columns['qc'][0] == cpts[0][2]['qc'][0] and columns['qc'][-1] == 1.2
+
+
+def test_to_pandas():
+    pd = pytest.importorskip("pandas")
+    from gef_reader import to_pandas, concat_to_pandas
+    cpt_header, header_units, columns = example_cpts()[0]
+    df = to_pandas(cpt_header, header_units, columns)
+    assert df.attrs['units']['qc'] == '[MPa]'
+    assert df['qc'].tolist() == list(columns['qc'])
+
+    df = concat_to_pandas(example_cpts())
+    assert len(df) == 23
+    assert df['hole_id'].iloc[0] == 'CPT 01' and df['hole_id'].iloc[-1] == 'CPT-A'
+    assert pd.isna(df['depth'].iloc[0])
+
+
+def test_to_arrow():
+    pa = pytest.importorskip("pyarrow")
+    from gef_reader import to_arrow, concat_to_arrow
+    cpt_header, header_units, columns = example_cpts()[0]
+    table = to_arrow(cpt_header, header_units, columns)
+    assert table.schema.field('qc').metadata == {b'unit': b'[MPa]'}
+    assert table['Su_min'].null_count == 18
+    assert table['qc'].to_pylist() == list(columns['qc'])
+
+    table = concat_to_arrow(example_cpts())
+    assert table.num_rows == 23
+    assert table['hole_id'].to_pylist()[-1] == 'CPT-A'
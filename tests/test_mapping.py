@@ -0,0 +1,55 @@
+import pickle
+import weakref
+
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file, read_alt_gef_file, read_any_gef_file, iter_gef_measurements, HeaderMapper, ParseStats
+from gef_reader.gef_reader import map_to_default_header_names, _alt_column_names
+
+
+def test_header_mapper_normalizes_keys():
+    mapper = HeaderMapper({"X": "RW"})
+    assert mapper.resolve("Conusweerstand qc") == "qc"
+    assert mapper.resolve("conusweerstand  QC") == "qc"
+    assert mapper.resolve(" x ") == "RW"
+    assert mapper.resolve("unknown key") == "unknown key"
+    assert mapper.map({"Projekt-Nummer": 1, "foo": 2}) == {"projekt_id": 1, "foo": 2}
+    assert mapper.cache_info().hits == 0 and mapper.cache_info().maxsize == 4096
+    mapper.map({"Projekt-Nummer": 1})
+    assert mapper.cache_info().hits == 1
+    assert pickle.loads(pickle.dumps(mapper)).resolve(" x ") == "RW"
+    assert map_to_default_header_names({"x": 1}, {"X": "RW"}) == {"RW": 1}
+    # no reference cycle, the mapper is freed without the garbage collector
+    mapper_ref = weakref.ref(mapper)
+    del mapper
+    assert mapper_ref() is None
+
+
+def test_header_mapper_column_numbers():
+    columninfo = [[1, 'm', 'Sondeerlengte', 1], [2, 'MPa', 'Unbekannt', 2], [3, 'MPa', 'Waterspanning u1', 5],
+                  [4, 'm', 'penetration length', 1], [5, '-', 'Extra', 99]]
+    assert HeaderMapper().column_names(columninfo) == ['depth', 'qc', 'u1', 'penetration length', 'Extra']
+    assert _alt_column_names({'COLUMNINFO': columninfo}) == (['depth', 'qc', 'u1', 'penetration length', 'Extra'], ['m', 'MPa', 'MPa', 'm', '-'])
+
+
+def test_read_gef_file_with_header_mapper():
+    example_file_content, *_ = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    mapper = HeaderMapper({"ort": "location"})
+    cpt_header = read_gef_file(file_path, header_mapping_dict=mapper)[0]
+    assert cpt_header["location"] == "Testsite"
+    assert cpt_header == read_gef_file(file_path, header_mapping_dict={"Ort": "location"})[0]
+
+
+def test_read_alt_gef_file_with_header_mapper():
+    alt_file_content, *_ = create_alt_example_file()
+    file_path = create_dummy_test_file(alt_file_content, "utf-8")
+    mapping = {"Conusweerstand qc": "cone_resistance"}
+    _, _, columns = read_alt_gef_file(file_path, header_mapping_dict=HeaderMapper(mapping), layout='columns')
+    assert list(columns) == ['depth', 'cone_resistance', 'fs']
+    assert list(read_alt_gef_file(file_path, header_mapping_dict=mapping, stats=ParseStats())[2][0]) == ['depth', 'cone_resistance', 'fs']
+    assert 'cone_resistance' in read_any_gef_file(file_path, header_mapping_dict=mapping, layout='columns')[3]
+    _, _, rows = iter_gef_measurements(file_path, header_mapping_dict=mapping)
+    assert list(next(rows)) == ['depth', 'cone_resistance', 'fs']
+    rows.close()
+    assert list(read_alt_gef_file(file_path, layout='columns')[2]) == ['depth', 'qc', 'fs']
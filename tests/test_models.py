@@ -0,0 +1,146 @@
+import math
+from array import array
+
+import pytest
+
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import read_gef_file, read_alt_gef_file, CPT, CPTHeader, CPTMeasurement, decimate_cpts
+
+
+def test_cpt_from_gef_layouts():
+    example_file_content, expected_header, expected_col_names, expected_header_units, expected_measurements = create_example_file()
+    file_path = create_dummy_test_file(example_file_content, "windows-1252")
+    cpt = CPT.from_gef(*read_gef_file(file_path))
+    columns_cpt = CPT.from_gef(*read_gef_file(file_path, layout='columns'))
+    assert len(cpt) == len(columns_cpt) == len(expected_measurements)
+    assert cpt.cpt_header == columns_cpt.cpt_header
+    assert cpt.cpt_header.hole_id == 'CPT 01' and cpt.cpt_header.elevation == -100.0
+    assert cpt.units['qc'] == '[MPa]' and cpt.units['inner_friction_angle'] == '[°]'
+    assert cpt.columns['measured_depth'].tolist() == [row['Tiefe'] for row in expected_measurements]
+    row = columns_cpt.row(0)
+    assert isinstance(row, CPTMeasurement)
+    assert row.qc == expected_measurements[0]['qc'] and row.friction_ratio_rf == expected_measurements[0]['Rf']
+    assert cpt.cpt_measurements == columns_cpt.cpt_measurements
+    assert not hasattr(row, '__dict__')
+
+
+def test_cpt_from_alt_gef():
+    alt_file_content, expected_header_units, expected_measurements = create_alt_example_file()
+    file_path = create_dummy_test_file(alt_file_content, "utf-8")
+    cpt = CPT.from_gef(*read_alt_gef_file(file_path))
+    assert cpt.cpt_header.hole_id == 'CPT-A'
+    assert (cpt.cpt_header.easting, cpt.cpt_header.northing) == (108920.0, 432810.0)
+    assert cpt.units == {'measured_depth': 'm', 'qc': 'MPa', 'fs': 'MPa'}
+    assert math.isnan(cpt.columns['fs'][1]) and cpt.row(1).fs is None
+
+    rebuilt = CPT.from_measurements(CPTHeader(hole_id='CPT-A'), cpt.cpt_measurements)
+    assert rebuilt.cpt_measurements == cpt.cpt_measurements
+
+
+def create_profile_cpt() -> CPT:
+    """ CPT with 1 cm depth steps from 0.00 to 0.99 m, qc = depth * 10, every 10th value UNDEF."""
+    depths = array('d', [i / 100 for i in range(100)])
+    qc = array('d', [math.nan if i % 10 == 9 else i / 10 for i in range(100)])
+    return(CPT(CPTHeader(hole_id='CPT 01'), {'measured_depth': depths, 'qc': qc}, {'measured_depth': 'm', 'qc': 'MPa'}))
+
+
+def test_cpt_slice():
+    cpt = create_profile_cpt()
+    sliced = cpt.slice(0.25, 0.5)
+    assert sliced.columns['measured_depth'][0] == 0.25 and sliced.columns['measured_depth'][-1] == 0.49
+    assert len(sliced) == 25 and len(cpt.slice(2.0, 3.0)) == 0 and len(cpt.slice()) == 100
+
+    # unsorted depths are sorted by the index, NaN depths are left out
+    shuffled = CPT(CPTHeader(), {'measured_depth': array('d', [0.3, 0.1, math.nan, 0.2]), 'qc': array('d', [3, 1, 9, 2])})
+    assert shuffled.slice(0.15).columns['qc'].tolist() == [2, 3]
+
+
+@pytest.mark.parametrize("agg, expected_first_bin", [
+    ("mean", sum(i / 10 for i in range(9)) / 9),
+    ("median", 0.4),
+    ("min", 0.0),
+    ("max", 0.8),
+])
+def test_cpt_resample(agg, expected_first_bin):
+    cpt = create_profile_cpt()
+    resampled = cpt.resample(0.1, agg=agg)
+    assert len(resampled) == 10
+    assert resampled.columns['measured_depth'][:3].tolist() == [0.0, 0.1, 0.2]
+    assert resampled.columns['depth_bottom'][0] == 0.1
+    assert resampled.columns['qc'][0] == pytest.approx(expected_first_bin)
+    assert resampled.units['depth_bottom'] == 'm'
+    assert len(cpt.resample(0.25, top=0.5, bottom=1.0)) == 2
+
+    np = pytest.importorskip("numpy")
+    numpy_cpt = CPT(cpt.cpt_header, {name: np.array(values) for name, values in cpt.columns.items()})
+    assert np.allclose(numpy_cpt.resample(0.1, agg=agg).columns['qc'], resampled.columns['qc'])
+    assert np.allclose(numpy_cpt.resample(0.25, agg=agg, top=0.5, bottom=1.5).columns['qc'][:2],
+                       cpt.resample(0.25, agg=agg, top=0.5, bottom=1.5).columns['qc'][:2])
+
+
+def create_layered_cpt(n_rows: int = 6000, top: float = 0.0) -> CPT:
+    """ CPT with 1 cm depth steps, a smooth qc trend with a 2 cm thin layer (qc peak, fs dip) in the middle."""
+    depths = array('d', [round(top + i / 100, 2) for i in range(n_rows)])
+    qc = array('d', [1.0 + i / n_rows for i in range(n_rows)])
+    fs = array('d', [0.05] * n_rows)
+    for i in (n_rows // 2, n_rows // 2 + 1):
+        qc[i], fs[i] = 30.0, 0.001
+    fs[10] = math.nan
+    return(CPT(CPTHeader(hole_id='CPT 01'), {'measured_depth': depths, 'qc': qc, 'fs': fs}, {'measured_depth': 'm', 'qc': 'MPa'}))
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+def test_cpt_decimate(method):
+    cpt = create_layered_cpt()
+    decimated = cpt.decimate(200, method=method)
+    depths = decimated.columns['measured_depth']
+    assert 3 < len(decimated) <= 200 and decimated.units == cpt.units
+    assert depths[0] == 0.0 and depths[-1] == 59.99 and list(depths) == sorted(depths)
+    # the thin layer survives in both columns of the same rows
+    assert max(decimated.columns['qc']) == 30.0 and min(decimated.columns['fs']) == 0.001
+
+    assert len(cpt.decimate(200, method=method, columns=['qc'], top=10.0, bottom=20.0)) <= 200
+    assert len(cpt.slice(0.0, 1.0).decimate(200, method=method)) == 100
+    with pytest.raises(ValueError):
+        cpt.decimate(200, method='every_nth')
+
+    np = pytest.importorskip("numpy")
+    numpy_cpt = CPT(cpt.cpt_header, {name: np.array(values) for name, values in cpt.columns.items()})
+    assert np.array_equal(numpy_cpt.decimate(200, method=method).columns['measured_depth'], depths)
+
+
+def test_decimate_cpts():
+    cpts = [create_layered_cpt(), create_layered_cpt(1000, top=50.0)]
+    decimated = decimate_cpts(cpts, 100, method='lttb', columns=['qc'])
+    assert all(len(cpt) <= 100 for cpt in decimated)
+    # the short CPT gets the buckets of its part of the common depth range
+    assert len(decimated[1]) < len(decimated[0])
+    assert decimated[1].columns['measured_depth'][0] == 50.0 and max(decimated[1].columns['qc']) == 30.0
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+@pytest.mark.parametrize("n_points", [3, 4, 10, 31])
+def test_cpt_decimate_many_columns(method, n_points):
+    cpt = create_layered_cpt()
+    for i in range(12):
+        cpt.columns[f'c{i}'] = array('d', [((j * (i + 3)) % 17) / 17 for j in range(len(cpt))])
+    decimated = cpt.decimate(n_points, method=method)
+    assert len(decimated) <= n_points
+    assert decimated.columns['measured_depth'][0] == 0.0 and decimated.columns['measured_depth'][-1] == 59.99
+
+    example_file_content, *_ = create_example_file()
+    example = CPT.from_gef(*read_gef_file(create_dummy_test_file(example_file_content, "windows-1252")))
+    assert len(example.decimate(10, method=method)) <= 10
+
+
+def test_cpt_from_gef_text_cells_and_derived_units():
+    rows = [{'Tiefe': 0.0, 'qc': 1.5, 'Bemerkung': 'Ton'}, {'Tiefe': 0.02, 'qc': None, 'Bemerkung': None}]
+    cpt = CPT.from_gef({'aufschluss_name': 'CPT 01'}, {'Tiefe': '[m]', 'qc': '[MPa]'}, rows)
+    assert cpt.columns['qc'][0] == 1.5 and math.isnan(cpt.columns['qc'][1])
+    assert all(math.isnan(v) for v in cpt.columns['Bemerkung'])
+
+    profile_cpt = create_profile_cpt()
+    for derived in (profile_cpt.slice(0.1), profile_cpt.resample(0.1), profile_cpt.decimate(10)):
+        derived.units['qc'] = 'kPa'
+        assert profile_cpt.units['qc'] == 'MPa'
@@ -0,0 +1,64 @@
+import random
+import tempfile
+from math import dist
+from pathlib import Path
+
+import pytest
+from .helper_functions import create_dummy_test_file, create_alt_example_file
+
+from gef_reader import read_alt_gef_file, CPTCatalog
+from gef_reader.gef_reader import _hole_id
+from gef_reader.spatial import collar_from_header
+
+
+def create_random_catalog(n: int = 2000, seed: int = 0) -> tuple[CPTCatalog, list[tuple[float, float]]]:
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(n)]
+    return(CPTCatalog([f'CPT {i}' for i in range(n)], [p[0] for p in points], [p[1] for p in points], node_size=8), points)
+
+
+def test_collar_from_header():
+    alt_file_content, *_ = create_alt_example_file()
+    cpt_header = read_alt_gef_file(create_dummy_test_file(alt_file_content, "utf-8"))[0]
+    assert collar_from_header(cpt_header) == (108920.0, 432810.0)
+    assert collar_from_header({'RW': 31000.5, 'HW': '432810,25'}) == (31000.5, 432810.25)
+    assert collar_from_header({'projekt_id': 1}) is None
+    catalog = CPTCatalog.from_headers([cpt_header, {'aufschluss_name': 'CPT 01', 'RW': 1.0, 'HW': 2.0}, {}])
+    assert list(catalog) == [('CPT-A', 108920.0, 432810.0), ('CPT 01', 1.0, 2.0)]
+    assert catalog.nearest(0, 0) == [('CPT 01', dist((0, 0), (1, 2)))]
+
+
+def test_catalog_queries():
+    catalog, points = create_random_catalog()
+    ids = [f'CPT {i}' for i in range(len(points))]
+    assert sorted(catalog.bbox(100, 200, 300, 400)) == sorted(
+        id_ for id_, (x, y) in zip(ids, points) if 100 <= x <= 300 and 200 <= y <= 400)
+
+    within = catalog.within(500, 500, 50)
+    expected = sorted((dist(p, (500, 500)), id_) for id_, p in zip(ids, points) if dist(p, (500, 500)) <= 50)
+    assert within == [id_ for _, id_ in expected]
+
+    nearest = catalog.nearest(123, 456, k=10)
+    expected = sorted((dist(p, (123, 456)), id_) for id_, p in zip(ids, points))[:10]
+    assert [id_ for id_, _ in nearest] == [id_ for _, id_ in expected]
+    assert [d for _, d in nearest] == pytest.approx([d for d, _ in expected])
+    assert catalog.nearest(123, 456, k=10, max_distance=0.0) == []
+
+    triangle = [(0, 0), (1000, 0), (0, 1000)]
+    assert sorted(catalog.within_polygon(triangle)) == sorted(id_ for id_, (x, y) in zip(ids, points) if x + y < 1000)
+
+
+def test_catalog_save_load():
+    catalog, _ = create_random_catalog(n=500)
+    path = Path(tempfile.mkdtemp()) / 'catalog.json'
+    catalog.save(path)
+    loaded = CPTCatalog.load(path)
+    assert list(loaded) == list(catalog)
+    assert loaded.nearest(1, 2, k=3) == catalog.nearest(1, 2, k=3)
+
+
+def test_hole_id_keys():
+    assert _hole_id({'aufschluss_name': 'CPT 01', 'TESTID': 'other'}, dialect='gef_txt') == 'CPT 01'
+    assert _hole_id({'aufschluss_name': 'other', 'TESTID': 'CPT-A'}, dialect='columninfo') == 'CPT-A'
+    assert _hole_id({'Versuchs-Nummer': 'CPT 02'}) == 'CPT 02' and _hole_id({'hole_id': 'CPT 03'}) == 'CPT 03'
+    assert _hole_id({}) is None
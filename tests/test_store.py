@@ -0,0 +1,42 @@
+import math
+import tempfile
+from pathlib import Path
+
+from .helper_functions import create_dummy_test_file, create_example_file, create_alt_example_file
+
+from gef_reader import CPTStore, read_gef_file
+
+
+def test_cpt_store_ingest_and_query():
+    example_file_content, *_ = create_example_file()
+    alt_file_content, *_ = create_alt_example_file()
+    file_paths = [create_dummy_test_file(example_file_content, "windows-1252"),
+                  create_dummy_test_file(alt_file_content, "utf-8"),
+                  create_dummy_test_file('#COLUMNINFO= 1, m\n1 2 3\n', "utf-8")]
+    db_path = Path(tempfile.mkdtemp()) / 'cpts.sqlite'
+    with CPTStore(db_path) as store:
+        errors = store.ingest_files(file_paths)
+        assert list(errors) == [str(file_paths[2])]
+        cpts = store.cpts()
+        assert [(c['hole_id'], c['project'], c['depth_column'], c['n_rows']) for c in cpts] == [
+            ('CPT 01', '12345678-10001', 'Tiefe', 19), ('CPT-A', None, 'depth', 4)]
+        assert (cpts[1]['x'], cpts[1]['y']) == (108920.0, 432810.0)
+        assert store.units(cpts[1]['id']) == {'depth': 'm', 'qc': 'MPa', 'fs': 'MPa'}
+
+    # reopened, the rows layout is accepted as well
+    with CPTStore(db_path) as store:
+        store.add(*read_gef_file(file_paths[0]), source='rows')
+        assert [c['id'] for c in store.cpts(hole_id='CPT 01')] == [1, 3]
+        assert len(store.cpts(project='12345678-10001')) == 2
+
+        result = store.query('CPT-A', top=0.02, bottom=0.06, columns=['QC', 'fs'])
+        assert list(result) == ['cpt_id', 'depth', 'qc', 'fs']
+        assert list(result['depth']) == [0.02, 0.04]
+        assert result['qc'][0] == 0.7 and math.isnan(result['qc'][1])
+
+        _, _, columns = read_gef_file(file_paths[0], layout='columns')
+        result = store.query(cpt_id=1)
+        for name, values in columns.items():
+            stored = result['depth' if name == 'Tiefe' else name]
+            assert all((math.isnan(a) and math.isnan(b)) or a == b for a, b in zip(stored, values, strict=True)), name
+        assert store.query('CPT 01', bottom=0.05, columns=['qc'])['cpt_id'].tolist() == [1.0] * 5 + [3.0] * 5